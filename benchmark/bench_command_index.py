@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比 BotProto.distribute_commands 原有的逐条扫描与预编译 CommandIndex 的指令匹配耗时
+
+运行：python benchmark/bench_command_index.py
+"""
+
+import os
+import random
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qg_botsdk._command_index import CommandIndex, get_max_command_length  # noqa
+from qg_botsdk.model import BotCommandObject  # noqa
+
+random.seed(0)
+_CHARS = "abcdefghijklmnopqrstuvwxyz签到抽卡查询帮助"
+
+
+def _word(n):
+    return "".join(random.choice(_CHARS) for _ in range(n))
+
+
+def make_commands(count):
+    commands = []
+    for i in range(count):
+        if i % 10 == 9:
+            commands.append(BotCommandObject(regex=rf"^{_word(3)}(\d+)$"))
+        elif i % 5 == 0:
+            commands.append(BotCommandObject(command=[f"/{_word(4)}{i}"]))
+        else:
+            commands.append(BotCommandObject(command=[f"{_word(4)}{i}", _word(6)]))
+    return commands
+
+
+def legacy_scan(commands, msg, treated_msg):
+    sorted_commands = sorted(commands, key=get_max_command_length, reverse=True)
+    for items in sorted_commands:
+        if items.command:
+            for command in items.command:
+                match_target = msg if command.startswith("/") else treated_msg
+                if command in match_target:
+                    return items
+        else:
+            for regex in items.regex:
+                if regex.search(treated_msg):
+                    return items
+    return None
+
+
+def index_scan(index, msg, treated_msg):
+    for items, matched_commands in index.match(msg, treated_msg):
+        if matched_commands is not None:
+            if matched_commands:
+                return items
+        else:
+            for regex in items.regex:
+                if regex.search(treated_msg):
+                    return items
+    return None
+
+
+def main():
+    messages = [_word(random.randint(5, 60)) for _ in range(200)]
+    print(
+        f"{'commands':>10} {'legacy(us/msg)':>16} {'index(us/msg)':>16} {'speedup':>8}"
+    )
+    for count in (10, 100, 1000):
+        commands = make_commands(count)
+        index = CommandIndex(commands)
+        hit_messages = messages + [
+            f"{m}{c.command[0]}" for m, c in zip(messages, commands) if c.command
+        ]
+        for msg in hit_messages:
+            assert legacy_scan(commands, msg, msg) is index_scan(index, msg, msg)
+        legacy = min(
+            repeat(
+                lambda: [legacy_scan(commands, m, m) for m in hit_messages],
+                number=3,
+                repeat=3,
+            )
+        )
+        indexed = min(
+            repeat(
+                lambda: [index_scan(index, m, m) for m in hit_messages],
+                number=3,
+                repeat=3,
+            )
+        )
+        per_msg = 1e6 / (3 * len(hit_messages))
+        print(
+            f"{count:>10} {legacy * per_msg:>16.2f} {indexed * per_msg:>16.2f} "
+            f"{legacy / indexed:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
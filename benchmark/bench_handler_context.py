@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比处理函数中访问Plugins.session时，逐帧追溯（inspect.stack()）与ContextVar取得处理函数上下文的耗时
+
+运行：python benchmark/bench_handler_context.py
+"""
+
+import os
+import sys
+import tempfile
+from timeit import repeat
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qg_botsdk._event import objectize  # noqa
+from qg_botsdk._session import SessionManager  # noqa
+from qg_botsdk._utils import handler_context  # noqa
+from qg_botsdk.logger import Logger  # noqa
+from qg_botsdk.model import Scope  # noqa
+from qg_botsdk.plugins import Plugins  # noqa
+from qg_botsdk.qg_bot_proto import BotProto  # noqa
+
+ACCESSES = 200
+DEPTH = 10  # 处理函数内的调用深度，模拟插件中的辅助函数
+
+
+def nested(depth, func):
+    return nested(depth - 1, func) if depth else func()
+
+
+def main():
+    logger = Logger("bench")
+    session = SessionManager(
+        logger, commit_path=tempfile.mkdtemp(), is_auto_commit=False
+    )
+    bot = SimpleNamespace(session_manager=session, logger=logger, api=None)
+    event = objectize(
+        {
+            "author": {"id": "u1"},
+            "guild_id": "g1",
+            "channel_id": "c1",
+            "content": "hi",
+            "t": "MESSAGE_CREATE",
+        }
+    )
+    timings = {}
+
+    def handler(data, legacy):
+        token = handler_context.set(None) if legacy else None  # 强制回退至逐帧追溯
+        try:
+            Plugins.session.new(Scope.USER, "k", {"v": 1})
+
+            def access():
+                for _ in range(ACCESSES):
+                    Plugins.session.get(Scope.USER, "k")
+
+            timings[legacy] = min(
+                repeat(lambda: nested(DEPTH, access), number=1, repeat=3)
+            )
+        finally:
+            if token is not None:
+                handler_context.reset(token)
+
+    BotProto.start_callback_task(bot, handler, event, True)
+    BotProto.start_callback_task(bot, handler, event, False)
+    legacy, context = timings[True], timings[False]
+    print(f"call depth in handler: {DEPTH}")
+    print(f"inspect.stack() : {legacy * 1e6 / ACCESSES:10.2f} us/access")
+    print(f"ContextVar      : {context * 1e6 / ACCESSES:10.2f} us/access")
+    print(f"speedup         : {legacy / context:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比标准库json与qg_botsdk._json（已安装orjson时使用orjson）解码网关事件的耗时
+
+运行：python benchmark/bench_json.py [抓取的网关数据文件]
+数据文件中每行为一条网关下发的原始JSON；不提供时使用内置的样例事件
+"""
+
+import json
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qg_botsdk import _json  # noqa
+from qg_botsdk._event import objectize  # noqa
+
+SAMPLE_PAYLOADS = [
+    {
+        "op": 0,
+        "s": 42,
+        "t": "AT_MESSAGE_CREATE",
+        "id": "AT_MESSAGE_CREATE:1234567890abcdef",
+        "d": {
+            "author": {
+                "avatar": "https://thirdqq.qlogo.cn/0",
+                "bot": False,
+                "id": "1234567890123456789",
+                "username": "测试用户",
+            },
+            "channel_id": "1234567",
+            "content": "<@!9876543210987654321> /签到 今天也要加油",
+            "guild_id": "12345678901234567890",
+            "id": "08e092eeb983afef9e0110f0d4e30a38e0a20848d1c9ac9a06",
+            "member": {
+                "joined_at": "2022-01-01T00:00:00+08:00",
+                "nick": "测试昵称",
+                "roles": ["1", "4"],
+            },
+            "mentions": [
+                {
+                    "avatar": "https://thirdqq.qlogo.cn/1",
+                    "bot": True,
+                    "id": "9876543210987654321",
+                    "username": "机器人",
+                }
+            ],
+            "seq": 1024,
+            "seq_in_channel": "1024",
+            "timestamp": "2023-01-01T00:00:00+08:00",
+        },
+    },
+    {
+        "op": 0,
+        "s": 43,
+        "t": "GROUP_AT_MESSAGE_CREATE",
+        "id": "GROUP_AT_MESSAGE_CREATE:abcdef1234567890",
+        "d": {
+            "author": {
+                "id": "E4F4AEA33253A2797FB897C50B81D7ED",
+                "member_openid": "E4F4AEA33253A2797FB897C50B81D7ED",
+            },
+            "content": " 抽卡 十连",
+            "group_id": "C9F778FE6ADF9D1D1DBE395BF744A33A",
+            "group_openid": "C9F778FE6ADF9D1D1DBE395BF744A33A",
+            "id": "ROBOT1.0_veoihkmkrJ9Qlzh3LwbUSl0rTj4C5hFHFsHZhzv.vIZB-jAKUxdMmEXsFsb9lw0b",
+            "timestamp": "2023-11-06T13:37:18+08:00",
+        },
+    },
+    {"op": 11},
+]
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            payloads = [line.strip() for line in f if line.strip()]
+    else:
+        payloads = [json.dumps(p, ensure_ascii=False) for p in SAMPLE_PAYLOADS] * 100
+
+    def run(loads, with_objectize=False):
+        for p in payloads:
+            data = loads(p)
+            if with_objectize:
+                objectize(data.get("d", {})).dict
+
+    print(f"backend: {_json.BACKEND}, payloads: {len(payloads)}")
+    print(f"{'case':>22} {'stdlib(us/msg)':>16} {'_json(us/msg)':>16} {'speedup':>8}")
+    per_msg = 1e6 / (5 * len(payloads))
+    for name, with_objectize in (("loads", False), ("loads + objectize", True)):
+        std = min(repeat(lambda: run(json.loads, with_objectize), number=5, repeat=3))
+        fast = min(repeat(lambda: run(_json.loads, with_objectize), number=5, repeat=3))
+        print(
+            f"{name:>22} {std * per_msg:>16.2f} {fast * per_msg:>16.2f} "
+            f"{std / fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比原有的链式str.replace处理消息文本（及treat_command再次查找指令位置）与单次处理的treat_msg的耗时
+
+每组取 REPEAT 次重复（每次运行 NUMBER 遍语料）中的最小耗时，以减少其他进程干扰造成的波动
+
+运行：python benchmark/bench_treat_msg.py
+"""
+
+import os
+import random
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qg_botsdk._utils import treat_msg  # noqa
+
+random.seed(0)
+NUMBER = 5
+REPEAT = 9
+AT = "<@!1234567890123456789>"
+_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789签到抽卡查询帮助今天天气怎么样 "
+_COMMANDS = ("签到", "/抽卡", "help", "/查询")
+
+
+def legacy_treat_msg(raw_msg: str, at: str):
+    raw_msg = raw_msg if raw_msg.find(at) else raw_msg.replace(at, "", 1).strip()
+    if not raw_msg:
+        return ""
+    if raw_msg[0] == "/":
+        raw_msg = raw_msg[1:]
+    return (
+        raw_msg.replace("&amp;", "&")
+        .replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("\xa0", " ")
+        .strip()
+    )
+
+
+def legacy(raw_msg, command):
+    msg = legacy_treat_msg(raw_msg, AT)
+    return msg[msg.find(command) + len(command) :].strip()
+
+
+def single_pass(raw_msg, command):
+    msg, offset = treat_msg(raw_msg, AT)
+    head = command[offset:] if command[:1] == "/" else command
+    if msg.startswith(head):
+        return msg[len(head) :].strip()
+    return msg[msg.find(command) + len(command) :].strip()
+
+
+def make_message(length):
+    """
+    模拟真实消息：多数艾特机器人并以指令开头，少数带有转义字符或不间断空格
+    """
+    command = random.choice(_COMMANDS)
+    body = "".join(random.choice(_CHARS) for _ in range(length))
+    if random.random() < 0.2:
+        pos = random.randint(0, len(body))
+        escaped = random.choice(("&amp;", "&lt;", "&gt;", "\xa0"))
+        body = body[:pos] + escaped + body[pos:]
+    msg = f"{command} {body}"
+    if random.random() < 0.8:
+        msg = f"{AT} {msg}"
+    return msg.strip(), command
+
+
+def main():
+    print(
+        f"{'length':>10} {'legacy(us/msg)':>16} {'single(us/msg)':>16} {'speedup':>8}"
+        f"  (min of {REPEAT})"
+    )
+    for low, high in ((2, 10), (10, 50), (50, 200), (200, 2000)):
+        corpus = [make_message(random.randint(low, high)) for _ in range(1000)]
+        for msg, command in corpus:
+            assert legacy(msg, command) == single_pass(msg, command)
+        old = min(
+            repeat(
+                lambda: [legacy(m, c) for m, c in corpus], number=NUMBER, repeat=REPEAT
+            )
+        )
+        new = min(
+            repeat(
+                lambda: [single_pass(m, c) for m, c in corpus],
+                number=NUMBER,
+                repeat=REPEAT,
+            )
+        )
+        per_msg = 1e6 / (NUMBER * len(corpus))
+        print(
+            f"{f'{low}-{high}':>10} {old * per_msg:>16.2f} {new * per_msg:>16.2f} "
+            f"{old / new:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比wait_for注册表的逐个扫描与按scope索引的查找耗时（10000个等待中的wait_for）
+
+运行：python benchmark/bench_wait_for.py
+"""
+
+import os
+import sys
+import tempfile
+from concurrent.futures import Future
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qg_botsdk._event import objectize  # noqa
+from qg_botsdk._session import SessionManager, _AllScopeStr  # noqa
+from qg_botsdk.logger import Logger  # noqa
+from qg_botsdk.model import BotCommandObject, Scope  # noqa
+
+PENDING = 10000
+
+
+def make_msg(user, guild, channel):
+    return objectize(
+        {
+            "author": {"id": user},
+            "guild_id": guild,
+            "channel_id": channel,
+            "content": "yes",
+            "t": "MESSAGE_CREATE",
+        }
+    )
+
+
+def legacy_checker(registers, session, obj):
+    check_identify = session._SessionManager__check_identify
+    _scope_value = {scope: check_identify(scope, obj) for scope in _AllScopeStr}
+    triggered = []
+    for scope_key, command_futures in registers.items():
+        flag = True
+        for scope in _AllScopeStr:
+            value = getattr(scope_key, scope)
+            if value is not None and value != _scope_value[scope]:
+                flag = False
+                break
+        if flag:
+            triggered.extend(command_futures)
+    return triggered
+
+
+def main():
+    session = SessionManager(
+        Logger("bench"), commit_path=tempfile.mkdtemp(), is_auto_commit=False
+    )
+    for i in range(PENDING):
+        scopes = (Scope.USER, Scope.CHANNEL) if i % 2 else Scope.USER
+        session.register_wait_for(
+            make_msg(f"u{i}", f"g{i % 50}", f"c{i % 200}"),
+            scopes,
+            BotCommandObject(command=["yes"]),
+            Future(),
+        )
+    registers = session._SessionManager__wait_for_registers
+    messages = [
+        make_msg(f"u{i * 37 % PENDING}", "g1", f"c{i % 200}") for i in range(200)
+    ]
+    for m in messages:
+        assert [x.command for x in session.wait_for_message_checker(m)] == list(
+            legacy_checker(registers, session, m)
+        )
+    legacy = min(
+        repeat(
+            lambda: [legacy_checker(registers, session, m) for m in messages],
+            number=3,
+            repeat=3,
+        )
+    )
+    indexed = min(
+        repeat(
+            lambda: [session.wait_for_message_checker(m) for m in messages],
+            number=3,
+            repeat=3,
+        )
+    )
+    per_msg = 1e6 / (3 * len(messages))
+    print(f"pending wait_for: {PENDING}")
+    print(f"legacy scan : {legacy * per_msg:10.2f} us/msg")
+    print(f"indexed     : {indexed * per_msg:10.2f} us/msg")
+    print(f"speedup     : {legacy / indexed:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,8 +18,11 @@ qg_botsdk Library
 import json
 
 from . import utils
-from ._exception import IdTokenError, IdTokenMissing, WaitTimeoutError
+from ._exception import ApiError, IdTokenError, IdTokenMissing, WaitTimeoutError
 from .api_model import ApiModel
+from .connector import ConnectorFactory
+from .dispatcher import Dispatcher, DispatchPolicy
+from .event_filter import EventFilter, FilterRule
 from .logger import Logger
 from .model import (
     AT,
@@ -29,6 +32,7 @@ from .model import (
     EmojiID,
     EmojiString,
     Model,
+    ResponseMode,
     Scope,
     SessionObject,
     SessionStatus,
@@ -37,7 +41,17 @@ from .plugins import Plugins
 from .proto import Proto
 from .proto.wh_backend import SigningKey
 from .qg_bot import BOT
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from .sandbox import SandBox
+from .session_storage import (
+    AbstractSessionStorage,
+    DBMSessionStorage,
+    FileSessionStorage,
+    MemorySessionStorage,
+    RedisSessionStorage,
+    SQLiteSessionStorage,
+)
 from .version import __version__
 
 json.JSONEncoder.default = lambda self, obj: (
@@ -59,6 +73,7 @@ __all__ = (
     "Model",
     "ApiModel",
     "Scope",
+    "ResponseMode",
     "SessionObject",
     "SessionStatus",
     "BotCommandObject",
@@ -71,8 +86,22 @@ __all__ = (
     "IdTokenMissing",
     "IdTokenError",
     "WaitTimeoutError",
+    "ApiError",
     "Proto",
     "SandBox",
+    "Dispatcher",
+    "DispatchPolicy",
+    "EventFilter",
+    "FilterRule",
+    "AbstractSessionStorage",
+    "MemorySessionStorage",
+    "FileSessionStorage",
+    "SQLiteSessionStorage",
+    "DBMSessionStorage",
+    "RedisSessionStorage",
+    "RateLimiter",
+    "RetryPolicy",
+    "ConnectorFactory",
     "AT",
     "BotAdminManager",
 )
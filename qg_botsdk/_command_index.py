@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .model import BotCommandObject, CommandValidScenes
+
+
+def get_max_command_length(cmd_obj: BotCommandObject) -> int:
+    if cmd_obj.command:
+        return max(len(c) for c in cmd_obj.command)
+    return 0
+
+
+class _Automaton:
+    """
+    Aho-Corasick 自动机，一次扫描文本即可找出所有出现过的模式串
+    """
+
+    __slots__ = ("_goto", "_fail", "_output")
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+        for pattern in patterns:
+            if pattern:
+                self.__add(pattern)
+        self.__build()
+
+    def __add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if pattern not in self._output[state]:
+            self._output[state] += (pattern,)
+
+    def __build(self):
+        goto, fail, output = self._goto, self._fail, self._output
+        queue = list(goto[0].values())
+        for state in queue:  # BFS, queue grows while iterating
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[next_state] = f
+                if output[f]:
+                    output[next_state] += output[f]
+
+    def search(self, text: str) -> Set[str]:
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        if len(goto) == 1:
+            return found
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class CommandIndex:
+    """
+    预编译的指令匹配索引，指令集合变化时重建，避免每条消息都重新排序并逐个扫描所有指令
+
+    - 指令对象按最长指令长度降序排列（长度相同时保持注册顺序，正则指令视为长度0），与原有优先级一致
+    - 以"/"开头的指令匹配原始消息，其余指令匹配处理后的消息，两者各自构建一个 Aho-Corasick 自动机
+    - match() 按优先级顺序产出命中的指令对象及其命中的指令字符串（正则指令总是产出，由调用方执行正则）
+    """
+
+    def __init__(self, commands: Iterable[BotCommandObject]):
+        self.commands: Tuple[BotCommandObject, ...] = tuple(
+            sorted(commands, key=get_max_command_length, reverse=True)
+        )
+        self._pattern_slots: Dict[str, List[int]] = {}
+        self._regex_slots: Tuple[int, ...] = ()
+        self._has_empty = False
+        slash_patterns, plain_patterns, regex_slots = set(), set(), []
+        for slot, cmd_obj in enumerate(self.commands):
+            if cmd_obj.command:
+                for command in cmd_obj.command:
+                    slots = self._pattern_slots.setdefault(command, [])
+                    if not slots or slots[-1] != slot:
+                        slots.append(slot)
+                    if not command:
+                        self._has_empty = True
+                    elif command.startswith("/"):
+                        slash_patterns.add(command)
+                    else:
+                        plain_patterns.add(command)
+            else:
+                regex_slots.append(slot)
+        self._regex_slots = tuple(regex_slots)
+        self._slash_automaton = _Automaton(slash_patterns)
+        self._plain_automaton = _Automaton(plain_patterns)
+
+    def __len__(self):
+        return len(self.commands)
+
+    def match(
+        self, msg: str, treated_msg: str
+    ) -> Iterator[Tuple[BotCommandObject, Optional[Tuple[str, ...]]]]:
+        """
+        按优先级产出候选指令
+
+        :param msg: 原始消息，用于匹配"/"开头的指令
+        :param treated_msg: 处理后的消息，用于匹配其余指令
+        :return: (指令对象, 按注册顺序排列的命中指令字符串)；正则指令的第二项为None
+        """
+        matched = self._slash_automaton.search(msg)
+        matched |= self._plain_automaton.search(treated_msg)
+        if self._has_empty:
+            matched.add("")
+        if not matched and not self._regex_slots:
+            return
+        candidates = set(self._regex_slots)
+        for command in matched:
+            candidates.update(self._pattern_slots[command])
+        for slot in sorted(candidates):
+            cmd_obj = self.commands[slot]
+            if cmd_obj.command:
+                yield cmd_obj, tuple(c for c in cmd_obj.command if c in matched)
+            else:
+                yield cmd_obj, None
+
+
+def build_scene_indexes(
+    commands: Iterable[BotCommandObject],
+) -> Dict[int, CommandIndex]:
+    """
+    按CommandValidScenes的每个场景位预先划分指令并分别构建索引，使消息只需检查当前场景下有效的指令
+
+    :param commands: 所有已注册的指令
+    :return: {场景位: 该场景的CommandIndex}
+    """
+    commands = tuple(commands)
+    return {
+        1 << x: CommandIndex(cmd for cmd in commands if cmd.valid_scenes & (1 << x))
+        for x in range(CommandValidScenes.ALL.bit_length())
+    }
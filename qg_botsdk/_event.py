@@ -1,6 +1,6 @@
-from json import JSONDecodeError, dumps
 from typing import Callable, Dict
 
+from ._json import dumps, loads
 from ._statics import EventIDEvents, MsgIDEvents
 
 v1_reply_args = (
@@ -22,21 +22,144 @@ v2_reply_args_len = len(v2_reply_args)
 
 
 class object_class:
+    """
+    懒加载的数据对象：顶层非容器字段在创建时直接写入 __dict__，嵌套的 dict/list 在首次访问时才转换为对象并缓存；
+    JSON 形式的 dict/__repr__ 在首次使用时才根据原始数据生成
+    """
+
+    __slots__ = ("__dict__", "__weakref__", "_raw", "_static_copy")
+
     def __init__(self, _static_copy, _data):
-        self.__dict__.update(_data)
+        self._raw = _data
         self._static_copy = _static_copy
+        _dict = self.__dict__
+        for keys, values in _data.items():
+            if not isinstance(values, (dict, list)):
+                _dict[keys] = values
+
+    def __getattr__(self, item):
+        if item.startswith("__") or item in ("_raw", "_static_copy"):
+            raise AttributeError(item)
+        try:
+            values = self._raw[item]
+        except (AttributeError, KeyError, TypeError):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{item}'"
+            ) from None
+        if isinstance(values, dict):
+            values = objectize(values)
+        elif isinstance(values, list):
+            values = [
+                objectize(items) if isinstance(items, dict) else items
+                for items in values
+            ]
+        self.__dict__[item] = values
+        return values
 
     def __doc__(self):
-        return self._static_copy
+        return self.dict
 
     def __repr__(self):
-        return self._static_copy
+        return self.dict
 
     @property
     def dict(self):
+        if self._static_copy is None:
+            try:
+                self._static_copy = dumps(self._raw)
+            except (TypeError, ValueError):
+                self._static_copy = str(self._raw)
         return self._static_copy
 
 
+class JSONView:
+    """
+    未解析的json返回数据，在首次访问内容时才解析并缓存；.raw为原始bytes，.json()为解析后的原始数据，
+    其余属性及下标访问则转换为object数据
+    """
+
+    __slots__ = ("raw", "_decoded")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._decoded = self
+
+    def json(self):
+        if self._decoded is self:
+            self._decoded = loads(self.raw)
+        return self._decoded
+
+    def __getattr__(self, item):
+        if item.startswith("__"):
+            raise AttributeError(item)
+        return getattr(objectize(self.json()), item)
+
+    def __getitem__(self, item):
+        return objectize(self.json()[item])
+
+    def __iter__(self):
+        return (objectize(items) for items in self.json())
+
+    def __len__(self):
+        return len(self.json())
+
+    def __bool__(self):
+        return bool(self.raw)
+
+    def __repr__(self):
+        return f"<JSONView {len(self.raw)} bytes>"
+
+
+class LazyList:
+    """
+    已解析的列表数据，每项在首次访问时才转换为object数据
+    """
+
+    __slots__ = ("_items", "_cache")
+
+    def __init__(self, items: list):
+        self._items = items
+        self._cache: Dict[int, object] = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._items)))]
+        if index < 0:
+            index += len(self._items)
+        try:
+            return self._cache[index]
+        except KeyError:
+            value = self._cache[index] = objectize(self._items[index])
+            return value
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._items)))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return f"<LazyList {len(self._items)} items>"
+
+
+class LazyField:
+    """
+    事件类混入Model后，Model中用作类型提示的同名嵌套类会遮蔽尚未转换的嵌套字段（__getattr__不会被调用），
+    因此在混入类中以此描述器代为懒加载；通过类访问时仍返回原本的类型提示
+    """
+
+    __slots__ = ("name", "hint")
+
+    def __init__(self, name: str, hint):
+        self.name = name
+        self.hint = hint
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.hint
+        return obj.__getattr__(self.name)
+
+
 def _event_class_reply_get_api(
     obj: object_class, args: tuple, kwargs: Dict
 ) -> Callable:
@@ -104,39 +227,17 @@ class async_event_class(object_class):
 
 
 def objectize(
-    data, api=None, is_async=False
+    data, api=None, is_async=False, cls=None
 ):  # if api is not None, the event is a resp class
     if isinstance(data, dict):
-        _static_copy = None
-        # main func to process data
-        for keys, values in data.items():
+        for keys in data:
             if keys.isnumeric():
                 return data
-            if isinstance(values, dict):
-                data[keys] = objectize(values)
-            elif isinstance(values, list):
-                for i, items in enumerate(values):
-                    if isinstance(items, dict):
-                        data[keys][i] = objectize(items)
         if api:
             data["api"] = api
-            if _static_copy is None:
-                try:
-                    _static_copy = dumps(data)
-                except (TypeError, JSONDecodeError):
-                    _static_copy = str(data)
-            object_data = (
-                async_event_class(_static_copy, data)
-                if is_async
-                else event_class(_static_copy, data)
-            )
-        else:
-            if _static_copy is None:
-                try:
-                    _static_copy = dumps(data)
-                except (TypeError, JSONDecodeError):
-                    _static_copy = str(data)
-            object_data = object_class(_static_copy, data)
-        return object_data
+            if cls is None:
+                cls = async_event_class if is_async else event_class
+            return cls(None, data)
+        return object_class(None, data)
     else:
         return data
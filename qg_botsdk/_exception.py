@@ -20,3 +20,13 @@ class WaitError(Exception):
     """Raised when api.wait_for() got an error"""
 
     ...
+
+
+class ApiError(Exception):
+    """Raised when a paginated api iterator got an error response"""
+
+    def __init__(self, data, trace_id=None, http_code=None):
+        super().__init__(f"API返回错误[{http_code}]：{data}，trace_id：{trace_id}")
+        self.data = data
+        self.trace_id = trace_id
+        self.http_code = http_code
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SDK内部统一使用的JSON编解码，已安装orjson时使用orjson，否则使用标准库json
+
+orjson不支持超出64位的整数：解码时orjson报错则交由标准库json解析，但部分旧版本的orjson会直接解析为float（可能丢失精度）；
+编码时则交由标准库json编码
+"""
+
+import json
+from json import JSONDecodeError  # orjson.JSONDecodeError 为其子类
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+__all__ = ("JSONDecodeError", "dumps", "loads", "BACKEND")
+
+
+def _default(obj):
+    return obj.__json__() if hasattr(obj, "__json__") else str(obj)
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:  # 如超出64位的整数，交由标准库json解析或报错
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj, default=_default).decode()
+        except TypeError:  # 如非字符串key、超出64位的整数等orjson不支持的数据
+            return json.dumps(obj, default=_default)
+
+else:
+    BACKEND = "json"
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, default=_default)
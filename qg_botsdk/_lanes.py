@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+FutureLike = Any  # asyncio.Future / asyncio.Task / concurrent.futures.Future
+_Job = Tuple[Callable[[], FutureLike], FutureLike]  # (启动处理函数的函数, 其结果future)
+
+
+class HandlerLanes:
+    """
+    按key串行执行处理函数：同一key的处理函数按提交顺序逐个执行，不同key之间仍完全并行。
+    同时支持asyncio任务（异步模式）及线程池future（同步模式），future完成回调可能来自任意线程，因此内部加锁
+    """
+
+    __slots__ = ("__lanes", "__lock")
+
+    def __init__(self):
+        self.__lanes: Dict[Hashable, Deque[_Job]] = {}
+        self.__lock = Lock()
+
+    def __len__(self):
+        return len(self.__lanes)
+
+    def submit(
+        self,
+        key: Hashable,
+        start: Callable[[], FutureLike],
+        new_future: Callable[[], FutureLike],
+    ) -> FutureLike:
+        """
+        :param key: 串行执行的key，如用户ID、子频道ID、群openid
+        :param start: 开始执行处理函数并返回其future的函数
+        :param new_future: 创建占位future的函数，用于排队中的处理函数，其结果与实际执行结果一致
+        :return: 代表该处理函数执行结果的future
+        """
+        with self.__lock:
+            lane = self.__lanes.get(key)
+            if lane is not None:
+                result = new_future()
+                lane.append((start, result))
+                return result
+            self.__lanes[key] = deque()
+        future = start()
+        future.add_done_callback(lambda _: self.__next(key))
+        return future
+
+    def __next(self, key: Hashable):
+        with self.__lock:
+            lane = self.__lanes[key]
+            if not lane:
+                del self.__lanes[key]
+                return
+            start, result = lane.popleft()
+        try:
+            future = start()
+        except BaseException as e:
+            result.set_exception(e)
+            self.__next(key)
+            return
+
+        def done(f: FutureLike):
+            if f.cancelled():
+                result.cancel()
+            elif f.exception() is not None:
+                result.set_exception(f.exception())
+            else:
+                result.set_result(f.result())
+            self.__next(key)
+
+        future.add_done_callback(done)
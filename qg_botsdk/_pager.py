@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from asyncio import ensure_future
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from aiohttp import ClientResponse
+
+from ._event import LazyList, objectize
+from ._exception import ApiError
+from ._json import JSONDecodeError, loads
+from ._utils import is_error_body
+from .model import ResponseMode
+
+Getter = Callable[[str], Awaitable[ClientResponse]]
+
+
+class Pager(NamedTuple):
+    """
+    分页API的描述
+
+    - url: 第一页的url
+    - next_url: 根据当前页的数据返回下一页的url，没有下一页时返回None
+    - items_of: 返回当前页中的数据列表
+    - key: 去除重复数据所用的键，如成员的用户id；None为不去重
+    """
+
+    url: Optional[str]
+    next_url: Callable[[Any], Optional[str]]
+    items_of: Callable[[Any], Iterable]
+    key: Optional[Callable[[Dict], Any]] = None
+
+
+def _discard(future):
+    if future.done():
+        if not future.cancelled() and future.exception() is None:
+            resp = future.result()
+            if resp is not None:
+                resp.release()
+    else:
+        future.cancel()
+
+
+async def iter_pages(
+    get: Getter, pager: Pager, prefetch: bool = True
+) -> AsyncIterator[Tuple[ClientResponse, bytes, Any]]:
+    """
+    依次请求分页API的每一页，产出(ClientResponse, 原始bytes, 解析后的数据)；遇到错误返回时产出该页后结束
+
+    :param prefetch: 是否在产出当前页的同时开始请求下一页
+    """
+    url, pending = pager.url, None
+    try:
+        while url:
+            if pending is None:
+                return_ = await get(url)
+            else:
+                return_, pending = await pending, None
+            body = await return_.read()
+            page = loads(body)
+            if is_error_body(page):
+                yield return_, body, page
+                return
+            url = pager.next_url(page)
+            if prefetch and url:
+                pending = ensure_future(get(url))
+            yield return_, body, page
+    finally:
+        if pending is not None:
+            _discard(pending)
+
+
+async def iter_items(
+    get: Getter, pager: Pager, prefetch: bool = True
+) -> AsyncIterator[Any]:
+    """
+    逐项产出分页API的数据（已转换为object数据）；遇到错误返回时抛出ApiError
+    """
+    seen = set()
+    pages = iter_pages(get, pager, prefetch)
+    try:
+        async for return_, _, page in pages:
+            if is_error_body(page):
+                raise ApiError(
+                    page, return_.headers.get("X-Tps-Trace-Id"), return_.status
+                )
+            for items in pager.items_of(page):
+                if pager.key is not None:
+                    k = pager.key(items)
+                    if k in seen:
+                        continue
+                    seen.add(k)
+                yield objectize(items)
+    finally:
+        await pages.aclose()
+
+
+async def collect_pages(
+    get: Getter,
+    pager: Pager,
+    response_mode: ResponseMode,
+    logger,
+    allow_empty: bool = False,
+):
+    """
+    请求分页API的所有页并汇总为一个返回
+
+    :param response_mode: 返回数据的形式，RAW时.data为每页的原始bytes列表（仍需解析以获取下一页的位置）
+    :param allow_empty: 没有任何数据时是否仍视为成功
+    """
+    trace_ids = []
+    codes = []
+    results = []
+    data = []
+    seen = set()
+    raw = response_mode is ResponseMode.RAW
+    pages = iter_pages(get, pager)
+    try:
+        async for return_, body, page in pages:
+            trace_ids.append(return_.headers.get("X-Tps-Trace-Id"))
+            codes.append(return_.status)
+            if is_error_body(page):
+                results.append(False)
+                data.append(body if raw else page)
+                break
+            results.append(True)
+            if raw:
+                data.append(body)
+                continue
+            for items in pager.items_of(page):
+                if pager.key is not None:
+                    k = pager.key(items)
+                    if k in seen:
+                        continue
+                    seen.add(k)
+                data.append(items)
+    except (JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+        logger.error(f"API调用解析响应失败: {e.__class__.__name__}: {e}")
+        data = []
+        results = []
+    finally:
+        await pages.aclose()
+    if not data and not allow_empty or not results:
+        results = [False]
+    if response_mode is ResponseMode.LAZY:
+        data = LazyList(data)
+    elif response_mode is ResponseMode.ITER:
+        data = (objectize(items) for items in data)
+    return objectize(
+        {
+            "data": data,
+            "trace_id": trace_ids,
+            "http_code": codes,
+            "result": results,
+        }
+    )
@@ -1,64 +1,96 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from ._event import LazyField, async_event_class, event_class
 from ._statics import EVENTS, EVENTS_ENUM
-from .model import Model
+from ._utils import treat_thread
+from .model import CommandValidScenes, Model
 
-EVENTS_TO_DISPATCH = {
-    **dict(
-        zip(
-            EVENTS.GUILD,
-            [("on_guild_event", EVENTS_ENUM.GUILD)] * len(EVENTS.GUILD),
-        )
+
+class EventRoute(NamedTuple):
+    """
+    事件路由，BotProto.data_process按事件类型查得后依序执行：沙箱检查 -> pre -> 指令分发 -> 回调函数
+
+    - handler: 回调函数于func_registers中的键
+    - sandbox: 沙箱检查所用的事件分组，None为不进行检查
+    - scene: 消息事件的指令场景，不为None时先处理消息文本（treated_msg）并分发指令，未短路才调用回调函数
+    - pre: 调用回调函数前依序执行的步骤，接收(BotProto, 事件数据)，返回False时不再分发此事件
+    """
+
+    handler: str
+    sandbox: Optional[EVENTS_ENUM] = None
+    scene: Optional[CommandValidScenes] = None
+    pre: Tuple[Callable[[Any, Dict], bool], ...] = ()
+
+
+def _treat_thread(proto, data: Dict) -> bool:
+    treat_thread(data)
+    return True
+
+
+def _filter_self_delete(proto, data: Dict) -> bool:
+    # 过滤用户自行撤回的消息
+    if not proto.func_registers.get("del_is_filter_self", True):
+        return True
+    d = data["d"]
+    target = d.get("message", {}).get("author", {}).get("id")
+    op_user = d.get("op_user", {}).get("id")
+    return op_user != target
+
+
+def _routes(events: Tuple[str, ...], route: EventRoute) -> Dict[str, EventRoute]:
+    return dict.fromkeys(events, route)
+
+
+EVENT_ROUTES: Dict[str, EventRoute] = {
+    **_routes(
+        EVENTS.MESSAGE_CREATE,
+        EventRoute("on_msg", EVENTS_ENUM.MESSAGE_CREATE, CommandValidScenes.GUILD),
     ),
-    **dict(
-        zip(
-            EVENTS.CHANNEL,
-            [("on_channel_event", EVENTS_ENUM.CHANNEL)] * len(EVENTS.CHANNEL),
-        )
+    **_routes(
+        EVENTS.DM_CREATE,
+        EventRoute("on_dm", EVENTS_ENUM.DM_CREATE, CommandValidScenes.DM),
     ),
-    **dict(
-        zip(
-            EVENTS.GUILD_MEMBER,
-            [("on_guild_member", EVENTS_ENUM.GUILD_MEMBER)] * len(EVENTS.GUILD_MEMBER),
-        )
+    **_routes(
+        EVENTS.C2C_MESSAGE_CREATE,
+        EventRoute(
+            "on_friend_msg", EVENTS_ENUM.C2C_MESSAGE_CREATE, CommandValidScenes.C2C
+        ),
     ),
-    **dict(
-        zip(
-            EVENTS.REACTION,
-            [("on_reaction", EVENTS_ENUM.REACTION)] * len(EVENTS.REACTION),
-        )
+    **_routes(
+        EVENTS.GROUP_AT_MESSAGE_CREATE,
+        EventRoute(
+            "on_group_msg",
+            EVENTS_ENUM.GROUP_AT_MESSAGE_CREATE,
+            CommandValidScenes.GROUP,
+        ),
     ),
-    **dict(
-        zip(
-            EVENTS.INTERACTION,
-            [("on_interaction", EVENTS_ENUM.INTERACTION)] * len(EVENTS.INTERACTION),
-        )
+    **_routes(
+        EVENTS.MESSAGE_DELETE,
+        EventRoute("on_delete", EVENTS_ENUM.MESSAGE_DELETE, pre=(_filter_self_delete,)),
     ),
-    **dict(zip(EVENTS.AUDIT, [("on_audit", EVENTS_ENUM.AUDIT)] * len(EVENTS.AUDIT))),
-    **dict(
-        zip(
-            EVENTS.OPEN_FORUM,
-            [("on_open_forum", EVENTS_ENUM.OPEN_FORUM)] * len(EVENTS.OPEN_FORUM),
-        )
+    **_routes(EVENTS.FORUM, EventRoute("on_forum", EVENTS_ENUM.FORUM)),
+    "FORUM_THREAD_CREATE": EventRoute(
+        "on_forum", EVENTS_ENUM.FORUM, pre=(_treat_thread,)
     ),
-    **dict(zip(EVENTS.AUDIO, [("on_audio", EVENTS_ENUM.AUDIO)] * len(EVENTS.AUDIO))),
-    **dict(
-        zip(
-            EVENTS.ALC_MEMBER,
-            [("on_live_channel_member", EVENTS_ENUM.ALC_MEMBER)]
-            * len(EVENTS.ALC_MEMBER),
-        )
+    **_routes(EVENTS.GUILD, EventRoute("on_guild_event", EVENTS_ENUM.GUILD)),
+    **_routes(EVENTS.CHANNEL, EventRoute("on_channel_event", EVENTS_ENUM.CHANNEL)),
+    **_routes(
+        EVENTS.GUILD_MEMBER, EventRoute("on_guild_member", EVENTS_ENUM.GUILD_MEMBER)
     ),
-    **dict(
-        zip(
-            EVENTS.GROUP,
-            [("on_group_event", EVENTS_ENUM.GROUP)] * len(EVENTS.GROUP),
-        )
+    **_routes(EVENTS.REACTION, EventRoute("on_reaction", EVENTS_ENUM.REACTION)),
+    **_routes(
+        EVENTS.INTERACTION, EventRoute("on_interaction", EVENTS_ENUM.INTERACTION)
     ),
-    **dict(
-        zip(
-            EVENTS.FRIEND,
-            [("on_friend_event", EVENTS_ENUM.FRIEND)] * len(EVENTS.FRIEND),
-        )
+    **_routes(EVENTS.AUDIT, EventRoute("on_audit", EVENTS_ENUM.AUDIT)),
+    **_routes(EVENTS.OPEN_FORUM, EventRoute("on_open_forum", EVENTS_ENUM.OPEN_FORUM)),
+    **_routes(EVENTS.AUDIO, EventRoute("on_audio", EVENTS_ENUM.AUDIO)),
+    **_routes(
+        EVENTS.ALC_MEMBER,
+        EventRoute("on_live_channel_member", EVENTS_ENUM.ALC_MEMBER),
     ),
+    **_routes(EVENTS.GROUP, EventRoute("on_group_event", EVENTS_ENUM.GROUP)),
+    **_routes(EVENTS.FRIEND, EventRoute("on_friend_event", EVENTS_ENUM.FRIEND)),
 }
 
 EVENTS_TO_MODEL = {
@@ -165,3 +197,73 @@ EVENTS_TO_MODEL = {
         )
     ),
 }
+
+MIXED_CLASSES_LIMIT = 256
+_MIXED_CLASSES: "OrderedDict[Tuple[type, type], type]" = OrderedDict()
+_EVENT_CLASSES: Dict[Tuple[Optional[str], bool], type] = {}
+# 被_EVENT_CLASSES引用的组合，淘汰后再次创建会产生重复的类，因此不参与淘汰
+_PINNED_MIXED_CLASSES: Set[Tuple[type, type]] = set()
+
+
+def get_mixed_class(base: type, model_class: type) -> type:
+    """
+    获取同时继承base与model_class的类，每种(base, model_class)组合只创建一次，
+    缓存数量超过MIXED_CLASSES_LIMIT时淘汰最久未使用的组合（按事件类型缓存的事件类所用的组合除外）
+
+    :param base: 原始事件类
+    :param model_class: 事件对应的Model类
+    :return: 混入后的类
+    """
+    key = (base, model_class)
+    cls = _MIXED_CLASSES.get(key)
+    if cls is None:
+        cls = type(
+            base.__name__,
+            (base, model_class),
+            {
+                name: LazyField(name, value)
+                for klass in reversed(model_class.__mro__)
+                for name, value in vars(klass).items()
+                if isinstance(value, type)
+                and not name.startswith("_")
+                and not hasattr(base, name)
+            },
+        )
+        _MIXED_CLASSES[key] = cls
+        if len(_MIXED_CLASSES) > MIXED_CLASSES_LIMIT:
+            for old_key in _MIXED_CLASSES:
+                if old_key not in _PINNED_MIXED_CLASSES and old_key != key:
+                    del _MIXED_CLASSES[old_key]
+                    break
+    else:
+        _MIXED_CLASSES.move_to_end(key)
+    return cls
+
+
+def mixed_classes_count() -> int:
+    """
+    :return: 当前缓存的混入事件类数量
+    """
+    return len(_MIXED_CLASSES)
+
+
+def get_event_class(t: Optional[str], is_async: bool) -> type:
+    """
+    按事件类型缓存已混入对应Model的事件类，避免每个事件都通过type()重新创建类
+
+    :param t: 事件类型，如MESSAGE_CREATE
+    :param is_async: 是否异步模式
+    :return: 事件类
+    """
+    key = (t, is_async)
+    cls = _EVENT_CLASSES.get(key)
+    if cls is None:
+        base = async_event_class if is_async else event_class
+        model_class = EVENTS_TO_MODEL.get(t, None)
+        if model_class:
+            cls = get_mixed_class(base, model_class)
+            _PINNED_MIXED_CLASSES.add((base, model_class))
+        else:
+            cls = base
+        _EVENT_CLASSES[key] = cls
+    return cls
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os
 import pickle
-from asyncio import AbstractEventLoop, sleep
+from asyncio import AbstractEventLoop, Task, sleep
 from collections import namedtuple
-from copy import deepcopy
-from time import time
-from typing import Dict, Hashable, Iterable, List, Optional, Union
+from copy import copy, deepcopy
+from functools import partial
+from heapq import heappop, heappush
+from itertools import count
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Union
 from weakref import finalize
 
+from ._exception import WaitError
 from ._statics import EVENTS, EventIDEvents, MsgIDEvents
 from ._utils import exception_handler
 from .api import API
@@ -23,9 +27,19 @@ from .model import (
     SessionStatus,
     WaitForCommandCallback,
 )
+from .session_storage import (
+    AbstractSessionStorage,
+    FileSessionStorage,
+    Record,
+    apply_records,
+    rows_to_sessions,
+)
 
 _AllScopeStr = ("USER", "GUILD", "CHANNEL", "GROUP", "GLOBAL")
 ScopeRegisterKey = namedtuple("ScopeRegisterKey", _AllScopeStr)
+FutureLike = Any  # asyncio.Future / concurrent.futures.Future
+# 改动标记中代表清空整个scope/identify的位置：(_CLEAR, scope, identify)
+_CLEAR = "CLEAR"
 
 
 class _SessionObject:
@@ -68,6 +82,16 @@ class _SessionObject:
             f"timeout_reply_message_id_expire={self.timeout_reply_message_id_expire}>"
         )
 
+    def copy(self) -> "_SessionObject":
+        """
+        复制session，data及timeout_reply_params一并复制（浅复制），之后对原session的修改不影响副本
+        """
+        session = copy(self)
+        session.data = dict(self.data)
+        if self.timeout_reply_params is not None:
+            session.timeout_reply_params = dict(self.timeout_reply_params)
+        return session
+
 
 class SessionManager:
     """
@@ -84,16 +108,55 @@ class SessionManager:
         logger: Logger,
         commit_path: Optional[str] = None,
         is_auto_commit: bool = True,
+        storage: Optional[AbstractSessionStorage] = None,
     ):
+        # 内存中的session；按需读取的存储后端下仅为使用过的session的缓存
         self.__sessions: Dict = {x: {} for x in _AllScopeStr}
-        self.__sessions_pk_cache = None
+        # 只记录有改动的位置，由管理循环批量交由存储后端写入
+        self.__dirty: Dict[Tuple, None] = {}
+        self.__inflight: Dict[Tuple, None] = {}  # 正在写入中的改动位置
+        self.__inflight_records: List[Record] = []
+        self.__dirty_lock = Lock()
+        self.__need_snapshot = False
+        self.__commit_task: Optional[Task] = None
+        self.__io_lock = Lock()  # 同一时间只有一个写入操作
+        # 每次写入完整快照后递增；基于旧快照取出的记录已包含于新快照中，不再写入日志
+        self.__generation = 0
+        self.__commit_count = 0
+        self.__snapshot_count = 0
+        self.__coalesced_count = 0
+        self.__failed_count = 0
+        self.__total_commit_time = 0.0
+        self.__last_commit_time = 0.0
+        self.__max_commit_time = 0.0
+        # 到期索引：(到期时间, 序号, (scope, identify, key))的小根堆，仅记录有timeout或gc时间的session
+        self.__expiry_heap: List[Tuple[float, int, Tuple[str, Hashable, Hashable]]] = []
+        self.__expiry_scheduled: Dict[Tuple[str, Hashable, Hashable], float] = {}
+        self.__expiry_counter = count()
+        self.__expiry_lock = Lock()
         self.__wait_for_registers: Dict = {}
+        # 按各个非None的scope值索引wait_for，使查找候选只需数次dict查找，而非遍历所有等待中的wait_for
+        self.__wait_for_index: Dict[str, Dict[Hashable, Set[ScopeRegisterKey]]] = {
+            x: {} for x in _AllScopeStr
+        }
+        self.__wait_for_wildcards: Set[ScopeRegisterKey] = set()
+        self.__wait_for_meta: Dict[ScopeRegisterKey, Tuple[int, int]] = {}
+        self.__wait_for_seq = 0
+        # 同步模式下register_wait_for()/del_wait_for()于其他线程调用，与事件循环中的查找互斥
+        self.__wait_for_lock = Lock()
         self.__logger: Logger = logger
         self.__bot_identify: str = logger.bot_app_id
-        self.__commit_path: str = commit_path or os.path.join(
-            os.getcwd(), "session_data"
-        )
-        self.__check_path(self.__commit_path)
+        if storage is None:
+            storage = FileSessionStorage(commit_path)
+        elif not isinstance(storage, AbstractSessionStorage):
+            raise TypeError("传入的存储后端不是AbstractSessionStorage类")
+        self.__storage = storage
+        self.__storage.open(self.__bot_identify, logger)
+        self.__on_demand = storage.lazy and storage.load_on_demand
+        # 按需读取时，上次释放缓存以来使用过的session位置，这些session暂不释放
+        self.__cache_used: Set[Tuple[str, Hashable, Hashable]] = set()
+        self.__cache_lock = Lock()
+        self.__last_evict = time()
         self.__is_auto_commit = is_auto_commit
         self.__is_running = False
         self.fetch_data()
@@ -109,7 +172,7 @@ class SessionManager:
             print(msg)
 
     def __del__(self):
-        if self.__is_auto_commit:
+        if self.__storage.persistent and (self.__is_auto_commit or self.__storage.lazy):
             self.__logger_exception_handler(
                 "info", "Session Manager结束中，正在保存数据..."
             )
@@ -121,16 +184,6 @@ class SessionManager:
                 )
 
     # -*- class internal methods -*-
-    @staticmethod
-    def __check_path(commit_path: str):
-        if not os.path.exists(commit_path):
-            path_splits = os.path.split(commit_path)
-            if "." in path_splits[-1]:
-                raise ValueError(f"路径 '{commit_path}' 不是文件夹（包含'.'）")
-            os.makedirs(commit_path)
-        elif not os.path.isdir(commit_path):
-            raise ValueError(f"路径 '{commit_path}' 不是文件夹")
-
     @staticmethod
     def __end_session(session: _SessionObject):
         session.status = SessionStatus.INACTIVE
@@ -145,102 +198,392 @@ class SessionManager:
         if session.status != SessionStatus.ACTIVE:
             session.status = SessionStatus.ACTIVE
 
-    def __manage_session_object(self, loop, time_now, session, scope, identify):
-        _change = False
-        gc_keys = []
-        for k, v in session.items():
-            if not isinstance(
-                v, _SessionObject
-            ):  # prevent dead loop on non valid object
-                gc_keys.append(k)
-                continue
-            if (
-                v.status == SessionStatus.ACTIVE
-                and v.timeout is not None
-                and time_now - v.last_operate > v.timeout
-            ):
-                if v.timeout_reply:
-                    try:
-                        if time_now > v.timeout_reply_message_id_expire:
-                            del v.timeout_reply_params["message_id"]
-                        elif (
-                            v.timeout_reply_api == "send_group_msg"
-                            or v.timeout_reply_api == "send_qq_dm"
-                        ):
-                            v.timeout_reply_params["msg_seq"] = (
-                                999999999  # 保证消息不会因为这破msg_seq而被忽略
-                            )
-                        _params = {"content": v.timeout_reply, **v.timeout_reply_params}
-                        if isinstance(self.api, AsyncAPI):
-                            loop.create_task(
-                                getattr(self.api, v.timeout_reply_api)(**_params)
-                            )
-                        elif isinstance(self.api, API):
-                            loop.create_task(
-                                getattr(self.api._api, v.timeout_reply_api)(**_params)
-                            )
-                    except Exception as e:
-                        self.__logger.error(
-                            f"Session({scope}::{k}) 超时回调错误：{e.__repr__()}"
-                        )
-                        self.__logger.error(exception_handler(e))
-                if identify:
-                    self.__logger.info(f"Session({scope}::{identify}::{k}) 已超时")
-                else:
-                    self.__logger.info(f"Session({scope}::{k}) 已超时")
-                self.__end_session(v)
-                _change = True
-            if (
-                v.status == SessionStatus.INACTIVE
-                and v.gc_timeout_stamp is not None
-                and time_now > v.gc_timeout_stamp
+    @staticmethod
+    def __due_time(session: _SessionObject) -> Optional[float]:
+        if session.status == SessionStatus.ACTIVE and session.timeout is not None:
+            return session.last_operate + session.timeout
+        if (
+            session.status == SessionStatus.INACTIVE
+            and session.gc_timeout_stamp is not None
+        ):
+            return session.gc_timeout_stamp
+        return None
+
+    def __schedule(self, scope: str, identify: Hashable, key: Hashable, session):
+        """
+        将session加入到期索引；同一位置已有更早的检查时无需重复加入，届时会按最新状态重新计算
+        """
+        due = self.__due_time(session)
+        if due is not None:
+            self.__schedule_due((scope, identify, key), due)
+
+    def __schedule_due(self, loc: Tuple[str, Hashable, Hashable], due: float):
+        with self.__expiry_lock:
+            scheduled = self.__expiry_scheduled.get(loc)
+            if scheduled is not None and scheduled <= due:
+                return
+            self.__expiry_scheduled[loc] = due
+            heappush(self.__expiry_heap, (due, next(self.__expiry_counter), loc))
+
+    def __schedule_all(self):
+        """
+        读取数据后重建到期索引，同时清理格式错误的数据
+        """
+        if self.__on_demand:
+            for scope, identify, key, due in self.__storage.scheduled():
+                self.__schedule_due((scope, identify, key), due)
+            return
+        for scope in _AllScopeStr:
+            sessions = self.__sessions[scope]
+            if scope == "GLOBAL":
+                groups = {None: sessions}
+            else:
+                groups = sessions
+            for identify, session in list(groups.items()):
+                if not isinstance(session, dict):
+                    self.__logger.error(
+                        f"Session({scope}::{identify}) 数据格式错误，将被清理"
+                    )
+                    del sessions[identify]
+                    continue
+                for k, v in list(session.items()):
+                    if not isinstance(v, _SessionObject):
+                        del session[k]
+                        continue
+                    self.__schedule(scope, identify, k, v)
+
+    def __pop_due(self, time_now: float) -> Optional[Tuple[str, Hashable, Hashable]]:
+        with self.__expiry_lock:
+            while self.__expiry_heap and self.__expiry_heap[0][0] <= time_now:
+                due, _, loc = heappop(self.__expiry_heap)
+                if self.__expiry_scheduled.get(loc) == due:
+                    del self.__expiry_scheduled[loc]
+                    return loc
+        return None
+
+    def __next_due(self) -> Optional[float]:
+        with self.__expiry_lock:
+            return self.__expiry_heap[0][0] if self.__expiry_heap else None
+
+    def __mark_dirty(self, loc: Tuple[str, Hashable, Hashable]):
+        """
+        记录有改动的位置，重复标记时移至末尾，使写入的顺序与改动顺序一致
+        """
+        if not self.__storage.persistent or (
+            not self.__is_auto_commit and not self.__storage.lazy
+        ):
+            return
+        with self.__dirty_lock:
+            self.__dirty.pop(loc, None)
+            self.__dirty[loc] = None
+
+    def __is_pending_removed(self, scope: str, identify: Hashable, key: Hashable):
+        """
+        不在内存中的session是否已被删除或清空但尚未写入存储后端，此时不应再从存储后端读取
+        """
+        with self.__dirty_lock:
+            for pending in (self.__dirty, self.__inflight):
+                if (
+                    (scope, identify, key) in pending
+                    or (_CLEAR, None, None) in pending
+                    or (_CLEAR, scope, None) in pending
+                    or (_CLEAR, scope, identify) in pending
+                ):
+                    return True
+        return False
+
+    def __lookup(
+        self, scope: str, identify: Hashable, key: Hashable
+    ) -> Optional[_SessionObject]:
+        """
+        查找session，不在内存中时从按需读取的存储后端读取并缓存
+        """
+        if not self.__on_demand:
+            group = self.__sessions[scope]
+            if identify is not None:
+                group = group.get(identify)
+            return group.get(key) if isinstance(group, dict) else None
+        loc = (scope, identify, key)
+        with self.__cache_lock:
+            self.__cache_used.add(loc)
+            group = self.__sessions[scope]
+            if identify is not None:
+                group = group.get(identify)
+            if isinstance(group, dict) and key in group:
+                return group[key]
+        if self.__is_pending_removed(scope, identify, key):
+            return None
+        payload = self.__storage.load(scope, identify, key)
+        if payload is None:
+            return None
+        session = pickle.loads(payload)
+        with self.__cache_lock:
+            self.__cache_used.add(loc)
+            group = self.__sessions[scope]
+            if identify is not None:
+                group = group.setdefault(identify, {})
+            return group.setdefault(key, session)
+
+    def __evict_cache(self):
+        """
+        释放上次释放以来未被使用、没有未写入的改动且无需检查超时的session，之后使用时重新从存储后端读取
+        """
+        with self.__cache_lock:
+            used, self.__cache_used = self.__cache_used, set()
+            for scope, groups in self.__sessions.items():
+                items = [(None, groups)] if scope == "GLOBAL" else list(groups.items())
+                for identify, group in items:
+                    if not isinstance(group, dict):
+                        continue
+                    for key in list(group):
+                        loc = (scope, identify, key)
+                        if loc in used or loc in self.__expiry_scheduled:
+                            continue
+                        with self.__dirty_lock:
+                            if loc in self.__dirty or loc in self.__inflight:
+                                continue
+                        del group[key]
+                    if identify is not None and not group:
+                        del groups[identify]
+
+    def __build_record(self, loc: Tuple[str, Hashable, Hashable]) -> Record:
+        """
+        生成改动记录，"set"记录暂存session的副本，由__serialize_records()序列化
+        """
+        scope, identify, key = loc
+        if scope == _CLEAR:
+            return ("clear", identify, key)
+        group = self.__sessions[scope]
+        if identify is not None:
+            group = group.get(identify)
+        session = group.get(key) if isinstance(group, dict) else None
+        if isinstance(session, _SessionObject):
+            return (
+                "set",
+                scope,
+                identify,
+                key,
+                session.copy(),
+                self.__due_time(session),
+            )
+        return ("del", scope, identify, key)
+
+    @staticmethod
+    def __serialize_records(records: List[Record]) -> List[Record]:
+        """
+        序列化"set"记录中的session副本，可于线程池中调用
+        """
+        return [
+            x[:4] + (pickle.dumps(x[4]), x[5]) if x[0] == "set" else x for x in records
+        ]
+
+    def __take_dirty(self) -> List[Record]:
+        """
+        取出所有改动并生成记录（需在事件循环所在线程调用），记录在写入完成前保留于inflight。
+        此处只复制session，序列化于__write_records()中进行，不占用事件循环
+        """
+        with self.__dirty_lock:
+            dirty, self.__dirty = self.__dirty, {}
+            self.__inflight.update(dirty)
+        records = [self.__build_record(loc) for loc in dirty]
+        self.__inflight_records.extend(records)
+        return records
+
+    def __done_inflight(self):
+        with self.__dirty_lock:
+            self.__inflight.clear()
+        self.__inflight_records = []
+
+    def __freeze(self) -> Dict:
+        """
+        复制所有session（含data），作为快照写入期间不变的数据；
+        get()等方法返回的data为内存中session的data，用户在快照写入期间修改它不会影响快照
+        """
+        frozen = {}
+        for scope, groups in self.__sessions.items():
+            if scope == "GLOBAL":
+                frozen[scope] = {k: v.copy() for k, v in groups.items()}
+            else:
+                frozen[scope] = {
+                    i: {k: v.copy() for k, v in g.items()} if isinstance(g, dict) else g
+                    for i, g in groups.items()
+                }
+        return frozen
+
+    def __record_commit(self, start: float, is_snapshot: bool):
+        duration = monotonic() - start
+        self.__commit_count += 1
+        self.__snapshot_count += is_snapshot
+        self.__total_commit_time += duration
+        self.__last_commit_time = duration
+        if duration > self.__max_commit_time:
+            self.__max_commit_time = duration
+
+    def __write_records(self, records: List[Record], generation: Optional[int] = None):
+        records = self.__serialize_records(records)
+        with self.__io_lock:
+            if generation is not None and generation != self.__generation:
+                return
+            start = monotonic()
+            self.__storage.apply(records)
+            self.__record_commit(start, False)
+
+    def __write_snapshot(self, sessions: Dict, pk_data: Optional[bytes] = None):
+        with self.__io_lock:
+            start = monotonic()
+            if pk_data is None:
+                pk_data = self.__storage.serialize_snapshot(sessions)
+            self.__storage.write_snapshot(pk_data)
+            self.__generation += 1
+            self.__record_commit(start, True)
+
+    @property
+    def commit_metrics(self) -> Dict[str, Any]:
+        """
+        数据写入的运行指标
+
+        - commits: 已完成的写入次数（含完整快照）
+        - snapshots: 已完成的完整快照次数
+        - coalesced: 因上一次写入尚未完成而合并至下一次写入的次数
+        - failed: 写入失败的次数
+        - last_duration / max_duration / avg_duration: 写入（含序列化快照）的最近/最长/平均秒数
+        """
+        return {
+            "commits": self.__commit_count,
+            "snapshots": self.__snapshot_count,
+            "coalesced": self.__coalesced_count,
+            "failed": self.__failed_count,
+            "last_duration": self.__last_commit_time,
+            "max_duration": self.__max_commit_time,
+            "avg_duration": (
+                self.__total_commit_time / self.__commit_count
+                if self.__commit_count
+                else 0.0
+            ),
+        }
+
+    def __request_flush(self, loop: AbstractEventLoop):
+        """
+        开始写入改动；上一次写入尚未完成时不重复开始，期间的改动合并至下一次写入
+        """
+        if self.__commit_task is not None and not self.__commit_task.done():
+            if self.__dirty:
+                self.__coalesced_count += 1
+            return
+        if self.__dirty or self.__need_snapshot:
+            self.__commit_task = loop.create_task(self.__flush_dirty(loop))
+
+    async def __flush_dirty(self, loop: AbstractEventLoop):
+        """
+        将有改动的session交由存储后端写入（在线程池中进行，不阻塞事件循环），后端需要时写入完整快照。
+        改动记录及完整快照均基于复制的session在线程池中序列化，写入期间内存中的session可照常修改
+        """
+        storage = self.__storage
+        if not storage.persistent or (not self.__dirty and not self.__need_snapshot):
+            return
+        try:
+            if not storage.lazy and (self.__need_snapshot or storage.snapshot_required):
+                self.__need_snapshot = True
+                with self.__dirty_lock:
+                    self.__dirty.clear()
+                await loop.run_in_executor(None, self.__write_snapshot, self.__freeze())
+                self.__need_snapshot = False
+            else:
+                generation = self.__generation
+                records = self.__take_dirty()
+                await loop.run_in_executor(
+                    None, self.__write_records, records, generation
+                )
+                self.__done_inflight()
+        except Exception as e:
+            self.__failed_count += 1
+            with self.__dirty_lock:  # 写入失败的改动重新标记，待下次写入
+                dirty, self.__dirty = self.__dirty, self.__inflight
+                self.__inflight = {}
+                for loc in dirty:
+                    self.__dirty.pop(loc, None)
+                    self.__dirty[loc] = None
+            self.__inflight_records = []
+            self.__logger.error(f"Session Manager 保存数据时出现错误：{repr(e)}")
+
+    def __timeout_reply(self, loop, time_now, v: _SessionObject, scope, k):
+        try:
+            if time_now > v.timeout_reply_message_id_expire:
+                del v.timeout_reply_params["message_id"]
+            elif (
+                v.timeout_reply_api == "send_group_msg"
+                or v.timeout_reply_api == "send_qq_dm"
             ):
-                gc_keys.append(k)
-        for k in gc_keys:
-            del session[k]
-            _change = True
-        return _change
+                v.timeout_reply_params["msg_seq"] = (
+                    999999999  # 保证消息不会因为这破msg_seq而被忽略
+                )
+            _params = {"content": v.timeout_reply, **v.timeout_reply_params}
+            if isinstance(self.api, AsyncAPI):
+                loop.create_task(getattr(self.api, v.timeout_reply_api)(**_params))
+            elif isinstance(self.api, API):
+                loop.create_task(getattr(self.api._api, v.timeout_reply_api)(**_params))
+        except Exception as e:
+            self.__logger.error(f"Session({scope}::{k}) 超时回调错误：{e.__repr__()}")
+            self.__logger.error(exception_handler(e))
+
+    def __manage_due_session(self, loop, time_now, scope, identify, k) -> bool:
+        """
+        处理一个到期的session：ACTIVE超时则结束（并发送超时回复），INACTIVE到达回收时间则删除
+
+        :return: 是否有改动
+        """
+        v = self.__lookup(scope, identify, k)
+        if not isinstance(v, _SessionObject):
+            return False
+        sessions = self.__sessions[scope]
+        if identify is not None:
+            sessions = sessions[identify]
+        due = self.__due_time(v)
+        if due is None:
+            return False
+        if due > time_now:  # 到期前被操作过，按新的到期时间重新加入索引
+            self.__schedule(scope, identify, k, v)
+            return False
+        if v.status == SessionStatus.ACTIVE:
+            if v.timeout_reply:
+                self.__timeout_reply(loop, time_now, v, scope, k)
+            if identify:
+                self.__logger.info(f"Session({scope}::{identify}::{k}) 已超时")
+            else:
+                self.__logger.info(f"Session({scope}::{k}) 已超时")
+            self.__end_session(v)
+            self.__schedule(scope, identify, k, v)
+        else:
+            del sessions[k]
+            if identify is not None and not sessions:
+                del self.__sessions[scope][identify]
+        self.__mark_dirty((scope, identify, k))
+        return True
 
     async def __manager_loop(self, loop: AbstractEventLoop):
         while True:
-            await sleep(0.5)
+            next_due = self.__next_due()
+            wait = 0.5 if next_due is None else min(0.5, max(0.01, next_due - time()))
+            await sleep(wait)
             change = False
             try:
                 time_now = time()
-                for scope in _AllScopeStr:
-                    sessions = self.__check_scope(scope)
-                    if scope == "GLOBAL":
-                        change = self.__manage_session_object(
-                            loop, time_now, sessions, scope, None
-                        )
-                    else:
-                        gc_identifies = []
-                        for identify, session in sessions.items():
-                            if not isinstance(session, dict):
-                                self.__logger.error(
-                                    f"Session({scope}::{identify}) 数据格式错误，将被清理"
-                                )
-                                gc_identifies.append(identify)
-                                continue
-                            change = self.__manage_session_object(
-                                loop, time_now, session, scope, identify
-                            )
-                            if not session:
-                                gc_identifies.append(identify)
-                        for identify in gc_identifies:
-                            del sessions[identify]
-                            change = True
+                while True:
+                    loc = self.__pop_due(time_now)
+                    if loc is None:
+                        break
+                    change |= self.__manage_due_session(loop, time_now, *loc)
+                if (
+                    self.__on_demand
+                    and time_now - self.__last_evict >= self.__storage.cache_ttl
+                ):
+                    self.__last_evict = time_now
+                    self.__evict_cache()
             except Exception as e:
                 self.__logger.error(e.__repr__())
                 self.__logger.error(exception_handler(e))
             if self.__is_auto_commit:
-                if change:
-                    self.commit_data(is_info=False)
-                else:
-                    _new_pk_data = pickle.dumps(self.__sessions)
-                    if self.__sessions_pk_cache != _new_pk_data:
-                        self.__sessions_pk_cache = _new_pk_data
-                        self.commit_data(is_info=False, pk_data=_new_pk_data)
+                self.__request_flush(loop)
 
     @staticmethod
     def __valid_scope(scope):
@@ -265,6 +608,17 @@ class SessionManager:
             identify = None
         return identify
 
+    def get_identify(self, scope: Union[Scope, str], data) -> Hashable:
+        """
+        获取事件在指定scope下的标识（如用户ID、子频道ID、群openid），无法获取时返回None；GLOBAL返回固定标识
+        """
+        if scope == Scope.GLOBAL or scope == "GLOBAL":
+            return "GLOBAL"
+        try:
+            return self.__check_identify(scope, data)
+        except AttributeError:
+            return None
+
     def __get_reply_params(self, data) -> Dict:
         timeout_reply_api = None
         timeout_reply_params = {}
@@ -415,19 +769,24 @@ class SessionManager:
         return 0
 
     def __check_and_get_target_session(self, obj, scope, key, identify):
+        return self.__locate_target_session(obj, scope, key, identify)[2]
+
+    def __locate_target_session(
+        self, obj, scope, key, identify
+    ) -> Tuple[str, Hashable, _SessionObject]:
+        """
+        :return: (scope, identify, session)，identify为None代表session不按identify分组（如GLOBAL）
+        """
         if not identify:
             identify = self.__check_identify(scope, obj)
         scope = self.__valid_scope(scope)
-        target_sessions = self.__check_scope(scope)
-        if identify:
-            if identify not in target_sessions or key not in target_sessions[identify]:
+        identify = identify or None
+        target_session = self.__lookup(scope, identify, key)
+        if target_session is None:
+            if identify is not None:
                 raise KeyError(f"Scope {scope} 中不存在 {identify}::{key} 的session")
-            target_session = target_sessions[identify][key]
-        else:
-            if key not in target_sessions:
-                raise KeyError(f"Scope {scope} 中不存在 {key} 的session")
-            target_session = target_sessions[key]
-        return target_session
+            raise KeyError(f"Scope {scope} 中不存在 {key} 的session")
+        return scope, identify, target_session
 
     # -*- user methods -*-
     def new(
@@ -445,17 +804,12 @@ class SessionManager:
         if not identify:
             identify = self.__check_identify(scope, obj)
         scope = self.__valid_scope(scope)
-        target_sessions = self.__check_scope(scope)
-        if identify:
-            if identify not in target_sessions:
-                target_sessions[identify] = {}
-            target_sessions = target_sessions[identify]
-        if key in target_sessions and not is_replace:
+        if not is_replace and self.__lookup(scope, identify or None, key) is not None:
             if identify:
                 raise KeyError(f"Scope {scope} 中已存在 {identify}::{key} 的session")
             else:
                 raise KeyError(f"Scope {scope} 中已存在 {key} 的session")
-        target_sessions[key] = _SessionObject(
+        session = _SessionObject(
             status=SessionStatus.ACTIVE,
             data=data if data is not None else {},
             timeout=timeout,
@@ -465,8 +819,14 @@ class SessionManager:
             timeout_reply_message_id_expire=time() + 300,
             **self.__get_reply_params(obj),
         )
-        if self.__is_auto_commit:
-            self.commit_data(is_info=False)
+        with self.__cache_lock:  # 与释放缓存互斥，避免写入刚被释放的分组
+            target_sessions = self.__check_scope(scope)
+            if identify:
+                target_sessions = target_sessions.setdefault(identify, {})
+            target_sessions[key] = session
+            self.__cache_used.add((scope, identify or None, key))
+        self.__schedule(scope, identify or None, key, session)
+        self.__mark_dirty((scope, identify or None, key))
         return SessionObject(scope, SessionStatus.ACTIVE, key, data, identify)
 
     def get(
@@ -480,16 +840,15 @@ class SessionManager:
         if not identify:
             identify = self.__check_identify(scope, obj)
         scope = self.__valid_scope(scope)
-        target_sessions = self.__check_scope(scope)
-        if identify:
-            if identify not in target_sessions or key not in target_sessions[identify]:
-                return default
-            target_session = target_sessions[identify][key]
+        target_session = self.__lookup(scope, identify or None, key)
+        if target_session is None:
+            return default
+        if target_session.status != SessionStatus.ACTIVE:
+            self.__update_last_op(target_session)
+            self.__schedule(scope, identify or None, key, target_session)
         else:
-            if key not in target_sessions:
-                return default
-            target_session = target_sessions[key]
-        self.__update_last_op(target_session)
+            self.__update_last_op(target_session)
+        self.__mark_dirty((scope, identify or None, key))
         return SessionObject(
             scope, target_session.status, key, target_session.data, identify
         )
@@ -502,11 +861,13 @@ class SessionManager:
         data: Dict,
         identify: Hashable = None,
     ) -> SessionObject:
-        target_session = self.__check_and_get_target_session(obj, scope, key, identify)
+        _scope, _identify, target_session = self.__locate_target_session(
+            obj, scope, key, identify
+        )
         target_session.data.update(data)
         self.__update_last_op(target_session)
-        if self.__is_auto_commit:
-            self.commit_data(is_info=False)
+        self.__schedule(_scope, _identify, key, target_session)
+        self.__mark_dirty((_scope, _identify, key))
         return SessionObject(
             scope, target_session.status, key, target_session.data, identify
         )
@@ -516,29 +877,29 @@ class SessionManager:
     ):
         if not scope:
             self.__sessions = {x: {} for x in _AllScopeStr}
+            with self.__expiry_lock:
+                self.__expiry_heap.clear()
+                self.__expiry_scheduled.clear()
+            self.__mark_dirty((_CLEAR, None, None))
             return
         scope = self.__valid_scope(scope)
         target_sessions = self.__check_scope(scope)
         if not key and not identify:
             target_sessions.clear()
-            if self.__is_auto_commit:
-                self.commit_data(is_info=False)
+            self.__mark_dirty((_CLEAR, scope, None))
             return
         if not key and identify:
             target_sessions[identify] = {}
-            if self.__is_auto_commit:
-                self.commit_data(is_info=False)
+            self.__mark_dirty((_CLEAR, scope, identify))
             return
-        if identify:
-            if identify not in target_sessions or key not in target_sessions[identify]:
+        if self.__lookup(scope, identify or None, key) is None:
+            if identify:
                 raise KeyError(f"Scope {scope} 中不存在 {identify}::{key} 的session")
+            raise KeyError(f"Scope {scope} 中不存在 {key} 的session")
+        if identify:
             target_sessions = target_sessions[identify]
-        else:
-            if key not in target_sessions:
-                raise KeyError(f"Scope {scope} 中不存在 {key} 的session")
         target_sessions.pop(key)
-        if self.__is_auto_commit:
-            self.commit_data(is_info=False)
+        self.__mark_dirty((scope, identify or None, key))
 
     def end(
         self,
@@ -548,17 +909,28 @@ class SessionManager:
         identify: Hashable = None,
         inactive_gc_timeout: Optional[float] = 0,
     ) -> SessionObject:
-        target_session = self.__check_and_get_target_session(obj, scope, key, identify)
+        _scope, _identify, target_session = self.__locate_target_session(
+            obj, scope, key, identify
+        )
         target_session.inactive_gc_timeout = inactive_gc_timeout
         self.__end_session(target_session)
-        if self.__is_auto_commit:
-            self.commit_data(is_info=False)
+        self.__schedule(_scope, _identify, key, target_session)
+        self.__mark_dirty((_scope, _identify, key))
         return SessionObject(
             scope, target_session.status, key, target_session.data, identify
         )
 
     def get_all(self) -> Dict:
-        return deepcopy(self.__sessions)
+        if not self.__on_demand:
+            return deepcopy(self.__sessions)
+        # 存储后端的数据加上尚未写入完成的改动，即为当前的所有session
+        sessions = rows_to_sessions(self.__storage.load_all())
+        apply_records(sessions, self.__serialize_records(self.__inflight_records))
+        with self.__dirty_lock:
+            dirty = list(self.__dirty)
+        records = [self.__build_record(loc) for loc in dirty]
+        apply_records(sessions, self.__serialize_records(records))
+        return sessions
 
     def set_status(
         self,
@@ -573,11 +945,13 @@ class SessionManager:
         if status == SessionStatus.INACTIVE:
             self.end(obj, scope, key, identify)
             return
-        target_session = self.__check_and_get_target_session(obj, scope, key, identify)
+        _scope, _identify, target_session = self.__locate_target_session(
+            obj, scope, key, identify
+        )
         target_session.status = status
         target_session.last_operate = time()
-        if self.__is_auto_commit:
-            self.commit_data(is_info=False)
+        self.__schedule(_scope, _identify, key, target_session)
+        self.__mark_dirty((_scope, _identify, key))
 
     def get_status(
         self, obj, scope: Scope, key: Hashable, identify: Hashable = None
@@ -587,69 +961,64 @@ class SessionManager:
 
     # -*- fetch/commit data methods -*-
     def fetch_data(self, is_info: bool = True):
-        _path = os.path.join(self.__commit_path, f"session_{self.__bot_identify}.db")
-        if not os.path.exists(_path):
-            return
         try:
-            with open(_path, "rb") as f_db:
-                db = pickle.loads(f_db.read())
+            if not self.__storage.lazy:
+                db = self.__storage.load_sessions()
+            elif not self.__on_demand:
+                db = rows_to_sessions(self.__storage.load_all())
+            if not self.__on_demand:
                 for scope in _AllScopeStr:
-                    try:
-                        scope_data = db[scope]
-                    except KeyError:
-                        continue
-                    except Exception as e:
-                        self.__logger.error(
-                            f"Session Manager 读取 Scope::{scope} 数据时出现错误，将跳过：{repr(e)}"
-                        )
                     if scope == "GLOBAL":
-                        for k in scope_data:
-                            try:
-                                self.__sessions[scope][k] = scope_data[k]
-                            except Exception as e:
-                                self.__logger.error(
-                                    f"Session Manager 读取 Scope::{scope}::{k} 数据时出现错误，将跳过：{repr(e)}"
-                                )
-                    else:
-                        for _id in scope_data:
-                            if _id not in self.__sessions[scope]:
-                                self.__sessions[scope][_id] = {}
-                            for k in scope_data[_id]:
-                                try:
-                                    self.__sessions[scope][_id][k] = scope_data[_id][k]
-                                except Exception as e:
-                                    self.__logger.error(
-                                        f"Session Manager 读取 Scope::{scope}::{_id}::{k} 数据时出现错误，将跳过：{repr(e)}"
-                                    )
+                        self.__sessions[scope].update(db[scope])
+                        continue
+                    for _id, group in db[scope].items():
+                        if isinstance(group, dict) and isinstance(
+                            self.__sessions[scope].get(_id), dict
+                        ):
+                            self.__sessions[scope][_id].update(group)
+                        else:
+                            self.__sessions[scope][_id] = group
+            self.__schedule_all()
             if is_info:
-                self.__logger.info(
-                    f"Session Manager 读取了 {self.__commit_path} 的数据"
-                )
+                self.__logger.info(f"Session Manager 读取了 {self.__storage} 的数据")
         except Exception as e:
             self.__logger.error(
-                f"Session Manager 读取 {_path} 时出现错误，将跳过：{repr(e)}"
+                f"Session Manager 读取 {self.__storage} 时出现错误，将跳过：{repr(e)}"
             )
 
     def commit_data(self, is_info: bool = True, pk_data: Optional[bytes] = None):
-        _path = os.path.join(self.__commit_path, f"session_{self.__bot_identify}.db")
+        """
+        立即保存数据：lazy的存储后端写入所有未保存的改动，否则写入完整快照
+
+        :param pk_data: 已序列化的快照数据，不传入时序列化当前所有session
+        """
+        if not self.__storage.persistent:
+            return
         try:
-            with open(_path, "wb") as f_db:
+            if self.__storage.lazy:
+                self.__write_records(self.__take_dirty())
+                self.__done_inflight()
+            else:
                 if not pk_data:
-                    pk_data = pickle.dumps(self.__sessions)
-                f_db.write(pk_data)
+                    with self.__dirty_lock:
+                        self.__dirty.clear()
+                self.__write_snapshot(self.__sessions, pk_data)
             if is_info:
-                self.__logger.info(f"Session Manager 写入了 {_path} 的数据")
+                self.__logger.info(f"Session Manager 写入了 {self.__storage} 的数据")
         except Exception as e:
             self.__logger.error(
-                f"Session Manager 写入 {_path} 时出现错误，将跳过：{repr(e)}"
+                f"Session Manager 写入 {self.__storage} 时出现错误，将跳过：{repr(e)}"
             )
 
     def set_auto_commit(self, is_auto_commit: bool):
         self.__is_auto_commit = is_auto_commit
 
     def set_commit_path(self, commit_path: str):
-        self.__check_path(commit_path)
-        self.__commit_path = commit_path
+        if not isinstance(self.__storage, FileSessionStorage):
+            raise ValueError("当前的存储后端不支持设置保存路径")
+        self.__storage.set_path(commit_path)
+        # 新路径需先写入完整快照，日志才有基准
+        self.__need_snapshot = self.__is_auto_commit
 
     # -*- helper private methods for internal use -*-
     def start(self, loop: AbstractEventLoop):
@@ -659,8 +1028,15 @@ class SessionManager:
 
     # -*- helper private methods for api.wait_for -*-
     def register_wait_for(
-        self, obj, scopes: Union[Scope, Iterable[Scope]], command: BotCommandObject
-    ):
+        self,
+        obj,
+        scopes: Union[Scope, Iterable[Scope]],
+        command: BotCommandObject,
+        future: FutureLike,
+    ) -> ScopeRegisterKey:
+        """
+        注册wait_for，触发时直接以触发的消息完成future（asyncio.Future或concurrent.futures.Future）
+        """
         _scope_value = {x: None for x in _AllScopeStr}
         if isinstance(scopes, Iterable):
             for scope in scopes:
@@ -672,31 +1048,69 @@ class SessionManager:
                 raise ValueError("scope 必须是 Scope 的枚举值")
             _scope_value[scopes.value] = self.__check_identify(scopes, obj)
         _scope_key = ScopeRegisterKey(**_scope_value)
-        if _scope_key not in self.__wait_for_registers:
-            self.__wait_for_registers[_scope_key] = {}
-        self.__wait_for_registers[_scope_key][command] = None
+        with self.__wait_for_lock:
+            if _scope_key not in self.__wait_for_registers:
+                self.__wait_for_registers[_scope_key] = {}
+                self.__index_wait_for(_scope_key)
+            old_future = self.__wait_for_registers[_scope_key].get(command)
+            self.__wait_for_registers[_scope_key][command] = future
+        if old_future is not None and not old_future.done():
+            old_future.set_exception(WaitError("找不到对应的wait_for()等待任务"))
         return _scope_key
 
-    def check_wait_for(self, scope_key: ScopeRegisterKey, command: BotCommandObject):
-        if (
-            scope_key not in self.__wait_for_registers
-            or command not in self.__wait_for_registers[scope_key]
-        ):
-            return False, None
-        data = self.__wait_for_registers[scope_key][command]
-        if data:
-            del self.__wait_for_registers[scope_key][command]
-            if not self.__wait_for_registers[scope_key]:
+    def del_wait_for(
+        self,
+        scope_key: ScopeRegisterKey,
+        command: BotCommandObject,
+        future: Optional[FutureLike] = None,
+    ):
+        """
+        删除wait_for，如传入future则仅在其仍为当前注册的future时删除
+        """
+        with self.__wait_for_lock:
+            command_futures = self.__wait_for_registers.get(scope_key)
+            if command_futures is None:
+                return
+            if command in command_futures and (
+                future is None or command_futures[command] is future
+            ):
+                del command_futures[command]
+            if not command_futures:
                 del self.__wait_for_registers[scope_key]
-        return True, data
+                self.__unindex_wait_for(scope_key)
 
-    def del_wait_for(self, scope_key: ScopeRegisterKey, command: BotCommandObject):
-        if scope_key not in self.__wait_for_registers:
-            return
-        if command in self.__wait_for_registers[scope_key]:
-            del self.__wait_for_registers[scope_key][command]
-        if not self.__wait_for_registers[scope_key]:
-            del self.__wait_for_registers[scope_key]
+    def __index_wait_for(self, scope_key: ScopeRegisterKey):
+        size = 0
+        for scope, value in zip(_AllScopeStr, scope_key):
+            if value is not None:
+                self.__wait_for_index[scope].setdefault(value, set()).add(scope_key)
+                size += 1
+        if not size:
+            self.__wait_for_wildcards.add(scope_key)
+        self.__wait_for_seq += 1
+        self.__wait_for_meta[scope_key] = (self.__wait_for_seq, size)
+
+    def __unindex_wait_for(self, scope_key: ScopeRegisterKey):
+        for scope, value in zip(_AllScopeStr, scope_key):
+            if value is not None:
+                keys = self.__wait_for_index[scope].get(value)
+                if keys is not None:
+                    keys.discard(scope_key)
+                    if not keys:
+                        del self.__wait_for_index[scope][value]
+        self.__wait_for_wildcards.discard(scope_key)
+        self.__wait_for_meta.pop(scope_key, None)
+
+    def __resolve_wait_for(
+        self,
+        scope_key: ScopeRegisterKey,
+        command: BotCommandObject,
+        future: FutureLike,
+        data,
+    ):
+        self.del_wait_for(scope_key, command, future)
+        if not future.done():
+            future.set_result(data)
 
     def wait_for_message_checker(
         self, obj: Model.MESSAGE
@@ -705,24 +1119,31 @@ class SessionManager:
         _scope_value = {
             scope: self.__check_identify(scope, obj) for scope in _AllScopeStr
         }
-        for scope_key, command_callback in self.__wait_for_registers.items():
-            flag = True
+        # 所有非None的scope值均相同的wait_for才会被触发，即命中次数等于其非None的scope数量
+        hits: Dict[ScopeRegisterKey, int] = {}
+        with self.__wait_for_lock:
             for scope in _AllScopeStr:
-                scope_key_value = getattr(scope_key, scope)
-                if (
-                    scope_key_value is not None
-                    and scope_key_value != _scope_value[scope]
-                ):
-                    flag = False
-                    break
-            if flag:
-                for command in command_callback:
-                    triggered_commands.append(
-                        WaitForCommandCallback(
-                            command=command,
-                            callback=lambda data: command_callback.__setitem__(
-                                command, data
-                            ),
+                keys = self.__wait_for_index[scope].get(_scope_value[scope])
+                if keys:
+                    for scope_key in keys:
+                        hits[scope_key] = hits.get(scope_key, 0) + 1
+            meta = self.__wait_for_meta
+            matched = [k for k, count in hits.items() if count == meta[k][1]]
+            matched.extend(self.__wait_for_wildcards)
+            matched.sort(key=lambda k: meta[k][0])  # 保持注册顺序
+            for scope_key in matched:
+                command_futures = self.__wait_for_registers.get(scope_key)
+                if command_futures:
+                    for command, future in command_futures.items():
+                        triggered_commands.append(
+                            WaitForCommandCallback(
+                                command=command,
+                                callback=partial(
+                                    self.__resolve_wait_for,
+                                    scope_key,
+                                    command,
+                                    future,
+                                ),
+                            )
                         )
-                    )
         return triggered_commands
@@ -1,19 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from asyncio import iscoroutinefunction
+from contextvars import ContextVar
 from functools import wraps
 from inspect import Signature, signature, stack
-from json import loads
-from json.decoder import JSONDecodeError
 from pathlib import Path
 from sys import exc_info
 from time import localtime, strftime
 from traceback import extract_tb
-from typing import Callable, Dict, Iterable, Union
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
 
 from aiohttp import ContentTypeError
 
-from ._event import objectize
+from ._event import JSONView, objectize
+from ._json import JSONDecodeError, loads
+from .model import ResponseMode
 from .version import __version__
 
 general_header = {"User-Agent": f"qg-botsdk v{__version__}"}
@@ -50,9 +51,9 @@ retry_err_code = (
 
 def template_wrapper(func):
     @wraps(func)
-    async def wrap(*args):
+    async def wrap(*args, **kwargs):
         try:
-            result = await func(*args)
+            result = await func(*args, **kwargs)
             return result
         except (JSONDecodeError, ContentTypeError, AttributeError, KeyError):
             return_ = args[0]
@@ -137,19 +138,29 @@ def exception_processor(func):
     return wrap
 
 
-def treat_msg(raw_msg: str, at: str):
-    raw_msg = raw_msg if raw_msg.find(at) else raw_msg.replace(at, "", 1).strip()
-    if not raw_msg:
-        return ""
-    if raw_msg[0] == "/":
+def treat_msg(raw_msg: str, at: str) -> Tuple[str, int]:
+    """
+    处理消息文本：去除开头艾特机器人的字符串及指令的"/"前缀，并还原转义字符（每处只还原一次）
+
+    :param raw_msg: 已去除首尾空白的原始消息
+    :param at: 艾特机器人的字符串
+    :return: (处理后的消息, 指令偏移)；指令偏移为开头被去除的"/"长度，
+        treat_command据此可直接定位位于消息开头的指令，无需再次查找
+    """
+    if raw_msg.startswith(at):
+        raw_msg = raw_msg[len(at) :].lstrip()
+    offset = 0
+    if raw_msg.startswith("/"):
         raw_msg = raw_msg[1:]
-    return (
-        raw_msg.replace("&amp;", "&")
-        .replace("&lt;", "<")
-        .replace("&gt;", ">")
-        .replace("\xa0", " ")
-        .strip()
-    )
+        offset = 1
+    if "&" in raw_msg:
+        # 各转义字符均以"&"开头且不会互相重叠，最后还原"&amp;"即与逐个扫描的结果相同（不会二次还原"&amp;lt;"）
+        raw_msg = (
+            raw_msg.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+        )
+    if "\xa0" in raw_msg:
+        raw_msg = raw_msg.replace("\xa0", " ")
+    return raw_msg.strip(), offset
 
 
 def treat_thread(data: Dict):
@@ -162,8 +173,34 @@ def treat_thread(data: Dict):
             pass
 
 
+def is_error_body(return_dict) -> bool:
+    return isinstance(return_dict, dict) and "code" in return_dict
+
+
+async def read_body(return_, mode: ResponseMode = ResponseMode.OBJECT):
+    """
+    按ResponseMode读取返回数据
+
+    :return: (.data中的数据, 是否为错误返回)；RAW、LAZY模式下不解析json，以HTTP状态码判断是否为错误返回
+    """
+    if mode is ResponseMode.OBJECT:
+        return_dict = await return_.json(loads=loads)
+        return return_dict, is_error_body(return_dict)
+    body = await return_.read()
+    if mode is ResponseMode.RAW:
+        return body, not return_.ok
+    if mode is ResponseMode.LAZY:
+        return JSONView(body), not return_.ok
+    return_dict = loads(body)
+    if is_error_body(return_dict):
+        return return_dict, True
+    if isinstance(return_dict, list):
+        return_dict = (objectize(items) for items in return_dict)
+    return return_dict, False
+
+
 @template_wrapper
-async def http_temp(return_, code: int):
+async def http_temp(return_, code: int, mode: ResponseMode = ResponseMode.OBJECT):
     trace_id = return_.headers.get("X-Tps-Trace-Id")
     real_code = return_.status
     if real_code == code:
@@ -171,7 +208,7 @@ async def http_temp(return_, code: int):
             {"data": None, "trace_id": trace_id, "http_code": real_code, "result": True}
         )
     else:
-        return_dict = await return_.json()
+        return_dict, _ = await read_body(return_, mode)
         return objectize(
             {
                 "data": return_dict,
@@ -183,27 +220,26 @@ async def http_temp(return_, code: int):
 
 
 @template_wrapper
-async def regular_temp(return_):
+async def regular_temp(return_, mode: ResponseMode = ResponseMode.OBJECT):
     trace_id = return_.headers.get("X-Tps-Trace-Id")
-    return_dict = await return_.json()
-    if isinstance(return_dict, dict) and "code" in return_dict:
-        result = False
-    else:
-        result = True
+    return_dict, is_error = await read_body(return_, mode)
     return objectize(
         {
             "data": return_dict,
             "trace_id": trace_id,
             "http_code": return_.status,
-            "result": result,
+            "result": not is_error,
         }
     )
 
 
 @template_wrapper
-async def empty_temp(return_):
+async def empty_temp(return_, mode: ResponseMode = ResponseMode.OBJECT):
     trace_id = return_.headers.get("X-Tps-Trace-Id")
-    return_dict = await return_.json()
+    # 成功时的返回为空，只有错误返回需要按mode读取
+    return_dict, _ = await read_body(
+        return_, ResponseMode.OBJECT if return_.ok else mode
+    )
     if not return_dict:
         result = True
         return_dict = None
@@ -270,12 +306,30 @@ def func_type_checker(func, *args, is_async: bool = False):
             raise TypeError(f"函数{func.__name__}应为一个普通函数")
 
 
+# 当前正在执行的处理函数的上下文，形如 {"self": BotProto, "func": 处理函数, "args": (事件数据, ...)}，
+# 由BotProto.start_callback_task/async_start_callback_task设置；asyncio任务创建时会复制上下文，
+# 因此处理函数中再创建的任务亦可取得，仅在处理函数自行创建的线程中需回退至逐帧追溯
+handler_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "qg_botsdk_handler_context", default=None
+)
+
+
 class TraceCallerData:
     def __init__(self, caller_names: Iterable[str], datas: Iterable[str]):
         self.caller_names = caller_names
         self.datas = datas
 
     def get_target_data(self):
+        context = handler_context.get()
+        if context is not None:
+            target_data = context
+            for data in self.datas:
+                target_data = (
+                    target_data.get(data, None)
+                    if isinstance(target_data, dict)
+                    else getattr(target_data, data, None)
+                )
+            return target_data
         for frame in stack():
             caller_name = frame.function
             if caller_name in self.caller_names:
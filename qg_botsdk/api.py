@@ -1,19 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from asyncio import AbstractEventLoop, run_coroutine_threadsafe
-from time import sleep, time
-from typing import BinaryIO, Dict, Iterable, List, Literal, Optional, Tuple, Union
+from asyncio import AbstractEventLoop, get_running_loop, run_coroutine_threadsafe
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import (
+    AsyncIterator,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from aiohttp import ClientResponse
 
 from . import _api_model, model
-from ._exception import WaitError, WaitTimeoutError
+from ._event import object_class
+from ._exception import WaitTimeoutError
 from ._statics import TraceNames
 from ._utils import TraceCallerData
 from .api_model import BaseMessageApiModel
 from .async_api import AsyncAPI
 
 
+async def _anext(agen: AsyncIterator):
+    return await agen.__anext__()
+
+
+async def _aclose(agen: AsyncIterator):
+    await agen.aclose()
+
+
 class API:
     def __init__(
         self, api: AsyncAPI, loop: AbstractEventLoop, timeout: int, session_manager
@@ -42,22 +63,16 @@ class API:
         self.__check_ready()
         data = TraceCallerData(TraceNames, ("args",))[0]
         command_obj.func = None
-        scope_key = self.__session_manager.register_wait_for(data, scope, command_obj)
-        _timeout_stamp = time() + timeout if timeout else None
-        while True:
-            check, result = self.__session_manager.check_wait_for(
-                scope_key, command_obj
-            )
-            if not check:
-                self.__session_manager.del_wait_for(data, command_obj)
-                raise WaitError("找不到对应的wait_for()等待任务")
-            if result is not None:
-                break
-            if _timeout_stamp and time() > _timeout_stamp:
-                self.__session_manager.del_wait_for(data, command_obj)
-                raise WaitTimeoutError(f"wait_for()等待超时： {command_obj}")
-            sleep(0.5)
-        return result
+        future = Future()
+        scope_key = self.__session_manager.register_wait_for(
+            data, scope, command_obj, future
+        )
+        try:
+            return future.result(timeout or None)
+        except FutureTimeoutError:
+            raise WaitTimeoutError(f"wait_for()等待超时： {command_obj}") from None
+        finally:
+            self.__session_manager.del_wait_for(scope_key, command_obj, future)
 
     # bot api
     def __check_ready(self):
@@ -66,6 +81,36 @@ class API:
                 "Event loop is not running，请先通过BOT()实例的start()或block()方法启动bot并运行事件循环"
             )
 
+    def __iterate(self, agen: AsyncIterator) -> Iterator:
+        """
+        在当前线程中逐项迭代于事件循环中运行的异步迭代器；提前中止时关闭该异步迭代器，不再请求余下的页
+        """
+        try:
+            while True:
+                future_ = run_coroutine_threadsafe(_anext(agen), self._loop)
+                try:
+                    item = future_.result(timeout=self._timeout)
+                except StopAsyncIteration:
+                    return
+                except FutureTimeoutError:
+                    future_.cancel()  # 取消仍在运行的请求，使异步迭代器得以关闭
+                    raise
+                yield item
+        finally:
+            closing = run_coroutine_threadsafe(_aclose(agen), self._loop)
+            if not self.__in_loop_thread():  # 于事件循环所在线程中回收时不可阻塞等待
+                try:
+                    closing.result(timeout=self._timeout)
+                except (RuntimeError, FutureTimeoutError):
+                    # 异步迭代器仍在运行（未响应取消），不掩盖原有的异常
+                    pass
+
+    def __in_loop_thread(self) -> bool:
+        try:
+            return get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
     def security_setup(self, mini_id: str, mini_secret: str):
         self._api._mini_id = mini_id
         self._api._mini_secret = mini_secret
@@ -111,6 +156,16 @@ class API:
         future_ = run_coroutine_threadsafe(self._api.get_bot_guilds(), self._loop)
         return future_.result(timeout=self._timeout)
 
+    def iter_bot_guilds(self, prefetch: bool = True) -> Iterator[object_class]:
+        """
+        逐项获取机器人所在的频道，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        self.__check_ready()
+        return self.__iterate(self._api.iter_bot_guilds(prefetch))
+
     def get_guild_info(self, guild_id: str) -> _api_model.get_guild_info():
         """
         获取频道详情信息
@@ -250,11 +305,17 @@ class API:
         )
         return future_.result(timeout=self._timeout)
 
-    def get_guild_members(self, guild_id: str) -> _api_model.get_guild_members():
+    def get_guild_members(
+        self,
+        guild_id: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
+    ) -> _api_model.get_guild_members():
         """
         用于获取 guild_id 指定的频道中所有成员的详情列表
 
         :param guild_id: 频道id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为包含所有数据的一个list，列表每个项均为object数据
         """
         _args = locals()
@@ -265,14 +326,32 @@ class API:
         )
         return future_.result(timeout=self._timeout)
 
+    def iter_guild_members(
+        self, guild_id: str, prefetch: bool = True
+    ) -> Iterator[_api_model._Member]:
+        """
+        逐项获取 guild_id 指定的频道中所有成员的详情，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param guild_id: 频道id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        self.__check_ready()
+        return self.__iterate(self._api.iter_guild_members(guild_id, prefetch))
+
     def get_role_members(
-        self, guild_id: str, role_id: str
+        self,
+        guild_id: str,
+        role_id: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
     ) -> _api_model.get_role_members():
         """
         用于获取 guild_id 频道中指定 role_id 身份组下所有成员的详情列表
 
         :param guild_id: 频道id
         :param role_id: 身份组id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为包含所有数据的一个list，列表每个项均为object数据
         """
         _args = locals()
@@ -283,6 +362,20 @@ class API:
         )
         return future_.result(timeout=self._timeout)
 
+    def iter_role_members(
+        self, guild_id: str, role_id: str, prefetch: bool = True
+    ) -> Iterator[_api_model._Member]:
+        """
+        逐项获取 guild_id 频道中指定 role_id 身份组下所有成员的详情，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param guild_id: 频道id
+        :param role_id: 身份组id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        self.__check_ready()
+        return self.__iterate(self._api.iter_role_members(guild_id, role_id, prefetch))
+
     def get_member_info(
         self, guild_id: str, user_id: str
     ) -> _api_model.get_member_info():
@@ -1137,7 +1230,12 @@ class API:
         return future_.result(timeout=self._timeout)
 
     def get_reaction_users(
-        self, channel_id: str, message_id: str, type_: str, id_: str
+        self,
+        channel_id: str,
+        message_id: str,
+        type_: str,
+        id_: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
     ) -> _api_model.get_reaction_users():
         """
         拉取对消息 message_id 指定表情表态的用户列表
@@ -1146,6 +1244,8 @@ class API:
         :param message_id: 目标消息id
         :param type_: 表情类型
         :param id_: 表情id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为解析后的json数据列表
         """
         _args = locals()
@@ -1156,6 +1256,29 @@ class API:
         )
         return future_.result(timeout=self._timeout)
 
+    def iter_reaction_users(
+        self,
+        channel_id: str,
+        message_id: str,
+        type_: str,
+        id_: str,
+        prefetch: bool = True,
+    ) -> Iterator[object_class]:
+        """
+        逐项拉取对消息 message_id 指定表情表态的用户，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param channel_id: 子频道id
+        :param message_id: 目标消息id
+        :param type_: 表情类型
+        :param id_: 表情id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        self.__check_ready()
+        return self.__iterate(
+            self._api.iter_reaction_users(channel_id, message_id, type_, id_, prefetch)
+        )
+
     def control_audio(
         self,
         channel_id: str,
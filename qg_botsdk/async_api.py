@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from asyncio import sleep
-from json import dumps, loads
-from json.decoder import JSONDecodeError
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import get_running_loop
+from asyncio import wait_for as async_wait_for
 from time import time
-from typing import BinaryIO, Dict, Iterable, List, Literal, Optional, Tuple, Union
+from typing import (
+    AsyncIterator,
+    BinaryIO,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import quote
 
 from aiohttp import ClientResponse
 
 from . import _api_model, model
-from ._exception import WaitError, WaitTimeoutError
+from ._event import object_class
+from ._exception import WaitTimeoutError
+from ._json import JSONDecodeError, dumps, loads
+from ._pager import Pager, collect_pages, iter_items
 from ._statics import TraceNames
 from ._utils import (
     TraceCallerData,
@@ -56,22 +70,16 @@ class AsyncAPI:
         """
         data = TraceCallerData(TraceNames, ("args",))[0]
         command_obj.func = None
-        scope_key = self.__session_manager.register_wait_for(data, scope, command_obj)
-        _timeout_stamp = time() + timeout if timeout else None
-        while True:
-            check, result = self.__session_manager.check_wait_for(
-                scope_key, command_obj
-            )
-            if not check:
-                self.__session_manager.del_wait_for(data, command_obj)
-                raise WaitError("找不到对应的wait_for()等待任务")
-            if result is not None:
-                break
-            if _timeout_stamp and time() > _timeout_stamp:
-                self.__session_manager.del_wait_for(data, command_obj)
-                raise WaitTimeoutError(f"wait_for()等待超时： {command_obj}")
-            await sleep(0.5)
-        return result
+        future = get_running_loop().create_future()
+        scope_key = self.__session_manager.register_wait_for(
+            data, scope, command_obj, future
+        )
+        try:
+            return await async_wait_for(future, timeout or None)
+        except AsyncTimeoutError:
+            raise WaitTimeoutError(f"wait_for()等待超时： {command_obj}") from None
+        finally:
+            self.__session_manager.del_wait_for(scope_key, command_obj, future)
 
     # bot open api
     def security_setup(self, mini_id: str, mini_secret: str):
@@ -87,7 +95,7 @@ class AsyncAPI:
             f"https://api.q.qq.com/api/getToken?grant_type=client_credential&"
             f"appid={self._mini_id}&secret={self._mini_secret}"
         )
-        resp = await return_.json()
+        resp = await return_.json(loads=loads)
         code = resp.get("access_token")
         if not code:
             self._logger.error(
@@ -113,7 +121,7 @@ class AsyncAPI:
             json={"content": content},
             headers=security_header,
         )
-        check = await return_.json()
+        check = await return_.json(loads=loads)
         self._logger.debug(f"[安全接口] {check}")
         if check.get("errCode") in (-1800110107, -1800110108, -1800110109):
             await self.__security_check_code()
@@ -122,7 +130,7 @@ class AsyncAPI:
                 json={"content": content},
                 headers=security_header,
             )
-            check = await return_.json()
+            check = await return_.json(loads=loads)
             self._logger.debug(f"[安全接口] {check}")
         if check["errCode"] == 0:
             return True
@@ -149,45 +157,31 @@ class AsyncAPI:
 
         :return: 返回的.data中为包含所有数据的一个list，列表每个项均为object数据
         """
-        trace_ids = []
-        codes = []
-        results = []
-        data = []
-        return_dict = None
-        try:
-            while True:
-                if return_dict is None:
-                    return_ = await self._session.get(
-                        f"{self._bot_url}/users/@me/guilds"
-                    )
-                elif len(return_dict) == 100:
-                    return_ = await self._session.get(
-                        f'{self._bot_url}/users/@me/guilds?after={return_dict[-1]["id"]}'
-                    )
-                else:
-                    break
-                trace_ids.append(return_.headers["X-Tps-Trace-Id"])
-                codes.append(return_.status)
-                return_dict = await return_.json()
-                if isinstance(return_dict, dict) and "code" in return_dict.keys():
-                    results.append(False)
-                    data.append(return_dict)
-                    break
-                else:
-                    results.append(True)
-                    for items in return_dict:
-                        data.append(items)
-        except (JSONDecodeError, AttributeError, KeyError) as e:
-            self._logger.error(
-                f"get_bot_guilds() 解析响应失败: {e.__class__.__name__}: {e}"
-            )
-            return objectize(
-                {"data": [], "trace_id": trace_ids, "http_code": codes, "result": False}
-            )
-        return objectize(
-            {"data": data, "trace_id": trace_ids, "http_code": codes, "result": results}
+        return await collect_pages(
+            self._session.get,
+            self._bot_guilds_pager(),
+            model.ResponseMode.OBJECT,
+            self._logger,
+            allow_empty=True,
         )
 
+    def _bot_guilds_pager(self) -> Pager:
+        url = f"{self._bot_url}/users/@me/guilds"
+        return Pager(
+            url,
+            lambda page: f"{url}?after={page[-1]['id']}" if len(page) == 100 else None,
+            lambda page: page,
+        )
+
+    def iter_bot_guilds(self, prefetch: bool = True) -> AsyncIterator[object_class]:
+        """
+        逐项获取机器人所在的频道，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: async for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        return iter_items(self._session.get, self._bot_guilds_pager(), prefetch)
+
     async def get_guild_info(self, guild_id: str) -> _api_model.get_guild_info():
         """
         获取频道详情信息
@@ -327,139 +321,98 @@ class AsyncAPI:
         )
         return await regular_temp(return_)
 
-    async def get_guild_members(self, guild_id: str) -> _api_model.get_guild_members():
+    async def get_guild_members(
+        self,
+        guild_id: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
+    ) -> _api_model.get_guild_members():
         """
         用于获取 guild_id 指定的频道中所有成员的详情列表
 
         :param guild_id: 频道id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为包含所有数据的一个list，列表每个项均为object数据
         """
-        trace_ids = []
-        codes = []
-        results = []
-        data = []
-        return_dict = None
-        try:
-            while True:
-                if return_dict is None:
-                    return_ = await self._session.get(
-                        f"{self._bot_url}/guilds/{guild_id}/members?limit=400"
-                    )
-                elif not return_dict:
-                    break
-                else:
-                    return_ = await self._session.get(
-                        f"{self._bot_url}/guilds/{guild_id}/members?limit=400&after="
-                        + return_dict[-1]["user"]["id"]
-                    )
-                trace_ids.append(return_.headers["X-Tps-Trace-Id"])
-                codes.append(return_.status)
-                return_dict = await return_.json()
-                if isinstance(return_dict, dict) and "code" in return_dict.keys():
-                    results.append(False)
-                    data.append(return_dict)
-                    break
-                else:
-                    results.append(True)
-                    for items in return_dict:
-                        if items not in data:
-                            data.append(items)
-        except (JSONDecodeError, AttributeError, KeyError) as e:
-            self._logger.error(f"API调用解析响应失败: {e.__class__.__name__}: {e}")
-            return objectize(
-                {
-                    "data": [],
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": [False],
-                }
-            )
-        if data:
-            return objectize(
-                {
-                    "data": data,
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": results,
-                }
-            )
-        else:
-            return objectize(
-                {
-                    "data": [],
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": [False],
-                }
-            )
+        return await collect_pages(
+            self._session.get,
+            self._guild_members_pager(guild_id),
+            response_mode,
+            self._logger,
+        )
+
+    def _guild_members_pager(self, guild_id: str) -> Pager:
+        url = f"{self._bot_url}/guilds/{guild_id}/members?limit=400"
+        return Pager(
+            url,
+            lambda page: f"{url}&after={page[-1]['user']['id']}" if page else None,
+            lambda page: page,
+            lambda member: member["user"]["id"],
+        )
+
+    def iter_guild_members(
+        self, guild_id: str, prefetch: bool = True
+    ) -> AsyncIterator[_api_model._Member]:
+        """
+        逐项获取 guild_id 指定的频道中所有成员的详情，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param guild_id: 频道id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: async for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        return iter_items(
+            self._session.get, self._guild_members_pager(guild_id), prefetch
+        )
 
     async def get_role_members(
-        self, guild_id: str, role_id: str
+        self,
+        guild_id: str,
+        role_id: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
     ) -> _api_model.get_role_members():
         """
         用于获取 guild_id 频道中指定 role_id 身份组下所有成员的详情列表
 
         :param guild_id: 频道id
         :param role_id: 身份组id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为包含所有数据的一个list，列表每个项均为object数据
         """
-        trace_ids = []
-        codes = []
-        results = []
-        data = []
-        return_dict = None
-        start_index = 0
-        try:
-            while True:
-                if return_dict is not None and not return_dict.get("data"):
-                    break
-                return_ = await self._session.get(
-                    f"{self._bot_url}/guilds/{guild_id}/roles/{role_id}/members?"
-                    f"limit=400&start_index={start_index}"
-                )
-                trace_ids.append(return_.headers["X-Tps-Trace-Id"])
-                codes.append(return_.status)
-                return_dict = await return_.json()
-                if isinstance(return_dict, dict) and "code" in return_dict.keys():
-                    results.append(False)
-                    data.append(return_dict)
-                    break
-                else:
-                    results.append(True)
-                    for items in return_dict.get("data", {}):
-                        if items not in data:
-                            data.append(items)
-                    start_index = return_dict.get("next")
-                    if not start_index:
-                        break
-        except (JSONDecodeError, AttributeError, KeyError) as e:
-            self._logger.error(f"API调用解析响应失败: {e.__class__.__name__}: {e}")
-            return objectize(
-                {
-                    "data": [],
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": [False],
-                }
-            )
-        if data:
-            return objectize(
-                {
-                    "data": data,
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": results,
-                }
-            )
-        else:
-            return objectize(
-                {
-                    "data": [],
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": [False],
-                }
-            )
+        return await collect_pages(
+            self._session.get,
+            self._role_members_pager(guild_id, role_id),
+            response_mode,
+            self._logger,
+        )
+
+    def _role_members_pager(self, guild_id: str, role_id: str) -> Pager:
+        url = f"{self._bot_url}/guilds/{guild_id}/roles/{role_id}/members?limit=400"
+        return Pager(
+            f"{url}&start_index=0",
+            lambda page: (
+                f"{url}&start_index={page['next']}"
+                if page.get("data") and page.get("next")
+                else None
+            ),
+            lambda page: page.get("data", ()),
+            lambda member: member["user"]["id"],
+        )
+
+    def iter_role_members(
+        self, guild_id: str, role_id: str, prefetch: bool = True
+    ) -> AsyncIterator[_api_model._Member]:
+        """
+        逐项获取 guild_id 频道中指定 role_id 身份组下所有成员的详情，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param guild_id: 频道id
+        :param role_id: 身份组id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: async for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        return iter_items(
+            self._session.get, self._role_members_pager(guild_id, role_id), prefetch
+        )
 
     async def get_member_info(
         self, guild_id: str, user_id: str
@@ -1194,7 +1147,7 @@ class AsyncAPI:
         )
         status_code = getattr(return_, "status", None)
         try:
-            return_dict = await return_.json()
+            return_dict = await return_.json(loads=loads)
             if status_code == 200:
                 result = False
             else:
@@ -1477,7 +1430,12 @@ class AsyncAPI:
         return await http_temp(return_, 204)
 
     async def get_reaction_users(
-        self, channel_id: str, message_id: str, type_: str, id_: str
+        self,
+        channel_id: str,
+        message_id: str,
+        type_: str,
+        id_: str,
+        response_mode: model.ResponseMode = model.ResponseMode.OBJECT,
     ) -> _api_model.get_reaction_users():
         """
         拉取对消息 message_id 指定表情表态的用户列表
@@ -1486,66 +1444,54 @@ class AsyncAPI:
         :param message_id: 目标消息id
         :param type_: 表情类型
         :param id_: 表情id
+        :param response_mode: 返回数据的形式，默认ResponseMode.OBJECT；RAW时.data为每页的原始bytes列表，
+                              LAZY时.data中的每项在首次访问时才转换为object数据，ITER时.data为逐项转换的迭代器
         :return: 返回的.data中为解析后的json数据列表
         """
-        return_ = await self._session.get(
+        return await collect_pages(
+            self._session.get,
+            self._reaction_users_pager(channel_id, message_id, type_, id_),
+            response_mode,
+            self._logger,
+            allow_empty=True,
+        )
+
+    def _reaction_users_pager(
+        self, channel_id: str, message_id: str, type_: str, id_: str
+    ) -> Pager:
+        url = (
             f"{self._bot_url}/channels/{channel_id}/messages/{message_id}/reactions/"
-            f"{type_}/{id_}?cookie=&limit=50"
+            f"{type_}/{id_}?limit=50&cookie="
+        )
+        return Pager(
+            url,
+            lambda page: None if page["is_end"] else url + quote(page["cookie"]),
+            lambda page: page["users"],
+        )
+
+    def iter_reaction_users(
+        self,
+        channel_id: str,
+        message_id: str,
+        type_: str,
+        id_: str,
+        prefetch: bool = True,
+    ) -> AsyncIterator[object_class]:
+        """
+        逐项拉取对消息 message_id 指定表情表态的用户，每获取一页即可开始迭代，可随时中止而不再请求余下的页
+
+        :param channel_id: 子频道id
+        :param message_id: 目标消息id
+        :param type_: 表情类型
+        :param id_: 表情id
+        :param prefetch: 是否在迭代当前页的同时预先请求下一页，默认True
+        :return: async for 迭代的每项均为object数据；API返回错误时抛出ApiError
+        """
+        return iter_items(
+            self._session.get,
+            self._reaction_users_pager(channel_id, message_id, type_, id_),
+            prefetch,
         )
-        trace_ids = [
-            (
-                return_.headers.get("X-Tps-Trace-Id", None)
-                if hasattr(return_, "headers")
-                else None
-            )
-        ]
-        codes = [getattr(return_, "status", None)]
-        all_users = []
-        try:
-            return_dict = await return_.json()
-            if isinstance(return_dict, dict) and "code" in return_dict.keys():
-                all_users.append(return_dict)
-                results = [False]
-            else:
-                for items in return_dict["users"]:
-                    all_users.append(items)
-                results = [True]
-                while True:
-                    if return_dict["is_end"]:
-                        break
-                    return_ = await self._session.get(
-                        f"{self._bot_url}/channels/{channel_id}/messages/{message_id}/"
-                        f'reactions/{type_}/{id_}?cookies={return_dict["cookie"]}'
-                    )
-                    trace_ids.append(return_.headers["X-Tps-Trace-Id"])
-                    codes.append(return_.status)
-                    return_dict = await return_.json()
-                    if isinstance(return_dict, dict) and "code" in return_dict.keys():
-                        results.append(False)
-                        all_users.append(return_dict)
-                        break
-                    else:
-                        results.append(True)
-                        for items in return_dict["users"]:
-                            all_users.append(items)
-            return objectize(
-                {
-                    "data": all_users,
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": results,
-                }
-            )
-        except (JSONDecodeError, AttributeError, KeyError) as e:
-            self._logger.error(f"API调用解析响应失败: {e.__class__.__name__}: {e}")
-            return objectize(
-                {
-                    "data": [],
-                    "trace_id": trace_ids,
-                    "http_code": codes,
-                    "result": [False],
-                }
-            )
 
     async def control_audio(
         self,
@@ -1612,7 +1558,7 @@ class AsyncAPI:
         codes = [getattr(return_, "status", None)]
         all_threads = []
         try:
-            return_dict = await return_.json()
+            return_dict = await return_.json(loads=loads)
             if isinstance(return_dict, dict) and "code" in return_dict.keys():
                 all_threads.append(return_dict)
                 results = [False]
@@ -1635,7 +1581,7 @@ class AsyncAPI:
                     )
                     trace_ids.append(return_.headers["X-Tps-Trace-Id"])
                     codes.append(return_.status)
-                    return_dict = await return_.json()
+                    return_dict = await return_.json(loads=loads)
                     if isinstance(return_dict, dict) and "code" in return_dict.keys():
                         results.append(False)
                         all_threads.append(return_dict)
@@ -1745,7 +1691,7 @@ class AsyncAPI:
         )
         status_code = getattr(return_, "status", None)
         try:
-            return_dict = await return_.json()
+            return_dict = await return_.json(loads=loads)
             if isinstance(return_dict, dict) and "code" in return_dict.keys():
                 result = False
             else:
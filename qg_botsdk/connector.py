@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import ssl
+from functools import lru_cache
+from typing import Optional
+
+import certifi
+from aiohttp import TCPConnector
+
+
+@lru_cache(maxsize=None)
+def default_ssl_context() -> ssl.SSLContext:
+    """
+    以certifi的CA证书创建的SSLContext，整个进程只从磁盘加载一次
+    """
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+class ConnectorFactory:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 30,
+        ttl_dns_cache: Optional[int] = 300,
+        force_close: bool = False,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        """
+        连接配置项，同一个BOT的API请求、WebSocket及WebHook连接共用此处创建的TCPConnector，
+        重连时可复用已建立的连接、DNS缓存及SSLContext
+
+        :param limit: 最大同时连接数，0为不限，默认100
+        :param limit_per_host: 对同一主机的最大同时连接数，0为不限，默认0
+        :param keepalive_timeout: 空闲连接的保持秒数，默认30
+        :param ttl_dns_cache: DNS解析结果的缓存秒数，None为永久缓存，默认300
+        :param force_close: 是否在每个请求后关闭连接（即不复用连接），默认False
+        :param ssl_context: 自定义的SSLContext，默认使用以certifi的CA证书创建的SSLContext
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.force_close = force_close
+        self.ssl_context = ssl_context or default_ssl_context()
+        self.__connector: Optional[TCPConnector] = None
+
+    async def get(self) -> TCPConnector:
+        """
+        获取共用的TCPConnector（需于事件循环中调用），如已关闭则重新创建；
+        使用方创建ClientSession时需传入connector_owner=False，避免关闭会话时一并关闭此连接池
+        """
+        if self.__connector is None or self.__connector.closed:
+            self.__connector = TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                # force_close与keepalive_timeout不可同时设置
+                keepalive_timeout=None if self.force_close else self.keepalive_timeout,
+                force_close=self.force_close,
+                use_dns_cache=True,
+                ttl_dns_cache=self.ttl_dns_cache,
+                ssl=self.ssl_context,
+            )
+        return self.__connector
+
+    async def close(self):
+        if self.__connector is not None and not self.__connector.closed:
+            await self.__connector.close()
+        self.__connector = None
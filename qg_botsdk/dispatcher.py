@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Queue,
+    QueueEmpty,
+    Task,
+    current_task,
+)
+from contextvars import ContextVar
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from ._utils import exception_handler
+from .logger import Logger
+
+# 当前消费者的释放函数，于消费者任务（及其处理事件时创建的任务）中可用
+_release_consumer: ContextVar[Optional[Callable[[], None]]] = ContextVar(
+    "_release_consumer", default=None
+)
+
+
+def release_consumer():
+    """
+    当前事件需长时间等待（如等待自定义短路指令的回调函数，而回调函数可能wait_for该用户的下一条消息）时调用：
+    由新的消费者接替处理该队列的后续事件，当前消费者处理完此事件后退出；不在消费者中时不进行任何操作
+    """
+    release = _release_consumer.get()
+    if release is not None:
+        release()
+
+
+class DispatchPolicy(IntEnum):
+    BLOCK = 0  # 队列已满时阻塞读取，等待消费者处理（背压至连接层）
+    DROP_OLDEST = 1  # 队列已满时丢弃最旧的事件
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        max_size: int = 1000,
+        workers: int = 4,
+        policy: DispatchPolicy = DispatchPolicy.BLOCK,
+    ):
+        """
+        事件分发配置项，将连接层收到的事件放入有界队列，由固定数量的消费者处理，避免流量突增时为每个事件创建任务导致内存暴涨。
+        同一频道（guild_id）或群（group_openid）的事件总会进入同一个消费者，以保持其处理顺序
+
+        :param max_size: 所有队列合计的最大事件数，平均分配给各消费者，默认1000
+        :param workers: 消费者数量，默认4
+        :param policy: 队列已满时的处理方式，默认DispatchPolicy.BLOCK
+        """
+        if workers < 1:
+            raise ValueError("workers必须大于0")
+        if max_size < workers:
+            raise ValueError("max_size不能小于workers")
+        self.max_size = max_size
+        self.workers = workers
+        self.policy = DispatchPolicy(policy)
+
+        self.logger: Optional[Logger] = None
+        self.__loop: Optional[AbstractEventLoop] = None
+        self.__handler: Optional[Callable[[Dict], Coroutine]] = None
+        self.__queues: List[Queue] = []
+        self.__tasks: List[Task] = []
+        self.__round_robin = 0
+
+        self.__max_queue_depth = 0
+        self.__processed = 0
+        self.__dropped = 0
+        self.__released = 0
+        self.__total_wait_time = 0.0
+        self.__max_wait_time = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.__tasks)
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        分发队列的运行指标
+
+        - queue_depth: 当前排队中的事件数
+        - max_queue_depth: 历史最大排队事件数
+        - processed: 已处理的事件数
+        - dropped: 因队列已满而丢弃的事件数
+        - released: 因事件需长时间等待而由新消费者接替的次数
+        - avg_wait_time / max_wait_time: 事件在队列中等待的平均/最长秒数
+        """
+        return {
+            "queue_depth": sum(q.qsize() for q in self.__queues),
+            "max_queue_depth": self.__max_queue_depth,
+            "processed": self.__processed,
+            "dropped": self.__dropped,
+            "released": self.__released,
+            "avg_wait_time": (
+                self.__total_wait_time / self.__processed if self.__processed else 0.0
+            ),
+            "max_wait_time": self.__max_wait_time,
+        }
+
+    def start(
+        self,
+        loop: AbstractEventLoop,
+        handler: Callable[[Dict], Coroutine],
+        logger: Logger,
+    ):
+        """
+        SDK内部使用，需在事件循环中调用
+        """
+        if self.running:
+            return
+        self.logger = logger
+        self.__loop = loop
+        self.__handler = handler
+        size = -(-self.max_size // self.workers)
+        self.__queues = [Queue(size) for _ in range(self.workers)]
+        for queue in self.__queues:
+            self.__spawn(queue)
+
+    def __spawn(self, queue: Queue):
+        self.__tasks.append(self.__loop.create_task(self.__consumer(queue)))
+
+    async def stop(self):
+        tasks, self.__tasks = self.__tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except CancelledError:
+                pass
+
+    def __select_queue(self, data: Dict) -> Queue:
+        d = data.get("d")
+        key = None
+        if isinstance(d, dict):
+            key = d.get("guild_id") or d.get("group_openid") or d.get("group_id")
+            if not key:
+                author = d.get("author")
+                if isinstance(author, dict):
+                    key = author.get("user_openid") or author.get("id")
+        if key:
+            return self.__queues[hash(key) % self.workers]
+        self.__round_robin = (self.__round_robin + 1) % self.workers
+        return self.__queues[self.__round_robin]
+
+    async def put(self, data: Dict):
+        queue = self.__select_queue(data)
+        item = (monotonic(), data)
+        if self.policy == DispatchPolicy.DROP_OLDEST:
+            while queue.full():
+                try:
+                    queue.get_nowait()
+                except QueueEmpty:
+                    break
+                queue.task_done()
+                self.__dropped += 1
+            queue.put_nowait(item)
+        else:
+            await queue.put(item)
+        depth = sum(q.qsize() for q in self.__queues)
+        if depth > self.__max_queue_depth:
+            self.__max_queue_depth = depth
+
+    async def __consumer(self, queue: Queue):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released and self.running:
+                released = True
+                self.__released += 1
+                self.__spawn(queue)
+
+        _release_consumer.set(release)
+        while not released:
+            enqueue_time, data = await queue.get()
+            wait_time = monotonic() - enqueue_time
+            self.__total_wait_time += wait_time
+            if wait_time > self.__max_wait_time:
+                self.__max_wait_time = wait_time
+            try:
+                await self.__handler(data)
+            except CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"分发事件时出现错误：{repr(e)}")
+                self.logger.error(exception_handler(e))
+            finally:
+                self.__processed += 1
+                queue.task_done()
+        # 已由新的消费者接替，处理完当前事件后退出
+        task = current_task()
+        if task in self.__tasks:
+            self.__tasks.remove(task)
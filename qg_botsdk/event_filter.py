@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+from time import monotonic
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
+
+from ._statics import EVENTS
+from .ratelimit import _TokenBucket
+
+Predicate = Callable[[Dict], bool]
+Getter = Callable[[Dict], Optional[str]]
+
+
+def _path(*keys: str) -> Getter:
+    def get(d: Dict) -> Optional[str]:
+        for key in keys:
+            if not isinstance(d, dict):
+                return None
+            d = d.get(key)
+        return d
+
+    return get
+
+
+def _first(*getters: Getter) -> Getter:
+    def get(d: Dict) -> Optional[str]:
+        for getter in getters:
+            value = getter(d)
+            if value:
+                return value
+        return None
+
+    return get
+
+
+def _getters(table: Dict[Tuple[str, ...], Getter]) -> Dict[str, Getter]:
+    return {t: getter for events, getter in table.items() for t in events}
+
+
+# 各事件类型的原始数据中ID所在的位置，编译规则时按事件类型选定，避免每个事件都逐一尝试
+_GUILD_GETTERS = _getters(
+    {
+        EVENTS.MESSAGE_DELETE: _path("message", "guild_id"),
+        EVENTS.GUILD: _path("id"),
+    }
+)
+_DEFAULT_GUILD_GETTER = _path("guild_id")
+_DEFAULT_GROUP_GETTER = _path("group_openid")
+_USER_GETTERS = _getters(
+    {
+        EVENTS.MESSAGE_CREATE + EVENTS.DM_CREATE: _path("author", "id"),
+        EVENTS.C2C_MESSAGE_CREATE: _path("author", "user_openid"),
+        EVENTS.GROUP_AT_MESSAGE_CREATE: _path("author", "member_openid"),
+        EVENTS.MESSAGE_DELETE: _path("message", "author", "id"),
+        EVENTS.GUILD_MEMBER: _path("user", "id"),
+        EVENTS.REACTION + EVENTS.ALC_MEMBER: _path("user_id"),
+        EVENTS.GROUP: _path("op_member_openid"),
+        EVENTS.FRIEND: _path("openid"),
+    }
+)
+_DEFAULT_USER_GETTER = _first(
+    _path("author", "id"),
+    _path("author", "user_openid"),
+    _path("author", "member_openid"),
+    _path("user_id"),
+    _path("user_openid"),
+    _path("group_member_openid"),
+    _path("openid"),
+)
+
+
+class FilterRule:
+    def __init__(
+        self,
+        events: Optional[Iterable[str]] = None,
+        guilds: Optional[Iterable[str]] = None,
+        groups: Optional[Iterable[str]] = None,
+        users: Optional[Iterable[str]] = None,
+        content_prefix: Optional[Union[str, Iterable[str]]] = None,
+        content_regex: Optional[Union[str, Pattern]] = None,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        allow: bool = False,
+    ):
+        """
+        事件过滤规则，所有已设置的条件均满足时视为命中，命中后按allow放行或丢弃事件，不再检查后续规则
+
+        :param events: 适用的事件类型（即事件数据中的t字段），默认None为全部事件
+        :param guilds: 频道ID列表，事件的频道ID在其中时满足条件
+        :param groups: 群ID列表，事件的群openid在其中时满足条件
+        :param users: 用户ID列表，事件的用户ID（频道用户ID或QQ用户openid）在其中时满足条件
+        :param content_prefix: 消息内容的前缀，可传入多个，消息内容（去除开头空白，未去除艾特）以其开头时满足条件
+        :param content_regex: 正则compile实例或正则表达式，可在消息内容中搜索到时满足条件
+        :param rate: 每个用户每秒允许的事件数，用户超出此速率时满足条件，默认None为不限速
+        :param burst: 每个用户允许的突发事件数，默认与rate相同（最少为1）
+        :param allow: 命中时放行（True）或丢弃（False）事件，默认丢弃
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.events = frozenset(events) if events is not None else None
+        self.guilds = frozenset(guilds) if guilds is not None else None
+        self.groups = frozenset(groups) if groups is not None else None
+        self.users = frozenset(users) if users is not None else None
+        if isinstance(content_prefix, str):
+            content_prefix = (content_prefix,)
+        self.content_prefix = (
+            tuple(content_prefix) if content_prefix is not None else None
+        )
+        self.content_regex = (
+            re.compile(content_regex)
+            if isinstance(content_regex, str)
+            else content_regex
+        )
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self.allow = allow
+        self.__buckets: Dict[str, _TokenBucket] = {}
+        self.__checked = 0
+
+    def compile(self, t: str) -> Optional[Predicate]:
+        """
+        为指定事件类型编译此规则的判断函数
+
+        :return: 接收事件原始数据（即d字段）的函数，命中时返回True；此规则不适用于该事件类型时返回None
+        """
+        if self.events is not None and t not in self.events:
+            return None
+        conditions: List[Predicate] = []
+        if self.guilds is not None:
+            conditions.append(
+                self.__in(self.guilds, _GUILD_GETTERS.get(t, _DEFAULT_GUILD_GETTER))
+            )
+        if self.groups is not None:
+            conditions.append(self.__in(self.groups, _DEFAULT_GROUP_GETTER))
+        if self.users is not None:
+            conditions.append(
+                self.__in(self.users, _USER_GETTERS.get(t, _DEFAULT_USER_GETTER))
+            )
+        if self.content_prefix is not None:
+            prefix = self.content_prefix
+            conditions.append(
+                lambda d: isinstance(d.get("content"), str)
+                and d["content"].lstrip().startswith(prefix)
+            )
+        if self.content_regex is not None:
+            search = self.content_regex.search
+            conditions.append(
+                lambda d: isinstance(d.get("content"), str)
+                and search(d["content"]) is not None
+            )
+        if self.rate is not None:
+            # 放在最后，只有满足其余条件的事件才会消耗令牌
+            conditions.append(
+                self.__over_rate(_USER_GETTERS.get(t, _DEFAULT_USER_GETTER))
+            )
+        if not conditions:
+            return lambda d: True
+        if len(conditions) == 1:
+            return conditions[0]
+
+        def match(d: Dict) -> bool:
+            for condition in conditions:
+                if not condition(d):
+                    return False
+            return True
+
+        return match
+
+    @staticmethod
+    def __in(ids: frozenset, getter: Getter) -> Predicate:
+        return lambda d: getter(d) in ids
+
+    def __over_rate(self, getter: Getter) -> Predicate:
+        buckets, rate, burst = self.__buckets, self.rate, self.burst
+
+        def over_rate(d: Dict) -> bool:
+            user = getter(d)
+            if user is None:
+                return False
+            now = monotonic()
+            bucket = buckets.get(user)
+            if bucket is None:
+                bucket = buckets[user] = _TokenBucket(rate, burst)
+            self.__checked += 1
+            if not self.__checked % 1024:  # 定期清理已回满的令牌桶，避免按用户无限增长
+                for key in [k for k, b in buckets.items() if b.idle(now)]:
+                    del buckets[key]
+                buckets[user] = bucket
+            return not bucket.consume(now)
+
+        return over_rate
+
+
+class EventFilter:
+    def __init__(self, *rules: FilterRule, default: bool = True):
+        """
+        事件过滤配置项，于事件转换为object数据及匹配指令之前，直接以原始数据判断是否丢弃事件；
+        规则按传入顺序检查，第一条命中的规则决定放行或丢弃，均未命中时按default处理。
+        规则在每种事件类型首次出现时编译为该类型专用的判断函数，此后直接调用
+
+        :param rules: FilterRule过滤规则，可传入多个
+        :param default: 所有规则均未命中时是否放行事件，默认True
+        """
+        for rule in rules:
+            if not isinstance(rule, FilterRule):
+                raise TypeError("传入的过滤规则不是FilterRule类")
+        self.rules: Tuple[FilterRule, ...] = rules
+        self.default = default
+        self.__predicates: Dict[str, Predicate] = {}
+        self.__checked = 0
+        self.__dropped = 0
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        事件过滤的运行指标
+
+        - checked: 经过过滤的事件数
+        - dropped: 被丢弃的事件数
+        - compiled: 已编译判断函数的事件类型数
+        """
+        return {
+            "checked": self.__checked,
+            "dropped": self.__dropped,
+            "compiled": len(self.__predicates),
+        }
+
+    def compile(self, t: str) -> Predicate:
+        """
+        将所有规则编译为指定事件类型的判断函数
+
+        :return: 接收事件原始数据（即d字段）的函数，放行时返回True
+        """
+        matchers = []
+        for rule in self.rules:
+            matcher = rule.compile(t)
+            if matcher is not None:
+                matchers.append((matcher, rule.allow))
+        default = self.default
+        if not matchers:
+            return lambda d: default
+
+        def predicate(d: Dict) -> bool:
+            for matcher, allow in matchers:
+                if matcher(d):
+                    return allow
+            return default
+
+        return predicate
+
+    def check(self, t: str, d: Dict) -> bool:
+        """
+        :param t: 事件类型
+        :param d: 事件原始数据（即d字段）
+        :return: 是否放行此事件
+        """
+        predicate = self.__predicates.get(t)
+        if predicate is None:
+            predicate = self.__predicates[t] = self.compile(t)
+        self.__checked += 1
+        if predicate(d):
+            return True
+        self.__dropped += 1
+        return False
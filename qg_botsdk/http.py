@@ -1,24 +1,27 @@
-import ssl
-from asyncio import AbstractEventLoop, get_event_loop
+from asyncio import AbstractEventLoop, Future
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import TimerHandle, get_event_loop, shield
 from asyncio import sleep as async_sleep
-from time import time
-from typing import Optional
+from typing import Optional, Union
 
-import certifi
 from aiohttp import (
+    ClientConnectionError,
     ClientResponse,
     ClientSession,
     ClientTimeout,
     FormData,
-    TCPConnector,
     hdrs,
     multipart,
     payload,
 )
 
 from ._api_model import StrPtr
+from ._json import dumps, loads
 from ._queue import Queue
-from ._utils import exception_handler, general_header, retry_err_code
+from ._utils import exception_handler, general_header
+from .connector import ConnectorFactory
+from .ratelimit import RateLimiter
+from .retry import IDEMPOTENT_METHODS, RetryPolicy
 
 
 def _parse_version(version_str: str) -> tuple:
@@ -126,6 +129,8 @@ if __is_aiohttp_reusable_bodies_released:
 
 
 class Session:
+    _access_token_url = "https://bots.qq.com/app/getAppAccessToken"
+
     def __init__(
         self,
         bot_id: str,
@@ -133,32 +138,32 @@ class Session:
         bot_secret: str,
         access_token: StrPtr,
         loop: AbstractEventLoop,
-        is_retry,
+        is_retry: Union[bool, RetryPolicy],
         is_log_error,
         logger,
         max_concurrency,
         timeout,
+        rate_limiter: Optional[RateLimiter] = None,
+        connector_factory: Optional[ConnectorFactory] = None,
         **kwargs,
     ):
         self._bot_id = bot_id
         self._bot_token = bot_token
         self._bot_secret = bot_secret
         self._access_token = access_token
-        self._access_token_expire = 0
-        self._access_token_last_update = time()
-        self._is_retry = is_retry
+        self._access_token_deadline = 0.0  # access_token的失效时间（loop.time()）
+        self._access_token_retry_at = 0.0  # 获取失败后，在此时间前不再重新获取
+        self._access_token_refresh: Optional[Future] = None
+        self._access_token_renewal: Optional[TimerHandle] = None
+        self._retry_policy: Optional[RetryPolicy] = (
+            RetryPolicy() if is_retry is True else is_retry or None
+        )
         self._is_log_error = is_log_error
         self._logger = logger
         self._queue = Queue(max_concurrency)
-        if not kwargs.get("connector", None):
-            if not loop.is_running():
-                kwargs["connector"] = loop.run_until_complete(self._create_connector())
-            else:
-
-                def __callback(f):
-                    self._kwargs["connector"] = f.result()
-
-                loop.create_task(self._create_connector()).add_done_callback(__callback)
+        self._rate_limiter = rate_limiter
+        # API、WebSocket及WebHook连接共用的连接池，未传入connector时使用
+        self.connector_factory = connector_factory or ConnectorFactory()
         self._kwargs = kwargs
         self._session: Optional[ClientSession] = None
         self._timeout = ClientTimeout(total=timeout)
@@ -167,24 +172,25 @@ class Session:
             loop.run_until_complete(self._check_session())
         else:
             loop.create_task(self._check_session())
-        loop.create_task(self._access_token_loop())
+        if bot_secret:
+            loop.create_task(self._refresh_access_token())
 
     def __del__(self):
+        if self._access_token_renewal is not None:
+            self._access_token_renewal.cancel()
         if self._session and not self._session.closed:
             try:
                 loop = get_event_loop()
                 if loop.is_running():
-                    loop.create_task(self._session.close())
+                    loop.create_task(self._close())
                 else:
-                    loop.run_until_complete(self._session.close())
+                    loop.run_until_complete(self._close())
             except Exception:
                 pass
 
-    @staticmethod
-    async def _create_connector(*args, **kwargs):
-        return TCPConnector(
-            *args, **kwargs, ssl=ssl.create_default_context(cafile=certifi.where())
-        )
+    async def _close(self):
+        await self._session.close()
+        await self.connector_factory.close()
 
     async def _check_session(self):
         if not self._bot_secret:
@@ -195,52 +201,98 @@ class Session:
                 "X-Union-Appid": self._bot_id,
             }
         if not self._session or self._session.closed:
+            kwargs = self._kwargs
+            if not kwargs.get("connector", None):
+                kwargs = dict(
+                    kwargs,
+                    connector=await self.connector_factory.get(),
+                    connector_owner=False,
+                )
             self._session = ClientSession(
-                timeout=self._timeout, headers=headers, **self._kwargs
+                timeout=self._timeout,
+                headers=headers,
+                json_serialize=dumps,
+                **kwargs,
             )
             self._session.headers.update(general_header)
 
-    async def _access_token_loop(self):
+    def _access_token_valid(self) -> bool:
+        return bool(self._access_token.value) and (
+            self._loop.time() < self._access_token_deadline
+        )
+
+    def _schedule_access_token_renewal(self, delay: float):
+        if self._access_token_renewal is not None:
+            self._access_token_renewal.cancel()
+        self._access_token_renewal = self._loop.call_at(
+            self._loop.time() + delay,
+            lambda: self._loop.create_task(self._refresh_access_token(True)),
+        )
+
+    async def _refresh_access_token(self, force: bool = False):
+        """
+        获取access_token，同一时间只会发出一个获取请求，并发的调用者共同等待同一结果
+
+        :param force: 是否忽略当前access_token的有效期强制获取（仍受获取失败后的冷却时间限制）
+        """
         if not self._bot_secret:  # 无需获取access_token
             return
-        self._access_token_last_update = time()
-        while True:
-            if self._access_token_expire > 0:
-                await async_sleep(10)
-                self._access_token_expire -= time() - self._access_token_last_update
-                self._access_token_last_update = time()
-            else:
-                await self._request_access_token()
+        if self._access_token_refresh is None:
+            if (not force and self._access_token_valid()) or (
+                self._loop.time() < self._access_token_retry_at
+            ):
+                return
+            self._access_token_refresh = self._loop.create_task(
+                self._request_access_token()
+            )
+        refresh = self._access_token_refresh
+        try:
+            await shield(refresh)
+        finally:
+            if refresh.done() and self._access_token_refresh is refresh:
+                self._access_token_refresh = None
 
     async def _request_access_token(self):
         if not self._bot_secret:  # 无需获取access_token
             return
-        self._access_token_expire = 30  # if fail, retry after 30s
-        resp = await self._session.post(
-            "https://bots.qq.com/app/getAppAccessToken",
-            json={"appId": self._bot_id, "clientSecret": self._bot_secret},
-        )
-        if not resp.ok:
-            content = await resp.text()
+        await self._check_session()
+        try:
+            resp = await self._session.post(
+                self._access_token_url,
+                json={"appId": self._bot_id, "clientSecret": self._bot_secret},
+            )
+            if not resp.ok:
+                content = await resp.text()
+                self._logger.warning(
+                    f"HTTP API(url:{self._access_token_url})调用错误[{resp.status}]，详情：{content}，"
+                    f'trace_id：{resp.headers.get("X-Tps-Trace-Id", None)}'
+                )
+                json_ = None
+            else:
+                json_ = await resp.json(loads=loads)
+        except Exception as e:
             self._logger.warning(
-                f"HTTP API(url:https://bots.qq.com/app/getAppAccessToken)调用错误[{resp.status}]，详情：{content}，"
-                f'trace_id：{resp.headers.get("X-Tps-Trace-Id", None)}'
+                f"HTTP API(url:{self._access_token_url})调用错误，详情：{exception_handler(e)}"
             )
-            return
-        json_ = await resp.json()
-        access_token = json_.get("access_token", None)
-        expire = int(json_.get("expires_in", 0))
+            resp = json_ = None
+        access_token = json_.get("access_token", None) if json_ else None
+        expire = int(json_.get("expires_in", 0)) if json_ else 0
         if access_token and expire:
             self._access_token.value = f"QQBot {access_token}"
-            self._access_token_expire = (
-                expire - 59
-            )  # can get new token 1 min before expire
+            self._access_token_deadline = self._loop.time() + expire
+            self._access_token_retry_at = 0.0
             self._session.headers["Authorization"] = self._access_token.value
-        else:
+            # can get new token 1 min before expire
+            self._schedule_access_token_renewal(max(expire - 60, expire / 2))
+            return
+        if json_:
             self._logger.warning(
-                f"HTTP API(url:https://bots.qq.com/app/getAppAccessToken)调用错误[{resp.status}]，详情：{json_}，"
+                f"HTTP API(url:{self._access_token_url})调用错误[{resp.status}]，详情：{json_}，"
                 f'trace_id：{resp.headers.get("X-Tps-Trace-Id", None)}'
             )
+        # if fail, retry after 30s
+        self._access_token_retry_at = self._loop.time() + 30
+        self._schedule_access_token_renewal(30)
 
     async def _warning(self, url, resp):
         self._logger.warning(
@@ -261,26 +313,71 @@ class Session:
 
             return wrap
 
-    async def request(self, method, url, retry=False, **kwargs) -> ClientResponse:
+    async def request(self, method, url, **kwargs) -> ClientResponse:
+        """
+        发送请求，如遇可重试的错误则按重试配置以指数退避重试；返回的ClientResponse带有retries属性，即该请求的重试次数
+        """
         await self._check_session()
-        if self._bot_secret and (
-            not self._access_token.value or self._access_token_expire <= 0
-        ):
-            await self._request_access_token()
-        resp = await self._session.request(method, url, **kwargs)
-        if resp.ok:
-            return resp
-        if self._is_log_error and (not self._is_retry or retry):
-            await self._warning(url, resp)
-        if self._is_retry and not retry:
-            if resp.headers.get("content-type", "") == "application/json":
-                json_ = await resp.json()
+        if self._bot_secret and not self._access_token_valid():
+            await self._refresh_access_token()
+        policy = self._retry_policy
+        if policy is not None:
+            policy.start()
+        attempt = 0
+        auth_retried = False
+        while True:
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire(method, url)
+            token = self._access_token.value
+            try:
+                resp = await self._session.request(method, url, **kwargs)
+            except (ClientConnectionError, AsyncTimeoutError):
+                attempt += 1
+                # 连接错误时无法确定服务端是否已处理请求，只重试幂等的请求
                 if (
-                    not isinstance(json_, dict)
-                    or json_.get("code", None) not in retry_err_code
+                    policy is None
+                    or method.upper() not in IDEMPOTENT_METHODS
+                    or not policy.allow(attempt)
                 ):
-                    await self._warning(url, resp)
-                    return resp
-            await async_sleep(0.05)
-            return await self.request(method, url, True, **kwargs)
-        return resp
+                    raise
+                await async_sleep(policy.backoff(attempt))
+                continue
+            resp.retries = attempt + auth_retried
+            if resp.ok:
+                return resp
+            if resp.status == 401 and self._bot_secret and not auth_retried:
+                # access_token失效时获取新的access_token并重试一次；如已由其他请求更新则直接重试
+                auth_retried = True
+                if token == self._access_token.value:
+                    await self._refresh_access_token(True)
+                if token != self._access_token.value:
+                    resp.release()
+                    continue
+            attempt += 1
+            if resp.status == 429 and self._rate_limiter is not None:
+                self._rate_limiter.penalize(method, url)
+            if policy is not None and await self._should_retry(
+                policy, method, resp, attempt
+            ):
+                resp.release()
+                await async_sleep(
+                    policy.backoff(attempt, policy.parse_retry_after(resp.headers))
+                )
+                continue
+            if self._is_log_error:
+                await self._warning(url, resp)
+            return resp
+
+    @staticmethod
+    async def _should_retry(
+        policy: RetryPolicy, method: str, resp: ClientResponse, attempt: int
+    ) -> bool:
+        code = None
+        if resp.content_type == "application/json":
+            json_ = await resp.json(loads=loads)
+            if isinstance(json_, dict):
+                code = json_.get("code", None)
+        retry_after = policy.parse_retry_after(resp.headers)
+        if not policy.is_retryable(resp.status, code, method, retry_after):
+            return False
+        return policy.allow(attempt, retry_after)
@@ -649,6 +649,13 @@ class SessionStatus(Enum):
     HANGING = 2  # 此状态代表session不检查timeout，但会在下次操作时进入ACTIVE状态
 
 
+class ResponseMode(Enum):
+    OBJECT = "OBJECT"  # 代表将返回的json完整解析为object数据（默认）
+    RAW = "RAW"  # 代表.data中为未经解析的原始bytes
+    LAZY = "LAZY"  # 代表.data中的数据在首次访问时才解析及转换为object数据
+    ITER = "ITER"  # 代表.data中为逐项转换为object数据的迭代器
+
+
 class SessionObject:
     """
     session对象，用于存储session的数据
@@ -786,6 +793,7 @@ class BotCommandObject:
     :param at: 是否要求必须艾特机器人才能触发指令
     :param short_circuit: 如果触发指令成功是否短路不运行后续指令（将根据注册顺序和 command 先 regex 后排序指令的短路机制）
     :param is_custom_short_circuit: 如果触发指令成功而回调函数返回True则不运行后续指令，存在时优先于short_circuit
+    :param short_circuit_timeout: is_custom_short_circuit时等待回调函数返回的最长秒数，超时则不短路并继续检查后续指令，None为一直等待
     :param admin: 是否要求频道主或或管理才可触发指令
     :param admin_error_msg: 当admin为True，而触发用户的权限不足时，如此项不为None，返回此消息并短路；否则不进行短路
     :param valid_scenes: 此机器人命令的有效场景，可传入多个场景，如 CommandValidScenes.GUILD|CommandValidScenes.DM，默认全部
@@ -811,6 +819,7 @@ class BotCommandObject:
         enabled: bool = True,
         is_require_bot_admin: bool = False,
         bot_admin_error_msg: Optional[str] = None,
+        short_circuit_timeout: Optional[float] = None,
     ):
         # type checking for user input, not included items are not important(for wait_for api)
         if command is not None:
@@ -865,6 +874,7 @@ class BotCommandObject:
         self.enabled: bool = enabled
         self.is_require_bot_admin: bool = is_require_bot_admin
         self.bot_admin_error_msg: Optional[str] = bot_admin_error_msg
+        self.short_circuit_timeout: Optional[float] = short_circuit_timeout
 
     def __repr__(self):
         if self.command:
@@ -99,6 +99,7 @@ class Plugins:
         enabled: bool = True,
         is_require_bot_admin: bool = False,
         bot_admin_error_msg: Optional[str] = None,
+        short_circuit_timeout: Optional[float] = None,
     ):
         """
         注册plugins指令装饰器，可用于分割式编写指令并注册进机器人
@@ -115,6 +116,7 @@ class Plugins:
         :param enabled: 是否启用此指令，默认True
         :param is_require_bot_admin: 是否要求机器人管理员才可触发指令，默认否
         :param bot_admin_error_msg: 当is_require_bot_admin为True，而触发用户的权限不足时，如此项不为None，返回此消息并短路；否则不进行短路
+        :param short_circuit_timeout: is_custom_short_circuit时等待回调函数返回的最长秒数，超时则不短路并继续检查后续指令，默认None（一直等待）
         """
 
         def wrap(
@@ -138,6 +140,7 @@ class Plugins:
                 "enabled": enabled,
                 "is_require_bot_admin": is_require_bot_admin,
                 "bot_admin_error_msg": bot_admin_error_msg,
+                "short_circuit_timeout": short_circuit_timeout,
             }
             if command:
                 if isinstance(command, str):
@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import json
 import re
-import ssl
 from asyncio import AbstractEventLoop, Future, sleep
 from typing import Coroutine
 
-import certifi
-from aiohttp import ClientSession, TCPConnector, WSMsgType
+from aiohttp import ClientSession, WSMsgType
 
 from .._exception import IdTokenError
+from .._json import JSONDecodeError, loads
 from .._utils import exception_handler
 from ..async_api import AsyncAPI
 from ..logger import Logger
@@ -62,9 +60,8 @@ class RemoteWebHook(AbstractProto):
 
     async def simple_ws_connect(self):
         async with ClientSession(
-            connector=TCPConnector(
-                ssl=ssl.create_default_context(cafile=certifi.where())
-            )
+            connector=await self.raw_api._session.connector_factory.get(),
+            connector_owner=False,
         ) as ws_session:
             try:
                 async with ws_session.get(
@@ -88,9 +85,9 @@ class RemoteWebHook(AbstractProto):
                 async for msg in self.ws:
                     if msg.type == WSMsgType.TEXT:
                         try:
-                            data = msg.json()
-                            self.loop.create_task(self.dispatch_events(data))
-                        except json.JSONDecodeError:
+                            data = msg.json(loads=loads)
+                            await self.dispatch_events(data)
+                        except JSONDecodeError:
                             pass
                     elif msg.type in (
                         WSMsgType.CLOSE,
@@ -1,18 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import json
 import os
-import ssl
 import subprocess as sp
 import sys
 import time
 from asyncio import AbstractEventLoop, Future, TimeoutError, sleep, wait_for
 from typing import Coroutine, Optional
 
-import certifi
-from aiohttp import ClientSession, TCPConnector, WSMsgType
+from aiohttp import ClientSession, WSMsgType
 
 from .._exception import IdTokenError
+from .._json import JSONDecodeError, loads
 from .._utils import exception_handler
 from ..async_api import AsyncAPI
 from ..logger import Logger
@@ -99,9 +97,8 @@ class WebHook(AbstractProto):
 
     async def simple_ws_connect(self, url, is_ssl):
         async with ClientSession(
-            connector=TCPConnector(
-                ssl=ssl.create_default_context(cafile=certifi.where())
-            )
+            connector=await self.raw_api._session.connector_factory.get(),
+            connector_owner=False,
         ) as ws_session:
             try:
                 async with ws_session.head(
@@ -127,9 +124,9 @@ class WebHook(AbstractProto):
                 async for msg in self.ws:
                     if msg.type == WSMsgType.TEXT:
                         try:
-                            data = msg.json()
-                            self.loop.create_task(self.dispatch_events(data))
-                        except json.JSONDecodeError:
+                            data = msg.json(loads=loads)
+                            await self.dispatch_events(data)
+                        except JSONDecodeError:
                             pass
                     elif msg.type in (
                         WSMsgType.CLOSE,
@@ -1,17 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import ssl
 from asyncio import AbstractEventLoop, CancelledError, Future
 from asyncio import TimeoutError as AsyncTimeoutError
 from asyncio import sleep
-from json import JSONDecodeError, dumps
 from time import time
 from typing import Coroutine
 
-import certifi
-from aiohttp import ClientSession, TCPConnector, WSMsgType, WSServerHandshakeError
+from aiohttp import ClientSession, WSMsgType, WSServerHandshakeError
 
 from .._exception import IdTokenError
+from .._json import JSONDecodeError, dumps, loads
 from .._utils import exception_handler
 from ..async_api import AsyncAPI
 from ..logger import Logger
@@ -99,9 +97,8 @@ class WS(AbstractProto):
         self.reconnect_times += 1
         try:
             async with ClientSession(
-                connector=TCPConnector(
-                    ssl=ssl.create_default_context(cafile=certifi.where())
-                )
+                connector=await self.raw_api._session.connector_factory.get(),
+                connector_owner=False,
             ) as ws_session:
                 async with ws_session.ws_connect(self.ws_url) as self.ws:
                     while not self.ws.closed:
@@ -118,8 +115,8 @@ class WS(AbstractProto):
                             return
                         if message.type == WSMsgType.TEXT:
                             try:
-                                data = message.json()
-                                self.loop.create_task(self.dispatch_events(data))
+                                data = message.json(loads=loads)
+                                await self.dispatch_events(data)
                             except JSONDecodeError:
                                 pass
                         elif message.type in (
@@ -158,7 +155,7 @@ class WS(AbstractProto):
         gateway = await self.raw_api._session.get(
             f"{self.raw_api._bot_url}/gateway/bot"
         )
-        gateway = await gateway.json()
+        gateway = await gateway.json(loads=loads)
         self.ws_url = gateway.get("url")
         if not self.ws_url:
             raise IdTokenError(
@@ -14,6 +14,11 @@ import certifi
 from aiohttp import ClientSession, TCPConnector, web
 from ed25519 import SigningKey
 
+try:  # 独立进程运行，无法使用包内的qg_botsdk._json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 redirect_table = {}
 redirect_path_table = Counter()
 redirect_table_lock = asyncio.Lock()
@@ -226,7 +231,7 @@ async def redirect_handle(request: web.Request):
     # send body to queue
     try:
         body = await request.text()
-        resp = await check_validation(json.loads(body), redirect_table[bot_id][0])
+        resp = await check_validation(json_loads(body), redirect_table[bot_id][0])
 
         if resp is None:  # not validation request, push to clients
             for queue in redirect_table[bot_id][1]:
@@ -15,18 +15,31 @@ from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 
 from . import _exception
 from ._api_model import StrPtr, robot_model
+from ._proto_events_conversion import EVENT_ROUTES, EventRoute, mixed_classes_count
 from ._session import SessionManager
 from ._utils import func_type_checker, union_type_checker
 from .api import API
 from .async_api import AsyncAPI
+from .connector import ConnectorFactory
+from .dispatcher import Dispatcher
+from .event_filter import EventFilter
 from .http import Session
 from .logger import Logger
-from .model import BotAdminManager, BotCommandObject, CommandValidScenes, Model
+from .model import (
+    BotAdminManager,
+    BotCommandObject,
+    CommandValidScenes,
+    Model,
+    Scope,
+)
 from .plugins import Plugins
 from .proto import Proto
 from .qg_bot_proto import BotProto as _BotWs
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from .sandbox import SandBox
 from .session import AbstractSessionManager, SessionPatcher
+from .session_storage import AbstractSessionStorage
 from .version import __version__
 
 pid = getpid()
@@ -44,7 +57,7 @@ class BOT:
         is_sandbox: bool = False,
         no_permission_warning: bool = True,
         is_async: bool = False,
-        is_retry: bool = True,
+        is_retry: Union[bool, RetryPolicy] = True,
         is_log_error: bool = True,
         max_workers: int = 32,
         api_max_concurrency: int = 0,
@@ -54,6 +67,12 @@ class BOT:
         auto_load_plugins: bool = False,
         plugins_dir: str = "plugins",
         plugins_recursive: bool = False,
+        dispatcher: Optional[Dispatcher] = None,
+        handler_lane: Optional[Scope] = None,
+        session_storage: Optional[AbstractSessionStorage] = None,
+        api_rate_limit: Optional[RateLimiter] = None,
+        connector_factory: Optional[ConnectorFactory] = None,
+        event_filter: Optional[EventFilter] = None,
     ):
         """
         机器人主体，输入BotAppID和密钥，并绑定函数后即可快速使用
@@ -65,7 +84,7 @@ class BOT:
         :param is_sandbox: 是否开启沙箱环境，默认False
         :param no_permission_warning: 是否开启当机器人获取疑似权限不足的事件时的警告提示，默认开启
         :param is_async: 使用同步api还是异步api，默认False（使用同步）
-        :param is_retry: 使用api时，如遇可重试的错误码是否自动进行重试，默认开启
+        :param is_retry: 使用api时，如遇可重试的错误码是否自动进行重试，默认开启；可传入RetryPolicy自定义重试次数、退避时间及重试预算
         :param is_log_error: 使用api时，如返回的结果为不成功，可自动log输出报错信息，默认开启
         :param max_workers: 在同步模式下，允许同时运行的最大线程数，默认32
         :param api_max_concurrency: API允许的最大并发数，超过此并发数将进入队列，如此数值<=0代表不开启任何队列，默认0
@@ -75,6 +94,12 @@ class BOT:
         :param auto_load_plugins: 是否自动加载插件目录中的插件，默认False
         :param plugins_dir: 插件目录路径，默认"plugins"
         :param plugins_recursive: 是否递归扫描子目录加载插件，默认False
+        :param dispatcher: 事件分发配置项，传入Dispatcher时事件将经由有界队列及固定数量的消费者处理；默认None，即每个事件直接创建任务处理
+        :param handler_lane: 按此scope（如Scope.USER、Scope.CHANNEL、Scope.GROUP）串行执行同一用户/子频道/群的事件处理函数，不同对象之间仍并行；默认None，即所有处理函数并行
+        :param session_storage: session的存储后端，如SQLiteSessionStorage()、RedisSessionStorage(redis.Redis())；默认None，即以pickle文件保存于运行目录下的session_data
+        :param api_rate_limit: API限速配置项，传入RateLimiter时按API路由及目标ID在本地排队限速；默认None，即不限速
+        :param connector_factory: 连接配置项，API、WebSocket及WebHook连接共用的连接池、DNS缓存及SSLContext设置；默认None，即使用ConnectorFactory()
+        :param event_filter: 事件过滤配置项，传入EventFilter时于事件转换为object数据及匹配指令之前按规则丢弃事件；默认None，即不过滤
         """
         # 改进的事件循环管理逻辑
         try:
@@ -106,6 +131,7 @@ class BOT:
         self._intents = 0
         self._bot_class = None
         self._func_registers = {}
+        self._event_routes: Dict[str, EventRoute] = {}
         self._repeat_function = None
         self._on_start_function = None
         self._on_stop_function = None
@@ -119,7 +145,7 @@ class BOT:
         self.no_permission_warning = no_permission_warning
         self.max_workers = max_workers
         self.is_async = is_async
-        self.__session_manager = SessionManager(self.logger)
+        self.__session_manager = SessionManager(self.logger, storage=session_storage)
         self.api: Union[AsyncAPI, API] = AsyncAPI(
             self.bot_url,
             Session(
@@ -133,6 +159,8 @@ class BOT:
                 self.logger,
                 api_max_concurrency,
                 api_timeout,
+                rate_limiter=api_rate_limit,
+                connector_factory=connector_factory,
             ),
             self.logger,
             self._check_warning,
@@ -171,6 +199,15 @@ class BOT:
         elif self.sandbox:
             raise TypeError("传入的沙箱配置项不是SandBox类")
         self._bot_admin_manager = BotAdminManager()
+        if dispatcher is not None and not isinstance(dispatcher, Dispatcher):
+            raise TypeError("传入的事件分发配置项不是Dispatcher类")
+        self.dispatcher = dispatcher
+        if event_filter is not None and not isinstance(event_filter, EventFilter):
+            raise TypeError("传入的事件过滤配置项不是EventFilter类")
+        self.event_filter = event_filter
+        if handler_lane is not None:
+            handler_lane = Scope(handler_lane)
+        self.handler_lane = handler_lane
 
     def __repr__(self):
         return f"<qg_botsdk.BOT object [id: {self.bot_id}, token: {self.bot_token}]>"
@@ -191,6 +228,13 @@ class BOT:
     def bot_admin_manager(self) -> BotAdminManager:
         return self._bot_admin_manager
 
+    @property
+    def event_classes_count(self) -> int:
+        """
+        当前缓存的、混入了事件Model的事件类数量
+        """
+        return mixed_classes_count()
+
     def load_default_msg_logger(self):
         """
         加载默认的消息日志模块，可以默认格式自动log记录接收到的用户消息
@@ -312,16 +356,22 @@ class BOT:
         for bit in range(CommandValidScenes.ALL.bit_length()):
             current_bit = 1 << bit
             self._preprocessors[current_bit].extend(preprocessors[current_bit])
+        if self._bot_class:
+            self._bot_class.update_commands()
 
     def clear_current_plugins(self):
         self._commands.clear()
         self._preprocessors = {
             1 << x: [] for x in range(CommandValidScenes.ALL.bit_length())
         }
+        if self._bot_class:
+            self._bot_class.update_commands()
 
     def remove_command(self, command_obj: BotCommandObject):
         if command_obj in self._commands:
             self._commands.remove(command_obj)
+            if self._bot_class:
+                self._bot_class.update_commands()
         else:
             raise ValueError(f"未找到指定的command {command_obj}")
 
@@ -534,6 +584,7 @@ class BOT:
         enabled: bool = True,
         is_require_bot_admin: bool = False,
         bot_admin_error_msg: Optional[str] = None,
+        short_circuit_timeout: Optional[float] = None,
     ):
         """
         指令装饰器。用于快速注册消息事件，当连同bind_msg使用时，如没有触发短路，bind_msg注册的函数将在最后被调用
@@ -550,6 +601,7 @@ class BOT:
         :param enabled: 是否启用此指令，默认True
         :param is_require_bot_admin: 是否要求机器人管理员才可触发指令，默认否
         :param bot_admin_error_msg: 当is_require_bot_admin为True，而触发用户的权限不足时，如此项不为None，返回此消息并短路；否则不进行短路
+        :param short_circuit_timeout: is_custom_short_circuit时等待回调函数返回的最长秒数，超时则不短路并继续检查后续指令，默认None（一直等待）
         """
 
         def wrap(
@@ -578,6 +630,7 @@ class BOT:
                 enabled,
                 is_require_bot_admin,
                 bot_admin_error_msg,
+                short_circuit_timeout,
             )(callback)
             if self._bot_class and self._bot_class.running:
                 self.refresh_plugins()
@@ -934,6 +987,41 @@ class BOT:
             return wraps
         wraps(callback)
 
+    def bind_event(
+        self,
+        event_types: Union[str, Iterable[str]],
+        callback: Callable[[Any], Any] = None,
+        intents: int = 0,
+    ):
+        """
+        用作绑定SDK尚未支持的事件类型的回调函数，收到相关事件时将直接以Object数据调用此函数，
+        如事件类型已有SDK内置的处理方式，则会取代之
+
+        :param event_types: 事件类型（即事件数据中的t字段），如"NEW_EVENT_CREATE"，可传入多个
+        :param callback: 类型为function，该回调函数应包含一个参数以接收Object消息数据进行处理
+        :param intents: 接收相关事件所需订阅的intents位，默认0（不额外订阅）
+        """
+        event_types = (
+            (event_types,) if isinstance(event_types, str) else tuple(event_types)
+        )
+
+        def wraps(func):
+            func_type_checker(func, object, is_async=self.is_async)
+            for t in event_types:
+                if t in EVENT_ROUTES:
+                    self.logger.warning(f"事件类型[{t}]的SDK内置处理方式将被取代")
+                route = EventRoute(f"on_event:{t}")
+                self._func_registers[route.handler] = func
+                self._event_routes[t] = route
+                if self._bot_class:
+                    self._bot_class.event_routes[t] = route
+            self._intents = self._intents | intents
+            self.logger.info(f"事件{list(event_types)}订阅成功")
+
+        if not callback:
+            return wraps
+        wraps(callback)
+
     def register_repeat_event(
         self,
         time_function: Callable[[], Any] = None,
@@ -1046,6 +1134,10 @@ class BOT:
                     self.protocol,
                     self.sandbox,
                     self._bot_admin_manager,
+                    self.dispatcher,
+                    self.handler_lane,
+                    self._event_routes,
+                    self.event_filter,
                 )
                 self.__task = self._loop.create_task(self._bot_class.start())
                 if is_blocking and not self._loop.is_running():
@@ -1,22 +1,38 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from asyncio import AbstractEventLoop, sleep
-from concurrent.futures import ThreadPoolExecutor
+from asyncio import AbstractEventLoop
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import isfuture, shield, sleep, wait_for, wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import copy, deepcopy
-from ssl import create_default_context
 from typing import Any, Callable, Dict, List, Optional, Union
 
 from ._api_model import StrPtr
+from ._command_index import build_scene_indexes
 from ._event import object_class
-from ._proto_events_conversion import EVENTS_TO_DISPATCH, EVENTS_TO_MODEL
+from ._lanes import HandlerLanes
+from ._proto_events_conversion import (
+    EVENT_ROUTES,
+    EVENTS_TO_MODEL,
+    EventRoute,
+    get_event_class,
+    get_mixed_class,
+)
 from ._seq_cache import SeqCache
 from ._session import SessionManager
-from ._statics import EVENTS, EVENTS_ENUM
-from ._utils import exception_processor, objectize, treat_msg, treat_thread
+from ._utils import exception_processor, handler_context, objectize, treat_msg
 from .api import API
 from .async_api import AsyncAPI
+from .dispatcher import Dispatcher, release_consumer
+from .event_filter import EventFilter
 from .logger import Logger
-from .model import BotAdminManager, BotCommandObject, CommandValidScenes, Model
+from .model import (
+    BotAdminManager,
+    BotCommandObject,
+    CommandValidScenes,
+    Model,
+    Scope,
+)
 from .proto import proto
 from .sandbox import SandBox
 
@@ -53,6 +69,10 @@ class BotProto:
         protocol: proto.Proto,
         sandbox: SandBox,
         bot_admin_manager: Optional[BotAdminManager] = None,
+        dispatcher: Optional[Dispatcher] = None,
+        handler_lane: Optional[Scope] = None,
+        event_routes: Optional[Dict[str, EventRoute]] = None,
+        event_filter: Optional[EventFilter] = None,
     ):
         """
         此为SDK内部使用类，注册机器人请使用from qg_botsdk.qg_bot import BOT
@@ -64,7 +84,6 @@ class BotProto:
         self._bot_id = bot_id
         self._bot_token = bot_token
         self._bot_secret = bot_secret
-        self._ssl = create_default_context()
         self.logger = logger
         self.auth = access_token if bot_secret else f"Bot {bot_id}.{bot_token}"
         self.on_start_function = on_start_function
@@ -93,6 +112,7 @@ class BotProto:
         self.api = api
         self.raw_api: AsyncAPI = api if is_async else api._api
         self.commands = commands
+        self.command_indexes = build_scene_indexes(commands)
         self.preprocessors = preprocessors
         self.session_manager = session_manager
         self.at = "<@!%s>"
@@ -104,7 +124,7 @@ class BotProto:
             auth=self.auth,
             logger=logger,
             loop=loop,
-            dispatch_func=self.dispatch_events,
+            dispatch_func=self.put_events,
             on_ready=self._start_event,
         )
         self.sandbox = sandbox
@@ -112,6 +132,14 @@ class BotProto:
         self.bot_admin_manager = (
             bot_admin_manager if bot_admin_manager else BotAdminManager()
         )
+        self.dispatcher = dispatcher
+        self.handler_lane = handler_lane
+        self.handler_lanes = HandlerLanes()
+        self.event_routes: Dict[str, EventRoute] = {
+            **EVENT_ROUTES,
+            **(event_routes or {}),
+        }
+        self.event_filter = event_filter
 
     @exception_processor
     async def _time_event_run(self):
@@ -156,11 +184,34 @@ class BotProto:
 
     @exception_processor
     async def async_start_callback_task(self, func, *args):
-        return await func(*args)
+        token = handler_context.set({"self": self, "func": func, "args": args})
+        try:
+            return await func(*args)
+        finally:
+            handler_context.reset(token)
 
     @exception_processor
     def start_callback_task(self, func, *args):
-        return func(*args)
+        # 线程池的线程不会在任务间复制上下文，因此必须在结束时还原
+        token = handler_context.set({"self": self, "func": func, "args": args})
+        try:
+            return func(*args)
+        finally:
+            handler_context.reset(token)
+
+    def update_commands(self):
+        """
+        指令集合变化后（如refresh_plugins、remove_command）重建各场景的指令匹配索引
+        """
+        self.command_indexes = build_scene_indexes(self.commands)
+
+    def objectize_event(self, data: Dict) -> object_class:
+        """
+        将事件数据转换为懒加载的事件对象，事件类按事件类型从缓存中获取
+        """
+        d = data.get("d", {})
+        t = d.get("t") if isinstance(d, dict) else None
+        return objectize(d, self.api, self.is_async, get_event_class(t, self.is_async))
 
     @exception_processor
     async def distribute(
@@ -171,38 +222,56 @@ class BotProto:
     ):
         if function:
             if not objectized_data:
-                objectized_data = objectize(data.get("d", {}), self.api, self.is_async)
+                objectized_data = self.objectize_event(data)
             t = getattr(objectized_data, "t", None)
             model_class = EVENTS_TO_MODEL.get(t, None)
-            if model_class and model_class not in objectized_data.__class__.__bases__:
-                # 创建一个新的类，继承自原始类和model_class
-                new_class = type(
-                    objectized_data.__class__.__name__,
-                    objectized_data.__class__.__bases__ + (model_class,),
-                    dict(objectized_data.__class__.__dict__),
+            if model_class and not isinstance(objectized_data, model_class):
+                # 将objectized_data的类更改为同时继承原始类和model_class的缓存类
+                objectized_data.__class__ = get_mixed_class(
+                    objectized_data.__class__, model_class
                 )
-                # 将objectized_data的类更改为新创建的类
-                objectized_data.__class__ = new_class
-            if not self.is_async:
-                return self.threads.submit(
-                    self.start_callback_task, function, objectized_data
-                )
-            else:
-                return self.loop.create_task(
-                    self.async_start_callback_task(function, objectized_data)
+            if self.handler_lane:
+                key = self.session_manager.get_identify(
+                    self.handler_lane, objectized_data
                 )
+                if key:
+                    return self.handler_lanes.submit(
+                        key,
+                        lambda: self.start_handler(function, objectized_data),
+                        self.loop.create_future if self.is_async else Future,
+                    )
+            return self.start_handler(function, objectized_data)
+
+    def start_handler(self, function, objectized_data):
+        if not self.is_async:
+            return self.threads.submit(
+                self.start_callback_task, function, objectized_data
+            )
+        else:
+            return self.loop.create_task(
+                self.async_start_callback_task(function, objectized_data)
+            )
 
     @exception_processor
     def treat_command(
-        self, objectized_data: Model.MESSAGE, treated_msg, command=None, regex=None
+        self,
+        objectized_data: Model.MESSAGE,
+        treated_msg,
+        command=None,
+        regex=None,
+        command_offset: int = 0,
     ):
         if self.msg_treat:
             msg = treated_msg
-            new_treated_msg = (
-                msg[msg.find(command) + len(command) :].strip()
-                if command is not None
-                else regex.groups()
-            )
+            if command is None:
+                new_treated_msg = regex.groups()
+            else:
+                # "/"开头的指令在处理后的消息中已去除前缀，位于消息开头时无需再次查找
+                head = command[command_offset:] if command[:1] == "/" else command
+                if msg.startswith(head):
+                    new_treated_msg = msg[len(head) :].strip()
+                else:
+                    new_treated_msg = msg[msg.find(command) + len(command) :].strip()
             new_objectized_data = copy(objectized_data)
             new_objectized_data.__dict__ = objectized_data.__dict__.copy()
             new_objectized_data.treated_msg = new_treated_msg
@@ -267,11 +336,23 @@ class BotProto:
         task = await self.distribute(command_obj.func, objectized_data=objectized_data)
         if not command_obj.is_custom_short_circuit:
             return command_obj.short_circuit  # True or False
-        else:
-            while not task.done():
-                await sleep(0.1)
-            r = task.result()
-            return r  # True or False
+        if task is None:
+            return False
+        if not isfuture(task):  # 同步模式下为线程池的concurrent.futures.Future
+            task = wrap_future(task, loop=self.loop)
+        if not task.done():
+            # 回调函数可能wait_for同一频道或群的下一条消息，而该消息会进入同一个分发队列，
+            # 因此等待期间由新的消费者接替处理该队列
+            release_consumer()
+        try:
+            # shield：超时只是不再等待其结果，回调函数仍继续运行
+            return await wait_for(shield(task), command_obj.short_circuit_timeout)
+        except AsyncTimeoutError:
+            self.logger.warning(
+                f"{command_obj} 的回调函数未在{command_obj.short_circuit_timeout}秒内返回，"
+                "将不进行短路并继续检查后续指令"
+            )
+            return False
 
     def _get_user_id(
         self,
@@ -347,15 +428,16 @@ class BotProto:
 
     @exception_processor
     async def distribute_commands(
-        self, current_scene: CommandValidScenes, data: Dict, treated_msg: str
+        self,
+        current_scene: CommandValidScenes,
+        data: Dict,
+        treated_msg: str,
+        command_offset: int = 0,
     ):
-        objectized_data = objectize(data.get("d", {}), self.api, self.is_async)
+        objectized_data = self.objectize_event(data)
         # run preprocessors
-        for scene, funcs in self.preprocessors.items():
-            if scene & current_scene == 0:
-                continue
-            for func in funcs:
-                await self.distribute(func, objectized_data=objectized_data)
+        for func in self.preprocessors.get(current_scene, ()):
+            await self.distribute(func, objectized_data=objectized_data)
         # check commands
         msg = data.get("d", {}).get("content", "")
         if self.process_wait_for_commands(
@@ -363,32 +445,21 @@ class BotProto:
         ):
             return True
 
-        def get_max_command_length(cmd_obj: BotCommandObject) -> int:
-            if cmd_obj.command:
-                return max(len(c) for c in cmd_obj.command)
-            return 0
-
-        sorted_commands = sorted(
-            self.commands, key=get_max_command_length, reverse=True
-        )
-        for items in sorted_commands:
-            if items.valid_scenes & current_scene == 0:
-                continue
-            commands = items.command
-            regexs = items.regex
-            if commands:
-                for command in commands:
-                    if command.startswith("/"):
-                        match_target = msg
-                    else:
-                        match_target = treated_msg
-                    if command in match_target and (not items.at or self.at in msg):
+        command_index = self.command_indexes[current_scene]
+        for items, matched_commands in command_index.match(msg, treated_msg):
+            if matched_commands is not None:
+                for command in matched_commands:
+                    if not items.at or self.at in msg:
                         if await self.check_command(
-                            objectized_data, treated_msg, items, command=command
+                            objectized_data,
+                            treated_msg,
+                            items,
+                            command=command,
+                            command_offset=command_offset,
                         ):
                             return True
             else:
-                for regex in regexs:
+                for regex in items.regex:
                     regex_result = regex.search(treated_msg)
                     if regex_result and (not items.at or self.at in msg):
                         if await self.check_command(
@@ -405,80 +476,35 @@ class BotProto:
             data["d"] = d
         data["d"]["t"] = t
         data["d"]["event_id"] = data.get("id")
+        # 在转换为object数据及匹配指令之前以原始数据过滤事件
+        if self.event_filter and not self.event_filter.check(t, d):
+            return
         # process and distribute data
-        if t in EVENTS_TO_DISPATCH:
-            _key, _grp = EVENTS_TO_DISPATCH[t]
-            if self.sandbox and not self.sandbox.checker(_grp, data):
-                return
-            await self.distribute(self.func_registers[_key], data)
-        elif (
-            t in EVENTS.MESSAGE_CREATE
-            or t in EVENTS.DM_CREATE
-            or t in EVENTS.C2C_MESSAGE_CREATE
-            or t in EVENTS.GROUP_AT_MESSAGE_CREATE
+        route = self.event_routes.get(t)
+        if route is None:
+            self.logger.warning(f"unknown event type: [{t}]")
+            return
+        if (
+            route.sandbox is not None
+            and self.sandbox
+            and not self.sandbox.checker(route.sandbox, data)
         ):
+            return
+        for step in route.pre:
+            if not step(self, data):
+                return
+        if route.scene is not None:
+            command_offset = 0
             if self.msg_treat:
-                raw_msg = d.get("content", "").strip()
-                treated_msg = treat_msg(raw_msg, self.at)
-                data["d"]["treated_msg"] = treated_msg
-            else:
-                treated_msg = ""
+                d["treated_msg"], command_offset = treat_msg(
+                    d.get("content", "").strip(), self.at
+                )
             # distribute_commands return True when short circuit
-            if t in EVENTS.MESSAGE_CREATE:
-                if self.sandbox and not self.sandbox.checker(
-                    EVENTS_ENUM.MESSAGE_CREATE, data
-                ):
-                    return
-                if not await self.distribute_commands(
-                    CommandValidScenes.GUILD, data, treated_msg
-                ):
-                    await self.distribute(self.func_registers["on_msg"], data)
-            elif t in EVENTS.DM_CREATE:
-                if self.sandbox and not self.sandbox.checker(
-                    EVENTS_ENUM.DM_CREATE, data
-                ):
-                    return
-                if not await self.distribute_commands(
-                    CommandValidScenes.DM, data, treated_msg
-                ):
-                    await self.distribute(self.func_registers["on_dm"], data)
-            elif t in EVENTS.C2C_MESSAGE_CREATE:
-                if self.sandbox and not self.sandbox.checker(
-                    EVENTS_ENUM.C2C_MESSAGE_CREATE, data
-                ):
-                    return
-                if not await self.distribute_commands(
-                    CommandValidScenes.C2C, data, treated_msg
-                ):
-                    await self.distribute(self.func_registers["on_friend_msg"], data)
-            else:  # t in EVENTS.GROUP_AT_MESSAGE_CREATE
-                if self.sandbox and not self.sandbox.checker(
-                    EVENTS_ENUM.GROUP_AT_MESSAGE_CREATE, data
-                ):
-                    return
-                if not await self.distribute_commands(
-                    CommandValidScenes.GROUP, data, treated_msg
-                ):
-                    await self.distribute(self.func_registers["on_group_msg"], data)
-        elif t in EVENTS.MESSAGE_DELETE:
-            if self.sandbox and not self.sandbox.checker(
-                EVENTS_ENUM.MESSAGE_DELETE, data
+            if await self.distribute_commands(
+                route.scene, data, d.get("treated_msg", ""), command_offset
             ):
                 return
-            if self.func_registers["del_is_filter_self"]:
-                target = d.get("message", {}).get("author", {}).get("id")
-                op_user = d.get("op_user", {}).get("id")
-                if op_user == target:
-                    return
-            await self.distribute(self.func_registers["on_delete"], data)
-        elif t in EVENTS.FORUM:
-            if self.sandbox and not self.sandbox.checker(EVENTS_ENUM.FORUM, data):
-                return
-            if t == "FORUM_THREAD_CREATE":
-                treat_thread(data)
-            await self.distribute(self.func_registers["on_forum"], data)
-        else:
-            self.logger.warning(f"unknown event type: [{t}]")
+        await self.distribute(self.func_registers.get(route.handler), data)
 
     async def dispatch_events(self, data: dict):
         if "s" in data:
@@ -528,9 +554,28 @@ class BotProto:
         else:
             self.logger.debug(f"未知的op类型：{op}")
 
+    async def put_events(self, data: dict):
+        """
+        连接层收到事件后的入口，配置了Dispatcher时普通事件进入有界分发队列，其余情况直接创建任务处理
+        """
+        if (
+            self.dispatcher
+            and data.get("op") == 0
+            and data.get("t") not in ("READY", "RESUMED")
+        ):
+            # 心跳使用的seq及连接活跃时间需在入队时即更新，而非等待事件被处理
+            if "s" in data:
+                self.s = data["s"]
+            self.protocol.update_last_msg_recv_time()
+            await self.dispatcher.put(data)
+        else:
+            self.loop.create_task(self.dispatch_events(data))
+
     async def start(self):
         self.running = True
         self.session_manager.start(self.loop)
+        if self.dispatcher:
+            self.dispatcher.start(self.loop, self.dispatch_events, self.logger)
         await self.protocol.start()
 
     async def close(self):
@@ -539,3 +584,5 @@ class BotProto:
     async def stop(self):
         self.running = False
         await self.protocol.stop()
+        if self.dispatcher:
+            await self.dispatcher.stop()
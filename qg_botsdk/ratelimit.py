@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+from asyncio import sleep
+from time import monotonic
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+from ._api_model import apis
+
+RouteKey = Tuple[str, str, Optional[str]]  # (method, URL模板, 目标ID)
+
+
+def _compile_routes() -> Dict[str, List[Tuple[Pattern, str, str]]]:
+    """
+    将_api_model.apis中的URL模板编译为正则，按method分组；参数较少（字面部分较多）的模板优先匹配
+    """
+    routes: Dict[str, List[Tuple[int, Pattern, str, str]]] = {}
+    for keys, (method, template) in apis.items():
+        if not method:
+            continue
+        params = re.findall(r"{(\w+)}", template)
+        pattern = re.compile(
+            "^" + re.sub(r"\\{\w+\\}", "([^/]+)", re.escape(template)) + "/?$"
+        )
+        routes.setdefault(method, []).append((len(params), pattern, template, keys[1]))
+    return {
+        method: [x[1:] for x in sorted(items, key=lambda x: x[0])]
+        for method, items in routes.items()
+    }
+
+
+_ROUTES = _compile_routes()
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+
+    def reserve(self, now: float) -> float:
+        """
+        预留一个令牌，令牌不足时允许为负数（即排队），返回需等待的秒数
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def consume(self, now: float) -> bool:
+        """
+        不排队地取得一个令牌，令牌不足时返回False且不扣减
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def drain(self, now: float):
+        self.tokens = min(0, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float = 5,
+        burst: int = 5,
+        routes: Optional[Dict[str, Optional[Tuple[float, int]]]] = None,
+        per_target: bool = True,
+    ):
+        """
+        API限速配置项，按 method + URL模板 + 目标ID（如子频道ID、群openid）分别以令牌桶限速，
+        超出速率的请求在本地排队等待，而非发送后因频率限制失败再重试
+
+        :param rate: 每个路由每秒允许的请求数，默认5
+        :param burst: 每个路由允许的突发请求数，默认5
+        :param routes: 按API名称（如"send_group_msg"）单独设置(rate, burst)，设为None则该API不限速
+        :param per_target: 是否按目标ID（URL中的第一个参数，如channel_id、group_openid）分别限速，默认True
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate必须大于0，burst必须大于等于1")
+        self.rate = rate
+        self.burst = burst
+        self.routes = dict(routes or {})
+        self.per_target = per_target
+        self.__buckets: Dict[RouteKey, _TokenBucket] = {}
+        self.__acquired = 0
+        self.__delayed = 0
+        self.__total_wait_time = 0.0
+        self.__max_wait_time = 0.0
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        限速的运行指标
+
+        - buckets: 当前使用中的令牌桶数量
+        - acquired: 经过限速的请求数
+        - delayed: 因超出速率而在本地排队的请求数
+        - avg_wait_time / max_wait_time: 排队请求的平均/最长等待秒数
+        """
+        return {
+            "buckets": len(self.__buckets),
+            "acquired": self.__acquired,
+            "delayed": self.__delayed,
+            "avg_wait_time": (
+                self.__total_wait_time / self.__delayed if self.__delayed else 0.0
+            ),
+            "max_wait_time": self.__max_wait_time,
+        }
+
+    @staticmethod
+    def resolve(method: str, url: str) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        :return: (API名称, URL模板, 目标ID)，无法匹配已知API时返回None
+        """
+        path = urlsplit(url).path
+        for pattern, template, name in _ROUTES.get(method.upper(), ()):
+            match = pattern.match(path)
+            if match:
+                return name, template, match.group(1) if match.groups() else None
+        return None
+
+    def __bucket(self, method: str, url: str) -> Optional[_TokenBucket]:
+        route = self.resolve(method, url)
+        if route is None:
+            return None
+        name, template, target = route
+        limit = self.routes.get(name, (self.rate, self.burst))
+        if limit is None:
+            return None
+        key = (method.upper(), template, target if self.per_target else None)
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            bucket = self.__buckets[key] = _TokenBucket(*limit)
+        return bucket
+
+    def __prune(self, now: float):
+        for key in [k for k, b in self.__buckets.items() if b.idle(now)]:
+            del self.__buckets[key]
+
+    async def acquire(self, method: str, url: str):
+        """
+        等待直至该请求的路由允许发送
+        """
+        bucket = self.__bucket(method, url)
+        if bucket is None:
+            return
+        now = monotonic()
+        wait_time = bucket.reserve(now)
+        self.__acquired += 1
+        if not self.__acquired % 1024:  # 定期清理已回满的令牌桶，避免按目标ID无限增长
+            self.__prune(now)
+        if wait_time > 0:
+            self.__delayed += 1
+            self.__total_wait_time += wait_time
+            if wait_time > self.__max_wait_time:
+                self.__max_wait_time = wait_time
+            await sleep(wait_time)
+
+    def penalize(self, method: str, url: str):
+        """
+        收到频率限制的响应时清空该路由的令牌，使后续请求先行等待
+        """
+        bucket = self.__bucket(method, url)
+        if bucket is not None:
+            bucket.drain(monotonic())
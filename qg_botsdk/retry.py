@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from email.utils import parsedate_to_datetime
+from random import uniform
+from time import monotonic, time
+from typing import Any, Dict, Iterable, Optional
+
+from ._utils import retry_err_code
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class _RetryBudget:
+    """
+    全局重试预算：每个请求存入ratio个令牌，每次重试取出1个令牌，另按min_per_second持续补充保底额度；
+    令牌不足时不再重试，避免在服务端故障时重试成倍放大请求量
+    """
+
+    __slots__ = ("ratio", "min_per_second", "capacity", "balance", "updated")
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(min_per_second * 10, 1.0)
+        self.balance = self.capacity
+        self.updated = monotonic()
+
+    def __refill(self, extra: float = 0.0):
+        now = monotonic()
+        self.balance = min(
+            self.capacity,
+            self.balance + (now - self.updated) * self.min_per_second + extra,
+        )
+        self.updated = now
+
+    def deposit(self):
+        self.__refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        self.__refill()
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.05,
+        max_delay: float = 5.0,
+        jitter: bool = True,
+        budget_ratio: float = 0.2,
+        min_retries_per_second: float = 5.0,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+    ):
+        """
+        API请求的重试配置项，以指数退避（可带随机抖动）重试，并遵从服务端返回的Retry-After；
+        所有请求共用一个重试预算，预算耗尽时直接返回失败结果而不再重试
+
+        :param max_attempts: 每个请求的最大尝试次数（包括首次请求），默认3
+        :param base_delay: 首次重试前的基础等待秒数，之后每次重试翻倍，默认0.05
+        :param max_delay: 单次重试的最长等待秒数，Retry-After超过此值时不再重试，默认5.0
+        :param jitter: 是否在[0, 退避时间]之间随机取等待时间，避免大量请求同时重试，默认True
+        :param budget_ratio: 每个请求为重试预算存入的额度，如0.2代表重试量最多约为请求量的20%，默认0.2
+        :param min_retries_per_second: 重试预算每秒保底补充的额度，保证请求量较少时仍可重试，默认5.0
+        :param retry_statuses: 可重试的HTTP状态码（非幂等的请求仅重试其中的429及带有Retry-After的503），此外返回的错误码位于可重试错误码中时亦会重试
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts必须大于等于1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.__budget = _RetryBudget(budget_ratio, min_retries_per_second)
+        self.__requests = 0
+        self.__retries = 0
+        self.__budget_exhausted = 0
+        self.__gave_up = 0
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        重试的运行指标
+
+        - requests: 经过重试配置的请求数
+        - retries: 已进行的重试次数
+        - budget_exhausted: 因重试预算耗尽而放弃重试的次数
+        - gave_up: 因尝试次数用尽或Retry-After过长而放弃重试的次数
+        - budget: 当前剩余的重试预算
+        """
+        return {
+            "requests": self.__requests,
+            "retries": self.__retries,
+            "budget_exhausted": self.__budget_exhausted,
+            "gave_up": self.__gave_up,
+            "budget": self.__budget.balance,
+        }
+
+    def start(self):
+        """
+        记录一个新请求，并为重试预算存入额度
+        """
+        self.__requests += 1
+        self.__budget.deposit()
+
+    def is_retryable(
+        self,
+        status: int,
+        code: Optional[int] = None,
+        method: str = "GET",
+        retry_after: Optional[float] = None,
+    ) -> bool:
+        """
+        非幂等的请求（如POST）在5xx时无法确定服务端是否已处理，仅在429、带有Retry-After的503或可重试错误码时重试
+
+        :param status: HTTP状态码
+        :param code: 返回的json中的错误码，非json返回时为None
+        :param method: 请求方法
+        :param retry_after: 服务端要求的等待秒数
+        """
+        if code in retry_err_code:
+            return True
+        if status not in self.retry_statuses:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        return status == 429 or (status == 503 and retry_after is not None)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        :param attempt: 已失败的尝试次数，从1开始
+        :param retry_after: 服务端要求的等待秒数
+        :return: 下次重试前的等待秒数
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = uniform(0, delay)
+        if retry_after is not None and retry_after > delay:
+            delay = retry_after
+        return delay
+
+    def allow(self, attempt: int, retry_after: Optional[float] = None) -> bool:
+        """
+        判断在第attempt次尝试失败后是否允许重试，允许时会从重试预算中取出额度
+
+        :param attempt: 已失败的尝试次数，从1开始
+        :param retry_after: 服务端要求的等待秒数
+        """
+        if attempt >= self.max_attempts or (
+            retry_after is not None and retry_after > self.max_delay
+        ):
+            self.__gave_up += 1
+            return False
+        if not self.__budget.withdraw():
+            self.__budget_exhausted += 1
+            return False
+        self.__retries += 1
+        return True
+
+    @staticmethod
+    def parse_retry_after(headers) -> Optional[float]:
+        """
+        解析Retry-After头，支持秒数及HTTP日期两种格式
+
+        :return: 需等待的秒数，无此头或无法解析时为None
+        """
+        value = headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+        except (TypeError, ValueError, IndexError):
+            return None
@@ -189,6 +189,14 @@ class AbstractSessionManager(ABC):
         """
         ...
 
+    @property
+    @abstractmethod
+    def commit_metrics(self) -> Dict:
+        """
+        数据写入的运行指标，包括写入次数、完整快照次数、合并写入次数、失败次数及写入的最近/最长/平均秒数
+        """
+        ...
+
 
 class SessionPatcher:
     """
@@ -206,8 +214,8 @@ class SessionPatcher:
             "api",
             "start",
             "register_wait_for",
-            "check_wait_for",
             "del_wait_for",
+            "get_identify",
             "wait_for_message_checker",
         ):
             raise AttributeError(f"Plugins.session has no attribute '{item}'")
@@ -217,6 +225,7 @@ class SessionPatcher:
             "commit_data",
             "set_auto_commit",
             "set_commit_path",
+            "commit_metrics",
         ):
             return func
 
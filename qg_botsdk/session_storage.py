@@ -0,0 +1,735 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import dbm
+import os
+import pickle
+import sqlite3
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .logger import Logger
+
+_AllScopeStr = ("USER", "GUILD", "CHANNEL", "GROUP", "GLOBAL")
+_SNAPSHOT_MAGIC = b"QGSS"
+_SNAPSHOT_HEADER = struct.Struct(">4sQ")  # magic, 代数
+_LOG_MAGIC = b"QGSL"
+_LOG_HEADER = struct.Struct(">4sQ")  # magic, 对应快照的代数
+_FRAME_HEADER = struct.Struct(">II")  # 长度, CRC32
+_FRAME_ITEMS = 256  # 快照每段最多包含的identify（GLOBAL则为key）数量
+LOG_COMPACT_SIZE = 1 << 20  # 追加日志超过此大小（且超过快照大小）时合并为完整快照
+
+# 存储后端接收的改动记录，session数据已在事件循环中序列化为bytes：
+#   ("set", scope, identify, key, payload, due)  写入session，due为下次需检查的时间戳（无则为None）
+#   ("del", scope, identify, key)                删除session
+#   ("clear", scope, identify)                   scope为None时清空所有，identify为None时清空整个scope
+Record = Tuple
+SessionRow = Tuple[str, Hashable, Hashable, bytes]
+
+
+def _encode(value: Hashable) -> bytes:
+    return pickle.dumps(value, protocol=4)
+
+
+def apply_records(sessions: Dict, records: Iterable[Record]):
+    """
+    将改动记录应用至嵌套dict格式的session数据（与SessionManager.get_all()的格式相同）
+    """
+    for record in records:
+        op = record[0]
+        if op == "clear":
+            scope, identify = record[1], record[2]
+            if scope is None:
+                for x in _AllScopeStr:
+                    sessions[x] = {}
+            elif identify is None:
+                sessions[scope].clear()
+            else:
+                sessions[scope][identify] = {}
+            continue
+        scope, identify, key = record[1], record[2], record[3]
+        group = sessions[scope]
+        if op == "set":
+            if identify is not None:
+                group = group.setdefault(identify, {})
+            group[key] = pickle.loads(record[4])
+        else:
+            if identify is not None:
+                group = group.get(identify, {})
+            group.pop(key, None)
+
+
+def _covered(scope: Optional[str], identify: Hashable, loc: Tuple) -> bool:
+    """
+    位置(scope, identify, key)是否在("clear", scope, identify)的清空范围内
+    """
+    return scope is None or (
+        loc[0] == scope and (identify is None or loc[1] == identify)
+    )
+
+
+def rows_to_sessions(rows: Iterable[SessionRow]) -> Dict:
+    sessions = {x: {} for x in _AllScopeStr}
+    for scope, identify, key, payload in rows:
+        group = sessions[scope]
+        if identify is not None:
+            group = group.setdefault(identify, {})
+        group[key] = pickle.loads(payload)
+    return sessions
+
+
+class AbstractSessionStorage(ABC):
+    """
+    Session Manager的存储后端。SessionManager在内存中保留正在使用的session，改动以记录的形式批量交由后端写入（于线程池中执行）。
+
+    - lazy=True 的后端可读取单个session；启动时默认读取全部数据，load_on_demand=True时只读取带有超时时间的session位置，
+      其余session在使用时才读取（读取于调用get()等方法的线程中同步进行，异步模式下会阻塞事件循环），适合大量session或多进程共享数据
+    - lazy=False 的后端在启动时读取全部数据，并可由SessionManager定期写入完整快照
+    - persistent=False 的后端不保存任何数据，SessionManager不会记录改动或序列化session
+    """
+
+    lazy: bool = True
+    persistent: bool = True
+    load_on_demand: bool = False
+    cache_ttl: float = 60.0
+
+    def __str__(self):
+        return self.__class__.__name__
+
+    def open(self, bot_identify: str, logger: Logger):
+        """
+        由SessionManager在初始化时调用
+
+        :param bot_identify: 机器人ID，用于区分不同机器人的数据
+        :param logger: 日志实例
+        """
+        ...
+
+    def close(self):
+        """
+        释放连接等资源，默认无需处理
+        """
+        ...
+
+    @abstractmethod
+    def apply(self, records: List[Record]):
+        """
+        按顺序写入一批改动记录，于线程池中调用
+        """
+        ...
+
+    # -*- lazy=True 的后端需实现 -*-
+    def load(self, scope: str, identify: Hashable, key: Hashable) -> Optional[bytes]:
+        """
+        读取单个session的序列化数据，不存在时返回None
+        """
+        raise NotImplementedError
+
+    def load_all(self) -> Iterable[SessionRow]:
+        """
+        读取所有session的(scope, identify, key, 序列化数据)
+        """
+        raise NotImplementedError
+
+    def scheduled(self) -> Iterable[Tuple[str, Hashable, Hashable, float]]:
+        """
+        读取所有需要检查超时或回收的session的(scope, identify, key, 检查时间戳)
+        """
+        raise NotImplementedError
+
+    # -*- lazy=False 的后端需实现 -*-
+    def load_sessions(self) -> Dict:
+        """
+        读取全部session，格式与SessionManager.get_all()相同
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def serialize_snapshot(sessions: Dict) -> bytes:
+        """
+        序列化全部session，结果交由write_snapshot()写入，于线程池中调用（commit_data()则于调用它的线程中调用）
+        """
+        return pickle.dumps(sessions)
+
+    def write_snapshot(self, pk_data: bytes):
+        """
+        以serialize_snapshot()序列化的全部session覆盖已保存的数据，于线程池中调用
+        """
+        ...
+
+    @property
+    def snapshot_required(self) -> bool:
+        """
+        是否需要由SessionManager写入完整快照（如追加日志过大）
+        """
+        return False
+
+
+class MemorySessionStorage(AbstractSessionStorage):
+    """
+    仅保存于内存，不进行任何持久化
+    """
+
+    lazy = False
+    persistent = False
+
+    def apply(self, records: List[Record]):
+        pass
+
+    def load_sessions(self) -> Dict:
+        return {x: {} for x in _AllScopeStr}
+
+
+class FileSessionStorage(AbstractSessionStorage):
+    """
+    默认的存储后端：以pickle快照（session_<id>.db）加追加日志（session_<id>.log）的方式保存于本地文件夹，启动时读取全部数据。
+
+    快照先写入临时文件并fsync，再以os.replace替换，写入过程中进程退出也不会破坏已有的快照；
+    快照按scope分段并附带CRC校验，部分损坏时仍可读取其余数据
+    """
+
+    lazy = False
+
+    def __init__(
+        self,
+        commit_path: Optional[str] = None,
+        compact_size: int = LOG_COMPACT_SIZE,
+        backups: int = 1,
+        fsync: bool = True,
+    ):
+        """
+        :param commit_path: 保存数据的文件夹路径，默认为运行目录下的session_data
+        :param compact_size: 追加日志超过此大小（且超过快照大小）时合并为完整快照，默认1MB
+        :param backups: 保留的旧快照数量（session_<id>.db.1、.db.2……），快照无法读取时依次尝试读取，默认1
+        :param fsync: 写入快照及日志后是否调用fsync确保数据落盘，默认True
+        """
+        self.commit_path = commit_path or os.path.join(os.getcwd(), "session_data")
+        self.check_path(self.commit_path)
+        self.compact_size = compact_size
+        self.backups = backups
+        self.fsync = fsync
+        self.bot_identify = None
+        self.logger: Optional[Logger] = None
+        self.snapshot_size = 0
+        self.log_size = 0
+        self.generation = 0  # 快照的代数，日志仅在代数与快照相同时重放
+
+    @staticmethod
+    def check_path(commit_path: str):
+        if not os.path.exists(commit_path):
+            path_splits = os.path.split(commit_path)
+            if "." in path_splits[-1]:
+                raise ValueError(f"路径 '{commit_path}' 不是文件夹（包含'.'）")
+            os.makedirs(commit_path)
+        elif not os.path.isdir(commit_path):
+            raise ValueError(f"路径 '{commit_path}' 不是文件夹")
+
+    def __str__(self):
+        return self.commit_path
+
+    def set_path(self, commit_path: str):
+        self.check_path(commit_path)
+        self.commit_path = commit_path
+        self.log_size = 0
+
+    def path(self, suffix: str) -> str:
+        return os.path.join(self.commit_path, f"session_{self.bot_identify}.{suffix}")
+
+    def open(self, bot_identify: str, logger: Logger):
+        self.bot_identify = bot_identify
+        self.logger = logger
+
+    @property
+    def snapshot_required(self) -> bool:
+        return self.log_size > max(self.compact_size, self.snapshot_size)
+
+    # -*- read -*-
+    def load_sessions(self) -> Dict:
+        _paths = [self.path("db")] + [
+            self.path(f"db.{i}") for i in range(1, self.backups + 1)
+        ]
+        sessions = {x: {} for x in _AllScopeStr}
+        self.generation = 0
+        for _path in _paths:
+            if not os.path.exists(_path):
+                continue
+            try:
+                self.generation = self.__read_snapshot(_path, sessions)
+            except Exception as e:
+                self.logger.error(
+                    f"Session Manager 读取 {_path} 时出现错误，将跳过：{repr(e)}"
+                )
+                sessions = {x: {} for x in _AllScopeStr}
+                continue
+            self.snapshot_size = os.path.getsize(_path)
+            if _path != _paths[0]:
+                self.logger.warning(f"Session Manager 已从旧快照 {_path} 恢复数据")
+            break
+        self.__replay_log(sessions)
+        return sessions
+
+    def __read_snapshot(self, _path: str, sessions: Dict) -> int:
+        """
+        逐段读取快照，跳过校验失败的分段
+
+        :return: 快照的代数，旧版的单个pickle快照为0
+        """
+        with open(_path, "rb") as f_db:
+            head = f_db.read(_SNAPSHOT_HEADER.size)
+            if len(head) < _SNAPSHOT_HEADER.size or not head.startswith(
+                _SNAPSHOT_MAGIC
+            ):
+                f_db.seek(0)
+                self.__load_legacy_snapshot(sessions, pickle.load(f_db))
+                return 0
+            generation = _SNAPSHOT_HEADER.unpack(head)[1]
+            damaged, complete = 0, False
+            while True:
+                header = f_db.read(_FRAME_HEADER.size)
+                if len(header) < _FRAME_HEADER.size:
+                    break
+                length, crc = _FRAME_HEADER.unpack(header)
+                if not length:  # 结束标记
+                    complete = True
+                    break
+                payload = f_db.read(length)
+                if len(payload) < length:
+                    break
+                try:
+                    if zlib.crc32(payload) != crc:
+                        raise ValueError("CRC校验失败")
+                    scope, chunk = pickle.loads(payload)
+                    sessions[scope].update(chunk)
+                except Exception as e:
+                    damaged += 1
+                    self.logger.error(
+                        f"Session Manager 读取 {_path} 的分段时出现错误，将跳过：{repr(e)}"
+                    )
+        if damaged or not complete:
+            self.logger.warning(
+                f"Session Manager 快照 {_path} 已损坏（{damaged}段校验失败"
+                f"{'' if complete else '，文件不完整'}），已恢复其余数据"
+            )
+        return generation
+
+    def __load_legacy_snapshot(self, sessions: Dict, db: Dict):
+        for scope in _AllScopeStr:
+            try:
+                scope_data = db[scope]
+            except KeyError:
+                continue
+            except Exception as e:
+                self.logger.error(
+                    f"Session Manager 读取 Scope::{scope} 数据时出现错误，将跳过：{repr(e)}"
+                )
+                continue
+            if scope == "GLOBAL":
+                for k in scope_data:
+                    try:
+                        sessions[scope][k] = scope_data[k]
+                    except Exception as e:
+                        self.logger.error(
+                            f"Session Manager 读取 Scope::{scope}::{k} 数据时出现错误，将跳过：{repr(e)}"
+                        )
+            else:
+                for _id in scope_data:
+                    if _id not in sessions[scope]:
+                        sessions[scope][_id] = {}
+                    for k in scope_data[_id]:
+                        try:
+                            sessions[scope][_id][k] = scope_data[_id][k]
+                        except Exception as e:
+                            self.logger.error(
+                                f"Session Manager 读取 Scope::{scope}::{_id}::{k} 数据时出现错误，将跳过：{repr(e)}"
+                            )
+
+    def __replay_log(self, sessions: Dict):
+        """
+        按顺序重放与快照同代的追加日志，遇到不完整或校验失败的记录（如写入时进程退出）则截断
+        """
+        _log_path = self.path("log")
+        self.log_size = 0
+        if not os.path.exists(_log_path):
+            return
+        with open(_log_path, "rb") as f_log:
+            head = f_log.read(_LOG_HEADER.size)
+            if len(head) < _LOG_HEADER.size or not head.startswith(_LOG_MAGIC):
+                return  # 空日志或旧格式，下次写入时重建
+            if _LOG_HEADER.unpack(head)[1] != self.generation:
+                return  # 合并快照后未及清空的旧日志，其改动已包含在快照中
+            pos = _LOG_HEADER.size
+            while True:
+                header = f_log.read(_FRAME_HEADER.size)
+                if len(header) < _FRAME_HEADER.size:
+                    break
+                length, crc = _FRAME_HEADER.unpack(header)
+                payload = f_log.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                try:
+                    records = pickle.loads(payload)
+                except Exception:
+                    break
+                apply_records(sessions, records)
+                pos += _FRAME_HEADER.size + length
+            end = f_log.seek(0, os.SEEK_END)
+        if pos < end:
+            self.logger.warning(
+                f"Session Manager 日志 {_log_path} 末尾存在不完整的记录，已截断"
+            )
+            os.truncate(_log_path, pos)
+        self.log_size = pos
+
+    # -*- write -*-
+    @staticmethod
+    def serialize_snapshot(sessions: Dict) -> bytes:
+        parts = []
+        for scope in _AllScopeStr:
+            items = list(sessions[scope].items())
+            for i in range(0, len(items), _FRAME_ITEMS):
+                payload = pickle.dumps((scope, dict(items[i : i + _FRAME_ITEMS])))
+                parts.append(_FRAME_HEADER.pack(len(payload), zlib.crc32(payload)))
+                parts.append(payload)
+        parts.append(_FRAME_HEADER.pack(0, 0))
+        return b"".join(parts)
+
+    def __sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def __sync_dir(self):
+        if not self.fsync:
+            return
+        try:
+            fd = os.open(self.commit_path, os.O_RDONLY)
+        except OSError:  # 如Windows不支持打开文件夹
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def __reset_log(self):
+        with open(self.path("log"), "wb") as f_log:
+            f_log.write(_LOG_HEADER.pack(_LOG_MAGIC, self.generation))
+            self.__sync(f_log)
+        self.log_size = _LOG_HEADER.size
+
+    def apply(self, records: List[Record]):
+        if not self.log_size:
+            self.__reset_log()
+        payload = pickle.dumps(records)
+        with open(self.path("log"), "ab") as f_log:
+            f_log.write(_FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.__sync(f_log)
+        self.log_size += _FRAME_HEADER.size + len(payload)
+
+    def write_snapshot(self, pk_data: bytes):
+        """
+        :param pk_data: serialize_snapshot()的结果
+        """
+        _path = self.path("db")
+        _tmp_path = self.path("db.tmp")
+        generation = self.generation + 1
+        with open(_tmp_path, "wb") as f_db:
+            f_db.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, generation))
+            f_db.write(pk_data)
+            self.__sync(f_db)
+        if self.backups > 0 and os.path.exists(_path):
+            for i in range(self.backups, 1, -1):
+                if os.path.exists(self.path(f"db.{i - 1}")):
+                    os.replace(self.path(f"db.{i - 1}"), self.path(f"db.{i}"))
+            os.replace(_path, self.path("db.1"))
+        os.replace(_tmp_path, _path)
+        self.__sync_dir()
+        self.generation = generation
+        self.snapshot_size = _SNAPSHOT_HEADER.size + len(pk_data)
+        self.__reset_log()
+
+
+class SQLiteSessionStorage(AbstractSessionStorage):
+    """
+    以sqlite保存session，每个session一行，并以(scope, identify, key)为主键，可按需读取
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        load_on_demand: bool = False,
+        cache_ttl: float = 60.0,
+    ):
+        """
+        :param path: sqlite数据库文件路径，默认为运行目录下的session_data/session_<机器人ID>.sqlite3
+        :param load_on_demand: 是否按需读取session，默认False即启动时读取全部数据；按需读取时，读取于调用get()等方法的线程中同步进行，异步模式下会阻塞事件循环
+        :param cache_ttl: 按需读取时，内存中未改动且无需检查超时的session在此秒数内未被使用则释放，之后使用时重新读取最新数据，默认60
+        """
+        self.path = path
+        self.load_on_demand = load_on_demand
+        self.cache_ttl = cache_ttl
+        self.__conn: Optional[sqlite3.Connection] = None
+        self.__lock = Lock()
+
+    def open(self, bot_identify: str, logger: Logger):
+        if self.path is None:
+            commit_path = os.path.join(os.getcwd(), "session_data")
+            FileSessionStorage.check_path(commit_path)
+            self.path = os.path.join(commit_path, f"session_{bot_identify}.sqlite3")
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (scope TEXT NOT NULL, "
+                "identify BLOB NOT NULL, key BLOB NOT NULL, due REAL, data BLOB NOT NULL, "
+                "PRIMARY KEY (scope, identify, key))"
+            )
+            self.__conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_due ON sessions (due) "
+                "WHERE due IS NOT NULL"
+            )
+
+    def close(self):
+        if self.__conn is not None:
+            with self.__lock:
+                self.__conn.close()
+            self.__conn = None
+
+    def apply(self, records: List[Record]):
+        with self.__lock, self.__conn:
+            for record in records:
+                op = record[0]
+                if op == "set":
+                    _, scope, identify, key, payload, due = record
+                    self.__conn.execute(
+                        "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                        (scope, _encode(identify), _encode(key), due, payload),
+                    )
+                elif op == "del":
+                    _, scope, identify, key = record
+                    self.__conn.execute(
+                        "DELETE FROM sessions WHERE scope = ? AND identify = ? AND key = ?",
+                        (scope, _encode(identify), _encode(key)),
+                    )
+                elif record[1] is None:
+                    self.__conn.execute("DELETE FROM sessions")
+                elif record[2] is None:
+                    self.__conn.execute(
+                        "DELETE FROM sessions WHERE scope = ?", (record[1],)
+                    )
+                else:
+                    self.__conn.execute(
+                        "DELETE FROM sessions WHERE scope = ? AND identify = ?",
+                        (record[1], _encode(record[2])),
+                    )
+
+    def load(self, scope: str, identify: Hashable, key: Hashable) -> Optional[bytes]:
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT data FROM sessions WHERE scope = ? AND identify = ? AND key = ?",
+                (scope, _encode(identify), _encode(key)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_all(self) -> Iterable[SessionRow]:
+        with self.__lock:
+            rows = self.__conn.execute(
+                "SELECT scope, identify, key, data FROM sessions"
+            ).fetchall()
+        return [(s, pickle.loads(i), pickle.loads(k), d) for s, i, k, d in rows]
+
+    def scheduled(self) -> Iterable[Tuple[str, Hashable, Hashable, float]]:
+        with self.__lock:
+            rows = self.__conn.execute(
+                "SELECT scope, identify, key, due FROM sessions WHERE due IS NOT NULL"
+            ).fetchall()
+        return [(s, pickle.loads(i), pickle.loads(k), due) for s, i, k, due in rows]
+
+
+class DBMSessionStorage(AbstractSessionStorage):
+    """
+    以标准库dbm（类似shelve）保存session，每个session为一个键，可按需读取
+    """
+
+    __DUE_PREFIX = b"due:"
+    __DATA_PREFIX = b"data:"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        load_on_demand: bool = False,
+        cache_ttl: float = 60.0,
+    ):
+        """
+        :param path: dbm数据库文件路径（不含后缀），默认为运行目录下的session_data/session_<机器人ID>.dbm
+        :param load_on_demand: 是否按需读取session，默认False即启动时读取全部数据；按需读取时，读取于调用get()等方法的线程中同步进行，异步模式下会阻塞事件循环
+        :param cache_ttl: 按需读取时，内存中未改动且无需检查超时的session在此秒数内未被使用则释放，之后使用时重新读取最新数据，默认60
+        """
+        self.path = path
+        self.load_on_demand = load_on_demand
+        self.cache_ttl = cache_ttl
+        self.__db = None
+        self.__lock = Lock()
+
+    def open(self, bot_identify: str, logger: Logger):
+        if self.path is None:
+            commit_path = os.path.join(os.getcwd(), "session_data")
+            FileSessionStorage.check_path(commit_path)
+            self.path = os.path.join(commit_path, f"session_{bot_identify}.dbm")
+        self.__db = dbm.open(self.path, "c")
+
+    def close(self):
+        if self.__db is not None:
+            with self.__lock:
+                self.__db.close()
+            self.__db = None
+
+    def __delete_where(self, match):
+        for db_key in list(self.__db.keys()):
+            if match(pickle.loads(db_key.split(b":", 1)[1])):
+                del self.__db[db_key]
+
+    def apply(self, records: List[Record]):
+        db = self.__db
+        with self.__lock:
+            for record in records:
+                op = record[0]
+                if op == "clear":
+                    scope, identify = record[1], record[2]
+                    self.__delete_where(lambda loc: _covered(scope, identify, loc))
+                    continue
+                loc = _encode(record[1:4])
+                if op == "set":
+                    db[self.__DATA_PREFIX + loc] = record[4]
+                    if record[5] is not None:
+                        db[self.__DUE_PREFIX + loc] = repr(record[5])
+                        continue
+                elif self.__DATA_PREFIX + loc in db:
+                    del db[self.__DATA_PREFIX + loc]
+                if self.__DUE_PREFIX + loc in db:
+                    del db[self.__DUE_PREFIX + loc]
+            if hasattr(db, "sync"):
+                db.sync()
+
+    def load(self, scope: str, identify: Hashable, key: Hashable) -> Optional[bytes]:
+        db_key = self.__DATA_PREFIX + _encode((scope, identify, key))
+        with self.__lock:
+            return self.__db[db_key] if db_key in self.__db else None
+
+    def __iter_prefix(self, prefix: bytes):
+        with self.__lock:
+            items = [
+                (pickle.loads(k[len(prefix) :]), self.__db[k])
+                for k in self.__db.keys()
+                if k.startswith(prefix)
+            ]
+        return items
+
+    def load_all(self) -> Iterable[SessionRow]:
+        return [
+            (*loc, payload) for loc, payload in self.__iter_prefix(self.__DATA_PREFIX)
+        ]
+
+    def scheduled(self) -> Iterable[Tuple[str, Hashable, Hashable, float]]:
+        return [
+            (*loc, float(due)) for loc, due in self.__iter_prefix(self.__DUE_PREFIX)
+        ]
+
+
+class RedisSessionStorage(AbstractSessionStorage):
+    """
+    以Redis（或兼容Redis命令的服务）保存session，可供多个进程共享数据（需设置load_on_demand=True），可按需读取。
+    每个(scope, identify)为一个hash，检查时间保存于一个sorted set
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "qg_botsdk:session:",
+        load_on_demand: bool = False,
+        cache_ttl: float = 60.0,
+    ):
+        """
+        :param client: 同步的Redis客户端实例，如redis.Redis()，需支持hget/hset/hdel/hgetall/delete/scan_iter/zadd/zrem/zrange
+        :param prefix: 键名前缀，默认"qg_botsdk:session:"
+        :param load_on_demand: 是否按需读取session，默认False即启动时读取全部数据；按需读取时，读取于调用get()等方法的线程中同步进行，异步模式下会阻塞事件循环
+        :param cache_ttl: 按需读取时，内存中未改动且无需检查超时的session在此秒数内未被使用则释放，之后使用时重新读取最新数据，默认60
+        """
+        self.client = client
+        self.prefix = prefix
+        self.load_on_demand = load_on_demand
+        self.cache_ttl = cache_ttl
+        self.__base = None
+
+    def open(self, bot_identify: str, logger: Logger):
+        self.__base = f"{self.prefix}{bot_identify}"
+
+    def __hash_name(self, scope: str, identify: Hashable) -> str:
+        return f"{self.__base}:{scope}:{_encode(identify).hex()}"
+
+    @property
+    def __due_name(self) -> str:
+        return f"{self.__base}:due"
+
+    def __clear(self, scope: Optional[str], identify: Hashable):
+        client = self.client
+        if scope is not None and identify is not None:
+            names = [self.__hash_name(scope, identify)]
+        else:
+            pattern = f"{self.__base}:{scope}:*" if scope else f"{self.__base}:*"
+            names = [n for n in client.scan_iter(match=pattern)]
+        for name in names:
+            if isinstance(name, bytes):
+                name = name.decode()
+            if name == self.__due_name:
+                continue
+            client.delete(name)
+        members = [
+            m
+            for m, _ in client.zrange(self.__due_name, 0, -1, withscores=True)
+            if _covered(scope, identify, pickle.loads(m))
+        ]
+        if members:
+            client.zrem(self.__due_name, *members)
+
+    def apply(self, records: List[Record]):
+        client = self.client
+        for record in records:
+            op = record[0]
+            if op == "clear":
+                self.__clear(record[1], record[2])
+                continue
+            scope, identify, key = record[1:4]
+            member = _encode((scope, identify, key))
+            if op == "set":
+                client.hset(self.__hash_name(scope, identify), _encode(key), record[4])
+                if record[5] is not None:
+                    client.zadd(self.__due_name, {member: record[5]})
+                    continue
+            else:
+                client.hdel(self.__hash_name(scope, identify), _encode(key))
+            client.zrem(self.__due_name, member)
+
+    def load(self, scope: str, identify: Hashable, key: Hashable) -> Optional[bytes]:
+        return self.client.hget(self.__hash_name(scope, identify), _encode(key))
+
+    def load_all(self) -> Iterable[SessionRow]:
+        rows = []
+        for name in self.client.scan_iter(match=f"{self.__base}:*"):
+            if isinstance(name, bytes):
+                name = name.decode()
+            if name == self.__due_name:
+                continue
+            scope, identify = name[len(self.__base) + 1 :].split(":", 1)
+            identify = pickle.loads(bytes.fromhex(identify))
+            for key, payload in self.client.hgetall(name).items():
+                rows.append((scope, identify, pickle.loads(key), payload))
+        return rows
+
+    def scheduled(self) -> Iterable[Tuple[str, Hashable, Hashable, float]]:
+        return [
+            (*pickle.loads(m), due)
+            for m, due in self.client.zrange(self.__due_name, 0, -1, withscores=True)
+        ]
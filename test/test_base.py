@@ -494,3 +494,972 @@ class TestBase:
             qg_botsdk.utils.convert_color((255, 254, 256))
         with pytest.raises(TypeError):
             qg_botsdk.utils.convert_color(255)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_command_index():
+        from qg_botsdk._command_index import CommandIndex
+
+        short = qg_botsdk.BotCommandObject(command=["ab"])
+        long = qg_botsdk.BotCommandObject(command=["x", "abc"])
+        slash = qg_botsdk.BotCommandObject(command=["/abc"])
+        regex = qg_botsdk.BotCommandObject(regex=r"a(b)c")
+        index = CommandIndex([short, regex, slash, long])
+        assert index.commands == (slash, long, short, regex)
+        assert list(index.match("/abc", "abc")) == [
+            (slash, ("/abc",)),
+            (long, ("abc",)),
+            (short, ("ab",)),
+            (regex, None),
+        ]
+        assert list(index.match("zzz", "zzz")) == [(regex, None)]
+        assert list(CommandIndex([short]).match("zzz", "zzz")) == []
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_scene_command_indexes():
+        from qg_botsdk._command_index import build_scene_indexes
+
+        guild = qg_botsdk.BotCommandObject(
+            command=["a"], valid_scenes=qg_botsdk.CommandValidScenes.GUILD
+        )
+        group = qg_botsdk.BotCommandObject(
+            command=["a"],
+            valid_scenes=qg_botsdk.CommandValidScenes.GROUP
+            | qg_botsdk.CommandValidScenes.C2C,
+        )
+        indexes = build_scene_indexes([guild, group])
+        assert indexes[qg_botsdk.CommandValidScenes.GUILD].commands == (guild,)
+        assert indexes[qg_botsdk.CommandValidScenes.DM].commands == ()
+        assert indexes[qg_botsdk.CommandValidScenes.GROUP].commands == (group,)
+        assert indexes[qg_botsdk.CommandValidScenes.C2C].commands == (group,)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_lazy_objectize():
+        from qg_botsdk._event import objectize
+        from qg_botsdk._json import loads
+        from qg_botsdk._proto_events_conversion import get_event_class
+
+        raw = {"a": 1, "b": {"c": 2, "d": [{"e": 3}, 4]}, "t": "MESSAGE_CREATE"}
+        obj = objectize(raw)
+        assert "b" not in obj.__dict__
+        assert obj.a == 1 and obj.b.c == 2 and obj.b.d[0].e == 3 and obj.b.d[1] == 4
+        assert obj.b is obj.b
+        assert not hasattr(obj, "x")
+        assert loads(obj.dict) == raw
+        assert objectize({"1": {"a": 1}}) == {"1": {"a": 1}}
+        cls = get_event_class("MESSAGE_CREATE", True)
+        assert cls is get_event_class("MESSAGE_CREATE", True)
+        event = objectize(
+            {"author": {"id": "1"}, "t": "MESSAGE_CREATE"}, "api", True, cls
+        )
+        assert isinstance(event, qg_botsdk.Model.MESSAGE)
+        assert event.author.id == "1" and not hasattr(event, "member")
+        assert cls.author is qg_botsdk.Model.MESSAGE.author
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_mixed_class_memo(bot):
+        from qg_botsdk._event import event_class
+        from qg_botsdk._proto_events_conversion import get_mixed_class
+
+        cls = get_mixed_class(event_class, qg_botsdk.Model.GROUP_EVENTS)
+        count = bot.event_classes_count
+        assert get_mixed_class(event_class, qg_botsdk.Model.GROUP_EVENTS) is cls
+        assert bot.event_classes_count == count
+        assert issubclass(cls, event_class)
+        assert issubclass(cls, qg_botsdk.Model.GROUP_EVENTS)
+
+        # 按事件类型缓存的事件类所用的组合不被淘汰，避免重复创建
+        from qg_botsdk import _proto_events_conversion as conversion
+
+        event_cls = conversion.get_event_class("GROUP_ADD_ROBOT", False)
+        cached = conversion._MIXED_CLASSES.copy()
+        limit = conversion.MIXED_CLASSES_LIMIT
+        conversion.MIXED_CLASSES_LIMIT = 1
+        try:
+            for i in range(3):
+                get_mixed_class(event_class, type(f"Model{i}", (), {}))
+            # 仅保留被引用的组合及最新创建的组合
+            pinned = conversion._PINNED_MIXED_CLASSES
+            assert bot.event_classes_count == len(pinned & set(cached)) + 1
+            assert get_mixed_class(event_class, qg_botsdk.Model.GROUP_EVENTS) is (
+                event_cls
+            )
+        finally:
+            conversion.MIXED_CLASSES_LIMIT = limit
+            conversion._MIXED_CLASSES.clear()
+            conversion._MIXED_CLASSES.update(cached)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_json_codec():
+        from qg_botsdk import _json
+
+        class Custom:
+            def __json__(self):
+                return {"x": 1}
+
+        data = {"op": 0, "d": {"content": "中文", "id": 2**70, "c": Custom()}}
+        assert _json.loads(_json.dumps(data)) == {
+            "op": 0,
+            "d": {"content": "中文", "id": 2**70, "c": {"x": 1}},
+        }
+        assert _json.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+        with pytest.raises(_json.JSONDecodeError):
+            _json.loads("{")
+        if _json.orjson is not None:
+            # orjson无法解析时（如较新版本的orjson遇到超出64位的整数）交由标准库json解析
+            from unittest import mock
+
+            def fail(data):
+                raise _json.orjson.JSONDecodeError("", "", 0)
+
+            with mock.patch.object(_json.orjson, "loads", fail):
+                big = 2**70 + 1
+                assert _json.loads(memoryview(b'{"id": %d}' % big)) == {"id": big}
+                with pytest.raises(_json.JSONDecodeError):
+                    _json.loads("{")
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_dispatcher():
+        async def run(policy):
+            loop = asyncio.get_running_loop()
+            handled, gate = [], asyncio.Event()
+
+            async def handler(data):
+                await gate.wait()
+                handled.append(data["d"]["id"])
+
+            dispatcher = qg_botsdk.Dispatcher(max_size=4, workers=2, policy=policy)
+            dispatcher.start(loop, handler, getLogger())
+            events = [{"op": 0, "d": {"guild_id": "g", "id": i}} for i in range(6)]
+            if policy == qg_botsdk.DispatchPolicy.DROP_OLDEST:
+                for e in events:
+                    await dispatcher.put(e)
+            else:
+                for e in events[:3]:
+                    await dispatcher.put(e)
+                put = loop.create_task(dispatcher.put(events[3]))
+                await asyncio.sleep(0.05)
+                assert not put.done()
+            gate.set()
+            await asyncio.sleep(0.05)
+            metrics = dispatcher.metrics
+            await dispatcher.stop()
+            return handled, metrics
+
+        handled, metrics = asyncio.run(run(qg_botsdk.DispatchPolicy.BLOCK))
+        assert handled == [0, 1, 2, 3] and metrics["dropped"] == 0
+        handled, metrics = asyncio.run(run(qg_botsdk.DispatchPolicy.DROP_OLDEST))
+        assert handled == [4, 5] and metrics["dropped"] == 4
+        assert metrics["processed"] == 2 and metrics["queue_depth"] == 0
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_handler_lanes():
+        from concurrent.futures import Future, ThreadPoolExecutor
+        from time import sleep
+
+        from qg_botsdk._lanes import HandlerLanes
+
+        lanes, done = HandlerLanes(), []
+
+        def handler(key, i):
+            sleep(0.05 if i == 0 else 0.001)
+            done.append((key, i))
+            return i
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [
+                lanes.submit(key, lambda k=key, i=i: pool.submit(handler, k, i), Future)
+                for i in range(3)
+                for key in ("a", "b")
+            ]
+            assert [f.result(timeout=2) for f in futures] == [0, 0, 1, 1, 2, 2]
+        for key in ("a", "b"):
+            assert [i for k, i in done if k == key] == [0, 1, 2]
+        assert len(lanes) == 0
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_rate_limiter():
+        from time import monotonic
+
+        limiter = qg_botsdk.RateLimiter(rate=20, burst=2, routes={"send_msg": None})
+        url = "https://api.sgroup.qq.com/v2/groups/G1/messages"
+        assert limiter.resolve("POST", url) == (
+            "send_group_msg",
+            "/v2/groups/{group_openid}/messages",
+            "G1",
+        )
+        assert limiter.resolve("GET", "https://api.sgroup.qq.com/unknown") is None
+
+        async def run():
+            start = monotonic()
+            for _ in range(3):
+                await limiter.acquire("POST", url)
+            limited = monotonic() - start
+            start = monotonic()
+            await limiter.acquire("POST", url.replace("G1", "G2"))
+            for _ in range(5):
+                await limiter.acquire(
+                    "POST", "https://api.sgroup.qq.com/channels/C1/messages"
+                )
+                await limiter.acquire("GET", "https://api.sgroup.qq.com/unknown")
+            return limited, monotonic() - start
+
+        limited, unlimited = asyncio.run(run())
+        assert 0.04 <= limited < 0.5 and unlimited < 0.04
+        metrics = limiter.metrics
+        assert metrics["acquired"] == 4 and metrics["delayed"] == 1
+        assert metrics["buckets"] == 2 and metrics["max_wait_time"] > 0
+
+    @staticmethod
+    @pytest.mark.timeout(10)
+    def test_retry_policy():
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        from qg_botsdk._api_model import StrPtr
+        from qg_botsdk.http import Session
+
+        calls = {}
+
+        async def handler(request: web.Request):
+            name = request.match_info["name"]
+            calls[name] = calls.get(name, 0) + 1
+            if name == "flaky" and calls[name] < 3:
+                return web.Response(status=503, headers={"Retry-After": "0"})
+            if name == "busy":
+                return web.json_response({"code": 11241}, status=500)
+            if name == "bad":
+                return web.json_response({"code": 12345}, status=400)
+            if name == "later":
+                return web.Response(status=429, headers={"Retry-After": "60"})
+            if name == "down":
+                return web.Response(status=502)
+            return web.json_response({"ok": True})
+
+        async def run():
+            app = web.Application()
+            app.router.add_route("*", "/{name}", handler)
+            server = TestServer(app)
+            await server.start_server()
+            policy = qg_botsdk.RetryPolicy(base_delay=0.01, jitter=False)
+            session = Session(
+                "1",
+                "token",
+                "",
+                StrPtr(""),
+                asyncio.get_running_loop(),
+                policy,
+                False,
+                getLogger(),
+                0,
+                5,
+            )
+            try:
+                results = {}
+                for name in ("flaky", "busy", "bad", "later"):
+                    url = str(server.make_url(f"/{name}"))
+                    resp = await session.request("GET", url)
+                    results[name] = (resp.status, resp.retries)
+                # 非幂等的请求在5xx时不重新发送
+                resp = await session.request("POST", str(server.make_url("/down")))
+                results["post_down"] = (resp.status, resp.retries)
+                # 重试预算耗尽后不再重试
+                session._retry_policy = tight = qg_botsdk.RetryPolicy(
+                    base_delay=0.01, budget_ratio=0, min_retries_per_second=0.1
+                )
+                for _ in range(2):
+                    await session.request("GET", str(server.make_url("/busy")))
+                return results, policy.metrics, tight.metrics
+            finally:
+                await session._close()
+                await server.close()
+
+        results, metrics, tight = asyncio.run(run())
+        assert results == {
+            "flaky": (200, 2),
+            "busy": (500, 2),
+            "bad": (400, 0),
+            "later": (429, 0),
+            "post_down": (502, 0),
+        }
+        assert calls["flaky"] == 3 and calls["bad"] == 1 and calls["later"] == 1
+        assert calls["down"] == 1
+        assert metrics["requests"] == 5 and metrics["retries"] == 4
+        assert metrics["gave_up"] == 2 and metrics["budget_exhausted"] == 0
+        assert tight["retries"] == 1 and tight["budget_exhausted"] == 2
+
+    @staticmethod
+    @pytest.mark.timeout(10)
+    def test_access_token_refresh():
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        from qg_botsdk._api_model import StrPtr
+        from qg_botsdk.http import Session
+
+        state = {"issued": 0, "valid": None}
+
+        async def token(_):
+            await asyncio.sleep(0.05)
+            state["issued"] += 1
+            state["valid"] = f"QQBot T{state['issued']}"
+            return web.json_response(
+                {"access_token": f"T{state['issued']}", "expires_in": "7200"}
+            )
+
+        async def api(request: web.Request):
+            if request.headers.get("Authorization") != state["valid"]:
+                return web.json_response({"code": 11244}, status=401)
+            return web.json_response({})
+
+        async def run():
+            app = web.Application()
+            app.router.add_post("/token", token)
+            app.router.add_get("/api", api)
+            server = TestServer(app)
+            await server.start_server()
+            loop = asyncio.get_running_loop()
+            session = Session(
+                "1", None, "secret", StrPtr(""), loop, True, False, getLogger(), 0, 5
+            )
+            session._access_token_url = str(server.make_url("/token"))
+            url = str(server.make_url("/api"))
+            try:
+                first = await asyncio.gather(
+                    *(session.request("GET", url) for _ in range(50))
+                )
+                issued = state["issued"]
+                renewal = session._access_token_renewal.when() - loop.time()
+                state["valid"] = None  # 服务端提前使access_token失效
+                second = await asyncio.gather(
+                    *(session.request("GET", url) for _ in range(10))
+                )
+                return first, issued, renewal, second
+            finally:
+                await session._close()
+                await server.close()
+
+        first, issued, renewal, second = asyncio.run(run())
+        assert issued == 1 and all(r.status == 200 for r in first)
+        assert 7000 < renewal <= 7140
+        assert state["issued"] == 2
+        assert all(r.status == 200 and r.retries == 1 for r in second)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_connector_factory():
+        from qg_botsdk._api_model import StrPtr
+        from qg_botsdk.connector import default_ssl_context
+        from qg_botsdk.http import Session
+
+        assert default_ssl_context() is default_ssl_context()
+
+        async def run():
+            factory = qg_botsdk.ConnectorFactory(limit_per_host=4, ttl_dns_cache=60)
+            session = Session(
+                "1",
+                "token",
+                "",
+                StrPtr(""),
+                asyncio.get_running_loop(),
+                False,
+                False,
+                getLogger(),
+                0,
+                5,
+                connector_factory=factory,
+            )
+            await session._check_session()
+            connector = await factory.get()
+            assert session._session.connector is connector
+            assert connector.limit_per_host == 4
+            assert factory.ssl_context is default_ssl_context()
+            # 关闭API会话不影响其他共用此连接池的连接，重建会话时继续复用
+            await session._session.close()
+            assert not connector.closed
+            await session._check_session()
+            assert session._session.connector is connector
+            await session._close()
+            assert connector.closed and (await factory.get()) is not connector
+            await factory.close()
+
+        asyncio.run(run())
+
+    @staticmethod
+    @pytest.mark.timeout(10)
+    def test_response_mode():
+        from types import SimpleNamespace
+
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        from qg_botsdk._api_model import StrPtr
+        from qg_botsdk._utils import regular_temp
+        from qg_botsdk.async_api import AsyncAPI
+        from qg_botsdk.http import Session
+
+        members = [{"user": {"id": str(i)}, "nick": f"n{i}"} for i in range(5)]
+
+        async def get_members(request: web.Request):
+            after = int(request.query.get("after", -1))
+            page = [m for m in members if int(m["user"]["id"]) > after][:2]
+            return web.json_response(page)
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/guilds/G/members", get_members)
+            server = TestServer(app)
+            await server.start_server()
+            session = Session(
+                "1",
+                "token",
+                "",
+                StrPtr(""),
+                asyncio.get_running_loop(),
+                False,
+                False,
+                getLogger(),
+                0,
+                5,
+            )
+            api = AsyncAPI(
+                str(server.make_url("")).rstrip("/"),
+                session,
+                getLogger(),
+                None,
+                SimpleNamespace(),
+            )
+            Mode = qg_botsdk.ResponseMode
+            try:
+                url = str(server.make_url("/guilds/G/members"))
+                single = {}
+                for mode in Mode:
+                    single[mode] = await regular_temp(await session.get(url), mode)
+                paged = {mode: await api.get_guild_members("G", mode) for mode in Mode}
+                return single, paged
+            finally:
+                await session._close()
+                await server.close()
+
+        single, paged = asyncio.run(run())
+        Mode = qg_botsdk.ResponseMode
+        assert all(ret.result for ret in single.values())
+        assert [m.nick for m in single[Mode.OBJECT].data] == ["n0", "n1"]
+        assert single[Mode.RAW].data.startswith(b"[")
+        assert single[Mode.LAZY].data[1].user.id == "1"
+        assert [m.nick for m in single[Mode.ITER].data] == ["n0", "n1"]
+
+        assert paged[Mode.OBJECT].result == [True] * 4
+        assert [m.user.id for m in paged[Mode.OBJECT].data] == list("01234")
+        assert len(paged[Mode.RAW].data) == 4 and paged[Mode.RAW].data[-1] == b"[]"
+        assert len(paged[Mode.LAZY].data) == 5
+        assert paged[Mode.LAZY].data[-1].nick == "n4"
+        assert [m.nick for m in paged[Mode.ITER].data][:2] == ["n0", "n1"]
+
+    @staticmethod
+    @pytest.mark.timeout(10)
+    def test_paginated_iterators():
+        from threading import Thread
+        from types import SimpleNamespace
+
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        from qg_botsdk._api_model import StrPtr
+        from qg_botsdk.api import API
+        from qg_botsdk.async_api import AsyncAPI
+        from qg_botsdk.http import Session
+
+        members = [{"user": {"id": str(i)}} for i in range(10)]
+        requested = []
+
+        async def get_members(request: web.Request):
+            if request.match_info["guild_id"] == "BAD":
+                return web.json_response({"code": 50001, "message": "x"}, status=403)
+            after = int(request.query.get("after", -1))
+            requested.append(after)
+            return web.json_response(
+                [m for m in members if int(m["user"]["id"]) > after][:3]
+            )
+
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, daemon=True).start()
+
+        async def setup():
+            app = web.Application()
+            app.router.add_get("/guilds/{guild_id}/members", get_members)
+            server = TestServer(app)
+            await server.start_server()
+            session = Session(
+                "1", "token", "", StrPtr(""), loop, False, False, getLogger(), 0, 5
+            )
+            api = AsyncAPI(
+                str(server.make_url("")).rstrip("/"),
+                session,
+                getLogger(),
+                None,
+                SimpleNamespace(),
+            )
+            return server, session, api
+
+        def run(coro):
+            return asyncio.run_coroutine_threadsafe(coro, loop).result(5)
+
+        server, session, api = run(setup())
+        try:
+
+            async def consume(prefetch):
+                ids = []
+                async for member in api.iter_guild_members("G", prefetch):
+                    ids.append(member.user.id)
+                    await asyncio.sleep(0.02)  # 模拟处理每项的耗时
+                    if len(ids) == 4:
+                        break
+                return ids
+
+            assert run(consume(False)) == list("0123") and requested == [-1, 2]
+            requested.clear()
+            assert run(consume(True)) == list("0123")
+            # 预取：迭代第二页时已请求第三页
+            assert requested == [-1, 2, 5]
+
+            requested.clear()
+            sync_api = API(api, loop, 5, SimpleNamespace())
+            ids = [m.user.id for m in sync_api.iter_guild_members("G")]
+            assert ids == [str(i) for i in range(10)] and requested == [-1, 2, 5, 8, 9]
+            for i, _ in enumerate(sync_api.iter_guild_members("G", prefetch=False)):
+                if i == 1:
+                    break
+            with pytest.raises(qg_botsdk.ApiError) as e:
+                list(sync_api.iter_guild_members("BAD"))
+            assert e.value.http_code == 403 and e.value.data["code"] == 50001
+        finally:
+            run(session._close())
+            run(server.close())
+            loop.call_soon_threadsafe(loop.stop)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_collect_pages_closes_pages():
+        from qg_botsdk._pager import Pager, collect_pages
+
+        class Resp:
+            headers = {}
+            status = 200
+
+            async def read(self):
+                return b'[{"id": 1}]'
+
+        async def get(url):
+            if url == "second":
+                await asyncio.sleep(5)
+            return Resp()
+
+        def items_of(page):
+            raise KeyError("id")
+
+        async def run():
+            pager = Pager("first", lambda page: "second", items_of)
+            result = await collect_pages(
+                get, pager, qg_botsdk.ResponseMode.OBJECT, getLogger()
+            )
+            await asyncio.sleep(0)
+            pending = asyncio.all_tasks() - {asyncio.current_task()}
+            return result, pending
+
+        # 解析失败时立即关闭分页生成器，取消预先请求的下一页
+        result, pending = asyncio.run(run())
+        assert result.result == [False]
+        assert not pending
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_sync_iterate_timeout():
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from threading import Event, Thread
+        from types import SimpleNamespace
+
+        from qg_botsdk.api import API
+
+        closed = Event()
+
+        async def pages(delay):
+            try:
+                yield 1
+                await asyncio.sleep(delay)
+                yield 2
+            finally:
+                closed.set()
+
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, daemon=True).start()
+        try:
+            sync_api = API(None, loop, 0.2, SimpleNamespace())
+            # 超时时取消仍在运行的请求并关闭异步迭代器，抛出的仍为超时错误
+            it = sync_api._API__iterate(pages(5))
+            assert next(it) == 1
+            with pytest.raises(FutureTimeoutError):
+                next(it)
+            assert closed.wait(1)
+            # 于事件循环所在线程中关闭时不阻塞等待
+            closed.clear()
+            it = sync_api._API__iterate(pages(0))
+            assert next(it) == 1
+            done = Event()
+            loop.call_soon_threadsafe(lambda: it.close() or done.set())
+            assert done.wait(1) and closed.wait(1)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_handler_context():
+        from concurrent.futures import ThreadPoolExecutor
+        from types import SimpleNamespace
+
+        from qg_botsdk._statics import TraceNames
+        from qg_botsdk._utils import TraceCallerData, handler_context
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        event = SimpleNamespace(t="MESSAGE_CREATE")
+        bot = SimpleNamespace(api="api", logger=getLogger(), session_manager=None)
+        trace_api = TraceCallerData(TraceNames, ("self", "api"))
+        trace_event = TraceCallerData(TraceNames, ("args",))
+
+        def handler(data):
+            return trace_api.get_target_data(), trace_event[0] is data
+
+        async def async_handler(data):
+            # 处理函数中创建的任务亦可取得上下文
+            return await asyncio.ensure_future(asyncio.sleep(0, handler(data)))
+
+        assert trace_api.get_target_data() is None
+        with ThreadPoolExecutor(1) as pool:
+            for _ in range(2):
+                result = pool.submit(BotProto.start_callback_task, bot, handler, event)
+                assert result.result() == ("api", True)
+            # 线程池的线程在任务结束后不应残留上下文
+            assert pool.submit(handler_context.get).result() is None
+        assert asyncio.run(
+            BotProto.async_start_callback_task(bot, async_handler, event)
+        ) == ("api", True)
+        assert handler_context.get() is None
+
+    @staticmethod
+    @pytest.mark.timeout(10)
+    def test_custom_short_circuit():
+        from concurrent.futures import ThreadPoolExecutor
+        from time import perf_counter
+        from time import sleep as time_sleep
+        from types import SimpleNamespace
+
+        from qg_botsdk.model import BotCommandObject
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        def command(func, timeout=None):
+            return BotCommandObject(
+                None,
+                None,
+                func,
+                False,
+                False,
+                False,
+                True,
+                False,
+                None,
+                short_circuit_timeout=timeout,
+            )
+
+        async def check(is_async, func, timeout=None):
+            bot = SimpleNamespace(
+                is_async=is_async,
+                loop=asyncio.get_running_loop(),
+                threads=pool,
+                logger=getLogger(),
+            )
+
+            async def distribute(function, objectized_data):
+                if is_async:
+                    return bot.loop.create_task(function(objectized_data))
+                return pool.submit(function, objectized_data)
+
+            bot.distribute = distribute
+            start = perf_counter()
+            r = await BotProto.check_command(bot, None, "", command(func, timeout))
+            return r, perf_counter() - start
+
+        async def async_quick(data):
+            return True
+
+        async def async_slow(data):
+            await asyncio.sleep(0.3)
+            finished.append(data)
+            return True
+
+        def sync_quick(data):
+            return True
+
+        async def main():
+            # 回调函数返回后立即得出结果，不再以0.1秒为单位轮询
+            for is_async, func in ((True, async_quick), (False, sync_quick)):
+                r, elapsed = await check(is_async, func)
+                assert r is True and elapsed < 0.05
+            # 超时则不短路，而回调函数仍会继续运行至结束
+            r, elapsed = await check(True, async_slow, 0.05)
+            assert r is False and elapsed < 0.2
+            await asyncio.sleep(0.4)
+            assert finished == [None]
+            r, _ = await check(False, lambda data: time_sleep(0.3) or True, 0.05)
+            assert r is False
+
+        finished = []
+        with ThreadPoolExecutor(2) as pool:
+            asyncio.run(main())
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_custom_short_circuit_wait_for():
+        from types import SimpleNamespace
+
+        from qg_botsdk._session import SessionManager
+        from qg_botsdk._utils import objectize
+        from qg_botsdk.logger import Logger
+        from qg_botsdk.model import BotCommandObject, Scope
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        def event(content):
+            return {
+                "op": 0,
+                "t": "MESSAGE_CREATE",
+                "d": {
+                    "author": {"id": "111"},
+                    "channel_id": "222",
+                    "guild_id": "333",
+                    "content": content,
+                    "t": "MESSAGE_CREATE",
+                },
+            }
+
+        async def waiting(data):
+            # 自定义短路指令的回调函数中wait_for同一用户的下一条消息
+            future = bot.loop.create_future()
+            wait_command = BotCommandObject(
+                None, None, None, False, False, False, False, False, None
+            )
+            session.register_wait_for(data, Scope.USER, wait_command, future)
+            replies.append((await asyncio.wait_for(future, 2)).content)
+            return True
+
+        async def handler(data):
+            objectized_data = objectize(data["d"])
+            callbacks = session.wait_for_message_checker(objectized_data)
+            if callbacks:
+                for x in callbacks:
+                    x.callback(objectized_data)
+                return
+            command = BotCommandObject(
+                None, None, waiting, False, False, False, True, False, None
+            )
+            results.append(
+                await BotProto.check_command(bot, objectized_data, "", command)
+            )
+
+        async def main():
+            bot.loop = asyncio.get_running_loop()
+
+            async def distribute(function, objectized_data):
+                return bot.loop.create_task(function(objectized_data))
+
+            bot.distribute = distribute
+            # 仅一个消费者，两条消息必然进入同一个分发队列
+            dispatcher = qg_botsdk.Dispatcher(workers=1)
+            dispatcher.start(bot.loop, handler, getLogger())
+            await dispatcher.put(event("first"))
+            await dispatcher.put(event("second"))
+            for _ in range(100):
+                if results:
+                    break
+                await asyncio.sleep(0.01)
+            assert results == [True] and replies == ["second"]
+            assert dispatcher.metrics["released"] == 1
+            assert dispatcher.metrics["processed"] == 2
+            await dispatcher.stop()
+            assert not dispatcher.running
+
+        bot = SimpleNamespace(is_async=True, logger=getLogger())
+        session = SessionManager(Logger(config["bot_id"]))
+        results, replies = [], []
+        asyncio.run(main())
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_event_routes():
+        from types import SimpleNamespace
+
+        from qg_botsdk._proto_events_conversion import EVENT_ROUTES
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        # 单独的BOT实例，绑定的事件不影响其他测试
+        bot = qg_botsdk.BOT(bot_id=config["bot_id"], bot_token=config["bot_token"])
+        intents = bot._intents
+        bot.bind_event("NEW_EVENT_CREATE", _callback, intents=1 << 3)
+        assert bot._intents == intents | 1 << 3
+        route = bot._event_routes["NEW_EVENT_CREATE"]
+        assert bot._func_registers[route.handler] == _callback
+        bot.bind_event(["NEW_EVENT_A", "NEW_EVENT_B"])(_callback)  # test decorator
+        assert {"NEW_EVENT_A", "NEW_EVENT_B"} <= set(bot._event_routes)
+
+        distributed, commands = [], []
+        short_circuit = [False]
+
+        async def distribute(function, data):
+            distributed.append((function, data["d"]))
+
+        async def distribute_commands(scene, data, treated_msg, command_offset):
+            commands.append((scene, treated_msg, command_offset))
+            return short_circuit[0]
+
+        proto = SimpleNamespace(
+            event_routes={**EVENT_ROUTES, **bot._event_routes},
+            func_registers={
+                "on_msg": "on_msg",
+                "on_delete": "on_delete",
+                "on_forum": "on_forum",
+                route.handler: _callback,
+            },
+            sandbox=None,
+            event_filter=None,
+            msg_treat=True,
+            at="<@!1>",
+            logger=getLogger(),
+            distribute=distribute,
+            distribute_commands=distribute_commands,
+        )
+
+        def process(t, d):
+            distributed.clear()
+            commands.clear()
+            data = {"t": t, "id": "e", "d": d}
+            asyncio.run(BotProto.data_process(proto, data))
+            assert set(data) == {"t", "id", "d"}
+            return [f for f, _ in distributed]
+
+        assert process("AT_MESSAGE_CREATE", {"content": "<@!1> /hi "}) == ["on_msg"]
+        assert commands == [(qg_botsdk.CommandValidScenes.GUILD, "hi", 1)]
+        short_circuit[0] = True
+        assert process("MESSAGE_CREATE", {"content": "hi"}) == []
+        # 用户自行撤回的消息被过滤
+        user = {"id": "u"}
+        d = {"message": {"author": user}, "op_user": user}
+        assert process("MESSAGE_DELETE", d) == []
+        assert process("MESSAGE_DELETE", {"message": {"author": user}}) == ["on_delete"]
+        assert process(
+            "FORUM_THREAD_CREATE", {"thread_info": {"title": '{"a": 1}'}}
+        ) == ["on_forum"]
+        assert distributed[0][1]["thread_info"]["title"] == {"a": 1}
+        assert process("NEW_EVENT_CREATE", {}) == [_callback]
+        assert process("UNKNOWN_EVENT", {}) == []
+        # 沙箱检查不通过时不分发
+        proto.sandbox = SimpleNamespace(checker=lambda grp, data: False)
+        assert process("MESSAGE_DELETE", {"message": {"author": user}}) == []
+        assert process("NEW_EVENT_CREATE", {}) == [_callback]
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_treat_msg():
+        from types import SimpleNamespace
+
+        from qg_botsdk._utils import treat_msg
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        at = "<@!1>"
+        treated = treat_msg("<@!1> /签到 a&amp;b&lt;c&gt;\xa0d", at)
+        assert treated == ("签到 a&b<c> d", 1)
+        assert treat_msg("<@!1>", at) == ("", 0)
+        assert treat_msg("", at) == ("", 0)
+        assert treat_msg("<@!1>  / time", at) == ("time", 1)
+        # 只去除开头的艾特，且转义字符只还原一次
+        assert treat_msg("hi <@!1>", at) == ("hi <@!1>", 0)
+        assert treat_msg("&amp;lt;", at) == ("&lt;", 0)
+
+        proto = SimpleNamespace(msg_treat=True)
+        data = type("Event", (), {})()
+
+        def treat(treated_msg, command, command_offset=0):
+            return BotProto.treat_command(
+                proto,
+                data,
+                treated_msg,
+                command=command,
+                command_offset=command_offset,
+            ).treated_msg
+
+        assert treat("签到 a", "签到") == "a"
+        assert treat("time 8", "/time", 1) == "8"
+        assert treat("今天 签到 a", "签到") == "a"
+
+    @staticmethod
+    @pytest.mark.timeout(5)
+    def test_event_filter():
+        from types import SimpleNamespace
+
+        from qg_botsdk import EventFilter, FilterRule
+        from qg_botsdk.qg_bot_proto import BotProto
+
+        with pytest.raises(TypeError):
+            EventFilter(object())
+        event_filter = EventFilter(
+            FilterRule(users=["admin"], allow=True),
+            FilterRule(users=["blocked"]),
+            FilterRule(events=["AT_MESSAGE_CREATE"], content_prefix=["!", "！"]),
+            FilterRule(content_regex=r"^\s*<@!\d+>\s*广告"),
+            FilterRule(events=["GROUP_AT_MESSAGE_CREATE"], rate=1, burst=2),
+            FilterRule(events=["GUILD_CREATE"], guilds=["g1"]),
+        )
+
+        def msg(user, content="hi"):
+            return {"author": {"id": user}, "content": content}
+
+        def group_msg(user):
+            return {"author": {"member_openid": user}, "group_openid": "g"}
+
+        assert event_filter.check("AT_MESSAGE_CREATE", msg("user"))
+        assert event_filter.check("AT_MESSAGE_CREATE", msg("admin", "!广告"))
+        assert not event_filter.check("AT_MESSAGE_CREATE", msg("blocked"))
+        assert not event_filter.check("AT_MESSAGE_CREATE", msg("user", "  ！hi"))
+        assert event_filter.check("DIRECT_MESSAGE_CREATE", msg("user", "!hi"))
+        assert not event_filter.check("DIRECT_MESSAGE_CREATE", msg("u", "<@!1> 广告"))
+        # 删除事件的用户ID位于message.author中
+        delete = {"message": {"author": {"id": "blocked"}}, "op_user": {"id": "x"}}
+        assert not event_filter.check("MESSAGE_DELETE", delete)
+        assert not event_filter.check("GUILD_CREATE", {"id": "g1"})
+        assert event_filter.check("GUILD_CREATE", {"id": "g2"})
+        # 每个用户分别限速，超出突发数后丢弃
+        assert [
+            event_filter.check("GROUP_AT_MESSAGE_CREATE", group_msg("a"))
+            for _ in range(3)
+        ] == [True, True, False]
+        assert event_filter.check("GROUP_AT_MESSAGE_CREATE", group_msg("b"))
+        assert event_filter.metrics == {"checked": 13, "dropped": 6, "compiled": 5}
+        assert EventFilter(FilterRule(allow=True), default=False).check("X", {})
+        assert not EventFilter(default=False).check("X", {})
+
+        # 被过滤的事件不会进入路由及指令匹配
+        routed = []
+        proto = SimpleNamespace(
+            event_filter=event_filter,
+            event_routes={},
+            logger=SimpleNamespace(warning=routed.append),
+        )
+        for user in ("blocked", "user"):
+            asyncio.run(
+                BotProto.data_process(proto, {"t": "AT_MESSAGE_CREATE", "d": msg(user)})
+            )
+        assert routed == ["unknown event type: [AT_MESSAGE_CREATE]"]
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import fnmatch
 import os
 from asyncio import sleep
 
@@ -9,6 +10,14 @@ from qg_botsdk._session import SessionManager
 from qg_botsdk._utils import objectize
 from qg_botsdk.logger import Logger
 from qg_botsdk.model import Scope, SessionStatus
+from qg_botsdk.session_storage import (
+    _LOG_HEADER,
+    DBMSessionStorage,
+    FileSessionStorage,
+    MemorySessionStorage,
+    RedisSessionStorage,
+    SQLiteSessionStorage,
+)
 
 from ._base_context import bot_async, config
 
@@ -30,6 +39,48 @@ MockObj = objectize(
 )
 
 
+class LocalRedis:
+    """
+    本地的Redis替身，仅实现RedisSessionStorage使用的命令
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(key)
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes.get(name, {}).pop(key, None)
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def delete(self, *names):
+        for name in names:
+            self.hashes.pop(name, None)
+            self.zsets.pop(name, None)
+
+    def scan_iter(self, match):
+        return [n.encode() for n in fnmatch.filter(list(self.hashes), match)]
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.zsets.get(name, {}).pop(member, None)
+
+    def zrange(self, name, start, end, withscores=False):
+        items = sorted(self.zsets.get(name, {}).items(), key=lambda x: x[1])
+        return items if withscores else [m for m, _ in items]
+
+
 @pytest.fixture()
 def session(bot_async):
     _session = SessionManager(Logger(config["bot_id"]))
@@ -85,9 +136,9 @@ class TestSession:
     @pytest.mark.timeout(10)
     def test_internal(self, session):
         with pytest.raises(ValueError):
-            session._SessionManager__check_path("test.db")
+            FileSessionStorage.check_path("test.db")
         with pytest.raises(ValueError):
-            session._SessionManager__check_path("__init__.py")
+            FileSessionStorage.check_path("__init__.py")
         assert session._SessionManager__valid_scope(Scope.USER) == "USER"
         assert session._SessionManager__valid_scope(Scope.USER.value) == "USER"
         with pytest.raises(ValueError):
@@ -187,3 +238,375 @@ class TestSession:
         session.set_commit_path(new_path)
         session.commit_data()
         assert os.path.exists(os.path.join(new_path, f"session_{config['bot_id']}.db"))
+
+    @pytest.mark.timeout(10)
+    def test_wait_for_future(self, session):
+        from concurrent.futures import Future
+
+        from qg_botsdk._exception import WaitError
+        from qg_botsdk.model import BotCommandObject
+
+        command = BotCommandObject(command=["yes"])
+        future = Future()
+        scope_key = session.register_wait_for(MockObj, Scope.USER, command, future)
+        assert scope_key.USER == "111" and scope_key.GUILD is None
+        replaced, future = future, Future()
+        session.register_wait_for(MockObj, Scope.USER, command, future)
+        with pytest.raises(WaitError):
+            replaced.result(0)
+        callbacks = session.wait_for_message_checker(MockObj)
+        assert [x.command for x in callbacks] == [command]
+        callbacks[0].callback(MockObj)
+        assert future.result(0) is MockObj
+        assert session.wait_for_message_checker(MockObj) == []
+
+    @pytest.mark.timeout(10)
+    def test_wait_for_index(self, session):
+        from concurrent.futures import Future
+
+        from qg_botsdk.model import BotCommandObject
+
+        other = objectize(
+            {
+                "author": {"id": "999"},
+                "channel_id": "222",
+                "guild_id": "333",
+                "t": "MESSAGE_CREATE",
+            }
+        )
+        user = BotCommandObject(command=["a"])
+        user_channel = BotCommandObject(command=["b"])
+        global_ = BotCommandObject(command=["c"])
+        session.register_wait_for(MockObj, Scope.USER, user, Future())
+        session.register_wait_for(
+            MockObj, (Scope.USER, Scope.CHANNEL), user_channel, Future()
+        )
+        session.register_wait_for(MockObj, Scope.GLOBAL, global_, Future())
+        checked = session.wait_for_message_checker(MockObj)
+        assert [x.command for x in checked] == [user, user_channel, global_]
+        assert [x.command for x in session.wait_for_message_checker(other)] == [global_]
+        for x in checked:
+            x.callback(MockObj)
+        assert session.wait_for_message_checker(MockObj) == []
+        assert not session._SessionManager__wait_for_index["USER"]
+
+        # 同步模式下于其他线程注册及删除，与查找同时进行
+        import threading
+
+        stop = threading.Event()
+        commands = [BotCommandObject(command=[str(i)]) for i in range(50)]
+
+        def churn():
+            while not stop.is_set():
+                for command in commands:
+                    key = session.register_wait_for(
+                        other, Scope.CHANNEL, command, Future()
+                    )
+                for command in commands:
+                    session.del_wait_for(key, command)
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+        try:
+            for _ in range(2000):
+                for x in session.wait_for_message_checker(other):
+                    assert x.command in commands
+        finally:
+            stop.set()
+            thread.join()
+        assert not session._SessionManager__wait_for_index["CHANNEL"]
+
+    @pytest.mark.timeout(10)
+    def test_expiry_index(self, bot_async, session):
+        session.remove()
+        scheduled = session._SessionManager__expiry_scheduled
+        session.new(MockObj, Scope.USER, "no_timeout", data={})
+        assert not scheduled
+        session.new(MockObj, Scope.GLOBAL, "test", data={}, timeout=0.2)
+        assert list(scheduled) == [("GLOBAL", None, "test")]
+        bot_async.loop.run_until_complete(sleep(0.1))
+        session.update(MockObj, Scope.GLOBAL, "test", data={"a": 1})
+        bot_async.loop.run_until_complete(sleep(0.15))
+        assert session.get_status(MockObj, Scope.GLOBAL, "test") == SessionStatus.ACTIVE
+        bot_async.loop.run_until_complete(sleep(0.3))
+        assert "test" not in session.get_all()[Scope.GLOBAL.value]
+        assert "no_timeout" in session.get_all()[Scope.USER.value]["111"]
+        assert not scheduled
+
+    @pytest.mark.timeout(10)
+    def test_incremental_commit(self, bot_async, tmp_path):
+        path = str(tmp_path / "incremental")
+        session = SessionManager(Logger(config["bot_id"]), commit_path=path)
+        session.start(bot_async.loop)
+        db_path = os.path.join(path, f"session_{config['bot_id']}.db")
+        log_path = os.path.join(path, f"session_{config['bot_id']}.log")
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        session.new(MockObj, Scope.GLOBAL, "b", data={"v": 2})
+        session.update(MockObj, Scope.USER, "a", data={"v": 3})
+        bot_async.loop.run_until_complete(sleep(0.6))
+        assert not os.path.exists(db_path)
+        assert os.path.getsize(log_path) > 0
+        session.remove(Scope.GLOBAL)
+        session.new(MockObj, Scope.GLOBAL, "c", data={})
+        bot_async.loop.run_until_complete(sleep(0.6))
+        with open(log_path, "ab") as f:
+            f.write(b"\x00\x00\x10\x00torn")  # 模拟写入中断的末尾记录
+        restored = SessionManager(Logger(config["bot_id"]), commit_path=path)
+        assert repr(restored.get_all()) == repr(session.get_all())
+        assert restored.get(MockObj, Scope.USER, "a").data == {"v": 3}
+        assert "b" not in restored.get_all()["GLOBAL"]
+        storage = session._SessionManager__storage
+        storage.compact_size = 0
+        storage.snapshot_size = 0
+        session.new(MockObj, Scope.USER, "d", data={})
+        bot_async.loop.run_until_complete(sleep(0.6))
+        assert os.path.exists(db_path)
+        assert os.path.getsize(log_path) == _LOG_HEADER.size
+        restored = SessionManager(Logger(config["bot_id"]), commit_path=path)
+        assert repr(restored.get_all()) == repr(session.get_all())
+
+    @pytest.mark.timeout(10)
+    def test_storage_backends(self, bot_async, tmp_path):
+        redis = LocalRedis()
+        factories = {
+            "sqlite": lambda: SQLiteSessionStorage(
+                str(tmp_path / "s.sqlite3"), load_on_demand=True
+            ),
+            "dbm": lambda: DBMSessionStorage(
+                str(tmp_path / "s.dbm"), load_on_demand=True
+            ),
+            "redis": lambda: RedisSessionStorage(redis, load_on_demand=True),
+        }
+        for name, factory in factories.items():
+            session = SessionManager(Logger(config["bot_id"]), storage=factory())
+            session.start(bot_async.loop)
+            session.new(MockObj, Scope.USER, "a", data={"v": 1})
+            session.new(MockObj, Scope.USER, "gone", data={})
+            session.new(MockObj, Scope.GLOBAL, "t", data={}, timeout=60)
+            session.new(MockObj, Scope.CHANNEL, "c", data={})
+            bot_async.loop.run_until_complete(sleep(0.6))
+            session.update(MockObj, Scope.USER, "a", data={"v": 2})
+            session.remove(Scope.USER, "111", "gone")
+            session.remove(Scope.CHANNEL)
+            # 未写入的改动同样反映于get_all()，删除后不会从存储后端重新读取
+            assert session.get(MockObj, Scope.USER, "gone") is None
+            assert session.get_all()["CHANNEL"] == {}
+            bot_async.loop.run_until_complete(sleep(0.6))
+
+            restored = SessionManager(Logger(config["bot_id"]), storage=factory())
+            # 按需读取：启动时只建立到期索引，不读取session数据
+            assert restored._SessionManager__sessions["USER"] == {}, name
+            assert list(restored._SessionManager__expiry_scheduled) == [
+                ("GLOBAL", None, "t")
+            ], name
+            assert repr(restored.get_all()) == repr(session.get_all()), name
+            assert restored.get(MockObj, Scope.USER, "a").data == {"v": 2}, name
+            assert restored.get(MockObj, Scope.USER, "gone") is None, name
+            # 默认在启动时读取全部数据，之后不再从存储后端读取
+            preloaded = factory()
+            preloaded.load_on_demand = False
+            preloaded = SessionManager(Logger(config["bot_id"]), storage=preloaded)
+            assert preloaded._SessionManager__sessions["USER"]["111"]["a"].data == {
+                "v": 2
+            }, name
+            assert repr(preloaded.get_all()) == repr(session.get_all()), name
+            restored.remove()
+            restored.commit_data()
+            assert restored.get_all()["USER"] == {}, name
+
+        session = SessionManager(
+            Logger(config["bot_id"]), storage=MemorySessionStorage()
+        )
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        session.commit_data()
+        assert session.get(MockObj, Scope.USER, "a").data == {"v": 1}
+        # 不保存数据的后端不记录改动，也不进行任何写入或序列化
+        assert not session._SessionManager__dirty
+        assert session.commit_metrics["commits"] == 0
+        with pytest.raises(ValueError):
+            session.set_commit_path(str(tmp_path))
+
+    @pytest.mark.timeout(10)
+    def test_atomic_snapshot(self, tmp_path):
+        import pickle
+        import shutil
+
+        path = str(tmp_path / "atomic")
+        storage = FileSessionStorage(path, backups=2)
+        session = SessionManager(Logger(config["bot_id"]), storage=storage)
+        db_path = storage.path("db")
+        session.new(MockObj, Scope.USER, "u", data={"v": 1})
+        session.new(MockObj, Scope.GLOBAL, "g", data={"v": 2})
+        session.commit_data()
+        session.update(MockObj, Scope.USER, "u", data={"v": 3})
+        session.commit_data()
+        session.commit_data()
+        assert os.path.exists(storage.path("db.1"))
+        assert os.path.exists(storage.path("db.2"))
+        assert not os.path.exists(storage.path("db.tmp"))
+
+        def restore():
+            return SessionManager(
+                Logger(config["bot_id"]),
+                is_auto_commit=False,
+                storage=FileSessionStorage(path, backups=2),
+            ).get_all()
+
+        # 合并快照前的旧日志不会覆盖较新的快照
+        storage.apply([("set", "USER", "111", "u", pickle.dumps(None), None)])
+        stale_log = str(tmp_path / "stale.log")
+        shutil.copy(storage.path("log"), stale_log)
+        session.commit_data()
+        shutil.copy(stale_log, storage.path("log"))
+        assert restore()["USER"]["111"]["u"].data == {"v": 3}
+        os.remove(storage.path("log"))
+
+        # 损坏的分段被跳过，其余scope仍可读取
+        with open(db_path, "rb") as f:
+            raw = bytearray(f.read())
+        raw[raw.index(b"USER") + 8] ^= 0xFF
+        with open(db_path, "wb") as f:
+            f.write(raw)
+        restored = restore()
+        assert restored["USER"] == {}
+        assert restored["GLOBAL"]["g"].data == {"v": 2}
+
+        # 无法读取的快照回退至旧快照
+        with open(db_path, "wb") as f:
+            f.write(b"garbage")
+        assert restore()["USER"]["111"]["u"].data == {"v": 3}
+
+        # 旧版的单个pickle快照
+        with open(db_path, "wb") as f:
+            f.write(pickle.dumps(session.get_all()))
+        assert restore()["GLOBAL"]["g"].data == {"v": 2}
+
+    @pytest.mark.timeout(10)
+    def test_off_loop_snapshot(self, bot_async, tmp_path):
+        import time
+
+        storage = FileSessionStorage(str(tmp_path / "cow"), compact_size=0)
+        session = SessionManager(Logger(config["bot_id"]), storage=storage)
+        serialize_snapshot = storage.serialize_snapshot
+        write_snapshot = storage.write_snapshot
+        frozen = []
+
+        def record_serialize_snapshot(sessions):
+            frozen.append(sessions["USER"]["111"]["a"])
+            return serialize_snapshot(sessions)
+
+        def slow_write_snapshot(pk_data):
+            time.sleep(0.8)
+            write_snapshot(pk_data)
+
+        storage.serialize_snapshot = record_serialize_snapshot
+        storage.write_snapshot = slow_write_snapshot
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        session.set_commit_path(str(tmp_path / "cow"))  # 下次写入为完整快照
+        session.start(bot_async.loop)
+        bot_async.loop.run_until_complete(sleep(0.6))
+        assert not session._SessionManager__commit_task.done()
+        session.end(MockObj, Scope.USER, "a", inactive_gc_timeout=None)
+        # 写入中的快照为session的副本，不会被修改
+        assert frozen[0].status == SessionStatus.ACTIVE
+        assert session.get_status(MockObj, Scope.USER, "a") == SessionStatus.INACTIVE
+        bot_async.loop.run_until_complete(sleep(0.6))
+        assert session.commit_metrics["coalesced"] >= 1
+        bot_async.loop.run_until_complete(sleep(1.5))
+        metrics = session.commit_metrics
+        assert metrics["commits"] == 2  # 快照及合并后的一次日志写入
+        assert metrics["snapshots"] == 1
+        assert metrics["max_duration"] >= 0.8
+        restored = SessionManager(
+            Logger(config["bot_id"]),
+            is_auto_commit=False,
+            storage=FileSessionStorage(str(tmp_path / "cow")),
+        )
+        assert restored.get_status(MockObj, Scope.USER, "a") == SessionStatus.INACTIVE
+
+    @pytest.mark.timeout(10)
+    def test_stale_records_after_snapshot(self, tmp_path):
+        storage = FileSessionStorage(str(tmp_path / "generation"))
+        session = SessionManager(Logger(config["bot_id"]), storage=storage)
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        session.commit_data()
+        generation = session._SessionManager__generation
+        session.update(MockObj, Scope.USER, "a", data={"v": 2})
+        records = session._SessionManager__take_dirty()
+        assert records
+        session.update(MockObj, Scope.USER, "a", data={"v": 3})
+        # 记录暂存session的副本，于写入时才序列化
+        assert records[0][4].data == {"v": 2}
+        session.commit_data()
+        # 快照写入前已取出、写入后才获得io_lock的记录不会写入新快照的日志
+        session._SessionManager__write_records(records, generation)
+        restored = SessionManager(
+            Logger(config["bot_id"]),
+            is_auto_commit=False,
+            storage=FileSessionStorage(str(tmp_path / "generation")),
+        )
+        assert restored.get(MockObj, Scope.USER, "a").data == {"v": 3}
+
+    @pytest.mark.timeout(10)
+    def test_update_during_snapshot(self, bot_async, tmp_path):
+        import time
+
+        storage = FileSessionStorage(str(tmp_path / "cow_data"), compact_size=0)
+        session = SessionManager(Logger(config["bot_id"]), storage=storage)
+        serialize_snapshot = storage.serialize_snapshot
+        snapshots = []
+
+        def slow_serialize_snapshot(sessions):
+            time.sleep(0.8)
+            snapshots.append(dict(sessions["USER"]["111"]["a"].data))
+            return serialize_snapshot(sessions)
+
+        storage.serialize_snapshot = slow_serialize_snapshot
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        held = session.get(MockObj, Scope.USER, "a").data  # 处理函数持有的data
+        session.set_commit_path(str(tmp_path / "cow_data"))
+        session.start(bot_async.loop)
+        bot_async.loop.run_until_complete(sleep(0.6))
+        assert not session._SessionManager__commit_task.done()
+        session.update(MockObj, Scope.USER, "a", data={f"k{i}": i for i in range(50)})
+        held.update({f"k{i}": i for i in range(50, 100)})
+        bot_async.loop.run_until_complete(sleep(2))
+        assert session.commit_metrics["failed"] == 0
+        # 写入中的快照为session的副本，之后对data的修改不会影响快照
+        assert snapshots == [{"v": 1}]
+        restored = SessionManager(
+            Logger(config["bot_id"]),
+            is_auto_commit=False,
+            storage=FileSessionStorage(str(tmp_path / "cow_data")),
+        )
+        assert restored.get(MockObj, Scope.USER, "a").data == {
+            "v": 1,
+            **{f"k{i}": i for i in range(100)},
+        }
+
+    @pytest.mark.timeout(10)
+    def test_cache_eviction(self, bot_async, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        storage = SQLiteSessionStorage(path, load_on_demand=True, cache_ttl=0.3)
+        session = SessionManager(Logger(config["bot_id"]), storage=storage)
+        session.start(bot_async.loop)
+        session.new(MockObj, Scope.USER, "a", data={"v": 1})
+        session.new(MockObj, Scope.USER, "t", data={}, timeout=60)
+        bot_async.loop.run_until_complete(sleep(1.5))
+        cached = session._SessionManager__sessions["USER"]
+        # 未改动且无需检查超时的session被释放，带有超时时间的session保留
+        assert list(cached["111"]) == ["t"]
+        # 其他进程写入的数据在释放后可读取到
+        other = SessionManager(
+            Logger(config["bot_id"]),
+            storage=SQLiteSessionStorage(path, load_on_demand=True),
+        )
+        other.update(MockObj, Scope.USER, "a", data={"v": 2})
+        other.commit_data()
+        assert session.get(MockObj, Scope.USER, "a").data == {"v": 2}
+        # 有未写入改动的session不会被释放
+        session.set_auto_commit(False)
+        session.update(MockObj, Scope.USER, "a", data={"v": 3})
+        bot_async.loop.run_until_complete(sleep(1))
+        assert cached["111"]["a"].data == {"v": 3}
+        session.set_auto_commit(True)